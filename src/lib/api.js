@@ -16,6 +16,55 @@ const handleResponse = async (response) => {
   return response.json()
 }
 
+// Waits for a queued LLM task (202 with a task) to finish and returns its result, which has the shape of a direct response
+const waitForTask = async (response, interval = 1000) => {
+  const data = await handleResponse(response)
+  if (response.status !== 202 || !data.task) return data
+
+  let task = data.task
+  while (task.status === 'queued' || task.status === 'running') {
+    await new Promise((resolve) => setTimeout(resolve, interval))
+    task = (await tasksAPI.getTask(task.id)).task
+  }
+  if (task.status === 'failed') throw new Error(task.error || 'An error occurred')
+  return task.result
+}
+
+// Reads a server-sent event stream from a fetch response, calling onEvent(event, data) per event
+const readEventStream = async (response, onEvent) => {
+  if (!response.ok) {
+    return handleResponse(response)
+  }
+  const reader = response.body.getReader()
+  const decoder = new TextDecoder()
+  let buffer = ''
+  let result = null
+
+  while (true) {
+    const { done, value } = await reader.read()
+    if (done) break
+    buffer += decoder.decode(value, { stream: true })
+
+    let boundary
+    while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+      const message = buffer.slice(0, boundary)
+      buffer = buffer.slice(boundary + 2)
+
+      let event = 'message'
+      let data = ''
+      for (const line of message.split('\n')) {
+        if (line.startsWith('event: ')) event = line.slice(7)
+        else if (line.startsWith('data: ')) data += line.slice(6)
+      }
+      const payload = data ? JSON.parse(data) : null
+      if (event === 'error') throw new Error(payload?.error || 'An error occurred')
+      if (event === 'done') result = payload
+      onEvent?.(event, payload)
+    }
+  }
+  return result
+}
+
 // Auth API
 export const authAPI = {
   signup: async (name, email, password) => {
@@ -69,6 +118,91 @@ export const filesAPI = {
     return handleResponse(response)
   },
 
+  uploadBatch: async (files, docType = 'resume', runOCR = true) => {
+    const formData = new FormData()
+    for (const file of files) {
+      formData.append('files', file)
+    }
+    formData.append('doc_type', docType)
+    formData.append('ocr', runOCR ? 'true' : 'false')
+
+    const token = localStorage.getItem('token')
+    const response = await fetch(`${API_BASE_URL}/files/batch`, {
+      method: 'POST',
+      headers: {
+        ...(token && { 'Authorization': `Bearer ${token}` })
+      },
+      body: formData
+    })
+    return handleResponse(response)
+  },
+
+  uploadResumable: async (file, onProgress, chunkSize = 5 * 1024 * 1024) => {
+    const token = localStorage.getItem('token')
+    const authHeader = { ...(token && { 'Authorization': `Bearer ${token}` }) }
+
+    const init = await fetch(`${API_BASE_URL}/files/uploads`, {
+      method: 'POST',
+      headers: getAuthHeaders(),
+      body: JSON.stringify({ file_name: file.name, size: file.size })
+    })
+    const { upload } = await handleResponse(init)
+
+    let offset = 0
+    let retries = 0
+    while (offset < file.size) {
+      try {
+        const response = await fetch(`${API_BASE_URL}/files/uploads/${upload.id}`, {
+          method: 'PATCH',
+          headers: { ...authHeader, 'Upload-Offset': String(offset), 'Content-Type': 'application/offset+octet-stream' },
+          body: file.slice(offset, offset + chunkSize)
+        })
+        if (!response.ok && response.status !== 409) {
+          await handleResponse(response)
+        }
+        offset = Number(response.headers.get('Upload-Offset'))
+        retries = 0
+      } catch (error) {
+        if (++retries > 5) throw error
+        // Ask the server how much it kept before resuming
+        const status = await fetch(`${API_BASE_URL}/files/uploads/${upload.id}`, { headers: authHeader })
+        offset = Number(status.headers.get('Upload-Offset') ?? offset)
+      }
+      onProgress?.(offset, file.size)
+    }
+
+    const response = await fetch(`${API_BASE_URL}/files/uploads/${upload.id}/finalize`, {
+      method: 'POST',
+      headers: getAuthHeaders()
+    })
+    return handleResponse(response)
+  },
+
+  importFiles: async (source, { folderId, fileIds, credentials, runOCR = false, docType = 'resume' } = {}) => {
+    const response = await fetch(`${API_BASE_URL}/files/import`, {
+      method: 'POST',
+      headers: getAuthHeaders(),
+      body: JSON.stringify({ source, folder_id: folderId, file_ids: fileIds, credentials, ocr: runOCR, doc_type: docType })
+    })
+    return handleResponse(response)
+  },
+
+  getImportJob: async (jobId) => {
+    const response = await fetch(`${API_BASE_URL}/files/import/${jobId}`, {
+      headers: getAuthHeaders()
+    })
+    return handleResponse(response)
+  },
+
+  resumeImport: async (jobId, credentials) => {
+    const response = await fetch(`${API_BASE_URL}/files/import/${jobId}/resume`, {
+      method: 'POST',
+      headers: getAuthHeaders(),
+      body: JSON.stringify({ credentials })
+    })
+    return handleResponse(response)
+  },
+
   getFile: async (fileId) => {
     const response = await fetch(`${API_BASE_URL}/files/${fileId}`, {
       headers: getAuthHeaders()
@@ -76,7 +210,29 @@ export const filesAPI = {
     return handleResponse(response)
   },
 
+  deleteFile: async (fileId) => {
+    const response = await fetch(`${API_BASE_URL}/files/${fileId}`, {
+      method: 'DELETE',
+      headers: getAuthHeaders()
+    })
+    return handleResponse(response)
+  },
+
+  getDownloadURL: async (fileId) => {
+    const response = await fetch(`${API_BASE_URL}/files/${fileId}/url`, {
+      headers: getAuthHeaders()
+    })
+    return handleResponse(response)
+  },
+
   downloadFile: async (fileId) => {
+    // Files in object storage are fetched straight from the presigned URL
+    const { url } = await filesAPI.getDownloadURL(fileId)
+    if (url) {
+      const response = await fetch(url)
+      return response.blob()
+    }
+
     const token = localStorage.getItem('token')
     const response = await fetch(`${API_BASE_URL}/files/${fileId}/download`, {
       headers: {
@@ -98,6 +254,31 @@ export const ocrAPI = {
     return handleResponse(response)
   },
 
+  queueOCR: async (fileId, docType = 'resume') => {
+    const response = await fetch(`${API_BASE_URL}/ocr/run`, {
+      method: 'POST',
+      headers: getAuthHeaders(),
+      body: JSON.stringify({ file_id: fileId, doc_type: docType, async: true })
+    })
+    return handleResponse(response)
+  },
+
+  streamOCR: async (fileId, docType = 'resume', onEvent) => {
+    const response = await fetch(`${API_BASE_URL}/ocr/stream`, {
+      method: 'POST',
+      headers: getAuthHeaders(),
+      body: JSON.stringify({ file_id: fileId, doc_type: docType })
+    })
+    return readEventStream(response, onEvent)
+  },
+
+  getJob: async (jobId) => {
+    const response = await fetch(`${API_BASE_URL}/ocr/jobs/${jobId}`, {
+      headers: getAuthHeaders()
+    })
+    return handleResponse(response)
+  },
+
   getDocument: async (documentId) => {
     const response = await fetch(`${API_BASE_URL}/ocr/${documentId}`, {
       headers: getAuthHeaders()
@@ -117,13 +298,13 @@ export const ocrAPI = {
 
 // Resume API
 export const resumeAPI = {
-  analyze: async (documentId, model = 'gpt-4.1-mini', provider = 'openai') => {
+  analyze: async (documentId, model = 'gpt-4.1-mini', provider = 'openai', force = false, runAsync = true) => {
     const response = await fetch(`${API_BASE_URL}/resume/analyze`, {
       method: 'POST',
       headers: getAuthHeaders(),
-      body: JSON.stringify({ document_id: documentId, model, provider })
+      body: JSON.stringify({ document_id: documentId, model, provider, force, async: runAsync })
     })
-    return handleResponse(response)
+    return waitForTask(response)
   },
 
   getProfile: async (profileId) => {
@@ -152,13 +333,13 @@ export const resumeAPI = {
 
 // Company API
 export const companyAPI = {
-  analyze: async (name, website = '', jobUrl = '', model = 'gpt-4.1-mini', provider = 'openai') => {
+  analyze: async (name, website = '', jobUrl = '', model = 'gpt-4.1-mini', provider = 'openai', force = false, runAsync = true) => {
     const response = await fetch(`${API_BASE_URL}/company/analyze`, {
       method: 'POST',
       headers: getAuthHeaders(),
-      body: JSON.stringify({ name, website, job_url: jobUrl, model, provider })
+      body: JSON.stringify({ name, website, job_url: jobUrl, model, provider, force, async: runAsync })
     })
-    return handleResponse(response)
+    return waitForTask(response)
   },
 
   getCompany: async (companyId) => {
@@ -187,13 +368,33 @@ export const companyAPI = {
 
 // Letter API
 export const letterAPI = {
-  generate: async (profileId, companyId, language = 'en', tone = 'formal', model = 'gpt-4.1-mini', provider = 'openai') => {
+  generate: async (profileId, companyId, language = 'en', tone = 'formal', model = 'gpt-4.1-mini', provider = 'openai', runAsync = true) => {
     const response = await fetch(`${API_BASE_URL}/letter/generate`, {
+      method: 'POST',
+      headers: getAuthHeaders(),
+      body: JSON.stringify({ profile_id: profileId, company_id: companyId, language, tone, model, provider, async: runAsync })
+    })
+    return waitForTask(response)
+  },
+
+  generateStream: async (profileId, companyId, onToken, language = 'en', tone = 'formal', model = 'gpt-4.1-mini', provider = 'openai') => {
+    const response = await fetch(`${API_BASE_URL}/letter/generate/stream`, {
       method: 'POST',
       headers: getAuthHeaders(),
       body: JSON.stringify({ profile_id: profileId, company_id: companyId, language, tone, model, provider })
     })
-    return handleResponse(response)
+    return readEventStream(response, (event, data) => {
+      if (event === 'token') onToken?.(data.text)
+    })
+  },
+
+  generateBatch: async (profileId, companyIds, onEvent, language = 'en', tone = 'formal', model = 'gpt-4.1-mini', provider = 'openai') => {
+    const response = await fetch(`${API_BASE_URL}/letter/generate/batch`, {
+      method: 'POST',
+      headers: getAuthHeaders(),
+      body: JSON.stringify({ profile_id: profileId, company_ids: companyIds, language, tone, model, provider })
+    })
+    return readEventStream(response, onEvent)
   },
 
   getLetter: async (letterId) => {
@@ -264,6 +465,20 @@ export const settingsAPI = {
     return handleResponse(response)
   },
 
+  getLLMCacheStats: async () => {
+    const response = await fetch(`${API_BASE_URL}/settings/llm-cache/stats`, {
+      headers: getAuthHeaders()
+    })
+    return handleResponse(response)
+  },
+
+  getLLMUsageReport: async (days = 7) => {
+    const response = await fetch(`${API_BASE_URL}/settings/llm-usage/report?days=${days}`, {
+      headers: getAuthHeaders()
+    })
+    return handleResponse(response)
+  },
+
   saveAPIKey: async (provider, apiKey, validate = false) => {
     const response = await fetch(`${API_BASE_URL}/settings/api-key`, {
       method: 'POST',
@@ -289,3 +504,20 @@ export const settingsAPI = {
   }
 }
 
+// Tasks API
+export const tasksAPI = {
+  getTask: async (taskId) => {
+    const response = await fetch(`${API_BASE_URL}/tasks/${taskId}`, {
+      headers: getAuthHeaders()
+    })
+    return handleResponse(response)
+  },
+
+  getStats: async () => {
+    const response = await fetch(`${API_BASE_URL}/tasks/stats`, {
+      headers: getAuthHeaders()
+    })
+    return handleResponse(response)
+  }
+}
+
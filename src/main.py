@@ -1,11 +1,12 @@
 import os
 import sys
+import threading
 # DON'T CHANGE THIS !!!
 sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 
 from flask import Flask, send_from_directory
 from flask_cors import CORS
-from src.models.models import db
+from src.models.models import db, upgrade_schema
 from src.routes.auth import auth_bp
 from src.routes.files import files_bp
 from src.routes.ocr import ocr_bp
@@ -14,6 +15,8 @@ from src.routes.company import company_bp
 from src.routes.letter import letter_bp
 from src.routes.email import email_bp
 from src.routes.settings import settings_bp
+from src.routes.tasks import tasks_bp
+from src.utils.ocr_jobs import resume_ocr_jobs
 
 app = Flask(__name__, static_folder=os.path.join(os.path.dirname(__file__), 'static'))
 app.config['SECRET_KEY'] = 'asdf#FGSgvasgf$5$WGT'
@@ -30,13 +33,36 @@ app.register_blueprint(company_bp, url_prefix='/api/company')
 app.register_blueprint(letter_bp, url_prefix='/api/letter')
 app.register_blueprint(email_bp, url_prefix='/api/email')
 app.register_blueprint(settings_bp, url_prefix='/api/settings')
+app.register_blueprint(tasks_bp, url_prefix='/api/tasks')
 
 # uncomment if you need to use database
-app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(os.path.dirname(__file__), 'database', 'app.db')}"
+app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL') or f"sqlite:///{os.path.join(os.path.dirname(__file__), 'database', 'app.db')}"
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 db.init_app(app)
-with app.app_context():
-    db.create_all()
+
+_started = False
+_start_lock = threading.Lock()
+
+def start_app(app):
+    """Set up the database and pick up OCR jobs an earlier run left unfinished; runs once per web process."""
+    global _started
+    with _start_lock:
+        if _started:
+            return
+        with app.app_context():
+            # Creates every missing table, so existing databases get new ones such as llm_tasks
+            db.create_all()
+            # Older databases get the columns added since their tables were created
+            upgrade_schema()
+        resume_ocr_jobs(app)
+        _started = True
+
+# Not done at import: spawned OCR and PDF worker processes import this module again as __mp_main__,
+# and must not touch the database schema or start job queues of their own
+@app.before_request
+def ensure_started():
+    if not _started:
+        start_app(app)
 
 @app.route('/', defaults={'path': ''})
 @app.route('/<path:path>')
@@ -56,4 +82,5 @@ def serve(path):
 
 
 if __name__ == '__main__':
+    start_app(app)
     app.run(host='0.0.0.0', port=5000, debug=True)
@@ -1,12 +1,57 @@
 from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime
 import uuid
+import zlib
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
 
 db = SQLAlchemy()
 
 def generate_uuid():
     return str(uuid.uuid4())
 
+class CompressedText(db.TypeDecorator):
+    """Text stored compressed in a binary column behind a one-byte format marker."""
+    impl = db.LargeBinary
+    cache_ok = True
+
+    PLAIN = b'p'
+    ZLIB = b'z'
+    ZSTD = b's'
+    # Shorter texts are not worth compressing
+    MIN_COMPRESS_SIZE = 256
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        data = value.encode('utf-8')
+        if len(data) < self.MIN_COMPRESS_SIZE:
+            return self.PLAIN + data
+        if zstandard is not None:
+            return self.ZSTD + zstandard.ZstdCompressor(level=3).compress(data)
+        return self.ZLIB + zlib.compress(data, 6)
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        if isinstance(value, str):
+            # Rows written before the column was compressed
+            return value
+        value = bytes(value)
+        marker, data = value[:1], value[1:]
+        if marker == self.ZSTD:
+            if zstandard is None:
+                raise Exception('zstandard is required to read this text')
+            return zstandard.ZstdDecompressor().decompress(data).decode('utf-8')
+        if marker == self.ZLIB:
+            return zlib.decompress(data).decode('utf-8')
+        if marker == self.PLAIN:
+            return data.decode('utf-8')
+        return value.decode('utf-8')
+
 class User(db.Model):
     __tablename__ = 'users'
     
@@ -65,6 +110,7 @@ class File(db.Model):
     mime_type = db.Column(db.String(100), nullable=False)
     size = db.Column(db.Integer, nullable=False)
     storage_url = db.Column(db.Text, nullable=False)
+    content_hash = db.Column(db.String(64), index=True)  # SHA-256 of the bytes; names the shared blob
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     # Relationships
@@ -77,10 +123,123 @@ class File(db.Model):
             'file_name': self.file_name,
             'mime_type': self.mime_type,
             'size': self.size,
+            'content_hash': self.content_hash,
             'created_at': self.created_at.isoformat() if self.created_at else None
         }
 
 
+class Blob(db.Model):
+    __tablename__ = 'blobs'
+    
+    # One row per stored blob; its row lock serializes adding references with deleting the blob
+    content_hash = db.Column(db.String(64), primary_key=True)
+    locked_at = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+class UploadSession(db.Model):
+    __tablename__ = 'upload_sessions'
+    
+    id = db.Column(db.String(36), primary_key=True, default=generate_uuid)
+    user_id = db.Column(db.String(36), db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    file_name = db.Column(db.String(255), nullable=False)
+    mime_type = db.Column(db.String(100), nullable=False)
+    size = db.Column(db.Integer, nullable=False)
+    offset = db.Column(db.Integer, default=0, nullable=False)
+    sha256 = db.Column(db.String(64))  # Checksum announced by the client, verified on finalize
+    storage_path = db.Column(db.Text, nullable=False)
+    status = db.Column(db.String(50), nullable=False)  # active, writing (a request holds it), complete
+    file_id = db.Column(db.String(36), db.ForeignKey('files.id', ondelete='SET NULL'))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'file_name': self.file_name,
+            'mime_type': self.mime_type,
+            'size': self.size,
+            'offset': self.offset,
+            'status': self.status,
+            'file_id': self.file_id,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
+
+
+class ImportJob(db.Model):
+    __tablename__ = 'import_jobs'
+    
+    id = db.Column(db.String(36), primary_key=True, default=generate_uuid)
+    user_id = db.Column(db.String(36), db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    source = db.Column(db.String(50), nullable=False)  # local, gdrive
+    folder_id = db.Column(db.String(255))
+    doc_type = db.Column(db.String(50))  # Set when imported files are queued for OCR
+    status = db.Column(db.String(50), nullable=False)  # queued, running, done, partial, failed
+    error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    # Relationships
+    items = db.relationship('ImportItem', backref='job', lazy=True, order_by='ImportItem.created_at')
+    
+    def to_dict(self, include_items=False):
+        counts = {}
+        for item in self.items:
+            counts[item.status] = counts.get(item.status, 0) + 1
+        data = {
+            'id': self.id,
+            'source': self.source,
+            'folder_id': self.folder_id,
+            'status': self.status,
+            'error': self.error,
+            'total': len(self.items),
+            'counts': counts,
+            'bytes_done': sum(item.bytes_done for item in self.items),
+            'bytes_total': sum(item.size or 0 for item in self.items),
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
+        if include_items:
+            data['items'] = [item.to_dict() for item in self.items]
+        return data
+
+
+class ImportItem(db.Model):
+    __tablename__ = 'import_items'
+    
+    id = db.Column(db.String(36), primary_key=True, default=generate_uuid)
+    job_id = db.Column(db.String(36), db.ForeignKey('import_jobs.id', ondelete='CASCADE'), nullable=False, index=True)
+    provider_file_id = db.Column(db.String(255), nullable=False)
+    file_name = db.Column(db.String(255), nullable=False)
+    mime_type = db.Column(db.String(100), nullable=False)
+    size = db.Column(db.Integer)
+    checksum = db.Column(db.String(128))  # Checksum reported by the provider, verified after transfer
+    checksum_algorithm = db.Column(db.String(20))
+    bytes_done = db.Column(db.Integer, default=0, nullable=False)
+    temp_path = db.Column(db.Text)  # Partial download kept for resuming
+    status = db.Column(db.String(50), nullable=False)  # queued, running, done, failed
+    attempts = db.Column(db.Integer, default=0, nullable=False)
+    error = db.Column(db.Text)
+    file_id = db.Column(db.String(36), db.ForeignKey('files.id', ondelete='SET NULL'))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'provider_file_id': self.provider_file_id,
+            'file_name': self.file_name,
+            'mime_type': self.mime_type,
+            'size': self.size,
+            'bytes_done': self.bytes_done,
+            'status': self.status,
+            'attempts': self.attempts,
+            'error': self.error,
+            'file_id': self.file_id
+        }
+
+
 class Document(db.Model):
     __tablename__ = 'documents'
     
@@ -89,8 +248,9 @@ class Document(db.Model):
     file_id = db.Column(db.String(36), db.ForeignKey('files.id', ondelete='SET NULL'))
     doc_type = db.Column(db.String(50), nullable=False)  # resume, certificate, portfolio, other
     language = db.Column(db.String(10), nullable=False)
-    raw_text = db.Column(db.Text)
-    edited_text = db.Column(db.Text)
+    # Compressed and only loaded when a handler reads one of them
+    raw_text = db.deferred(db.Column(CompressedText), group='text')
+    edited_text = db.deferred(db.Column(CompressedText), group='text')
     status = db.Column(db.String(50), nullable=False)  # uploaded, ocred, edited
     version = db.Column(db.Integer, default=1, nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
@@ -111,6 +271,105 @@ class Document(db.Model):
         }
 
 
+class OCRJob(db.Model):
+    __tablename__ = 'ocr_jobs'
+    
+    id = db.Column(db.String(36), primary_key=True, default=generate_uuid)
+    user_id = db.Column(db.String(36), db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    file_id = db.Column(db.String(36), db.ForeignKey('files.id', ondelete='CASCADE'), nullable=False)
+    document_id = db.Column(db.String(36), db.ForeignKey('documents.id', ondelete='SET NULL'))
+    doc_type = db.Column(db.String(50), nullable=False)
+    status = db.Column(db.String(50), nullable=False)  # queued, running, done, failed
+    error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'file_id': self.file_id,
+            'document_id': self.document_id,
+            'doc_type': self.doc_type,
+            'status': self.status,
+            'error': self.error,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
+
+
+class OCRCacheEntry(db.Model):
+    __tablename__ = 'ocr_cache'
+    
+    key = db.Column(db.String(64), primary_key=True)  # SHA-256 of content hash + OCR settings
+    content_hash = db.Column(db.String(64), nullable=False, index=True)
+    text = db.deferred(db.Column(CompressedText, nullable=False))
+    language = db.Column(db.String(10), nullable=False)
+    size = db.Column(db.Integer, nullable=False)
+    hits = db.Column(db.Integer, default=0, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    last_used_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+
+
+class LLMCacheEntry(db.Model):
+    __tablename__ = 'llm_cache'
+    
+    key = db.Column(db.String(64), primary_key=True)  # SHA-256 of provider, model, temperature and normalized messages
+    endpoint = db.Column(db.String(50), nullable=False, index=True)  # analyze_resume, analyze_company, ...
+    provider = db.Column(db.String(100), nullable=False)
+    model = db.Column(db.String(100), nullable=False)
+    response = db.deferred(db.Column(CompressedText, nullable=False))
+    size = db.Column(db.Integer, nullable=False)
+    hits = db.Column(db.Integer, default=0, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    expires_at = db.Column(db.DateTime, index=True)
+    last_used_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+
+
+class LLMUsage(db.Model):
+    __tablename__ = 'llm_usage'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    endpoint = db.Column(db.String(50), nullable=False)  # analyze_resume, analyze_company, generate_cover_letter, ...
+    provider = db.Column(db.String(100), nullable=False)
+    model = db.Column(db.String(100), nullable=False)
+    prompt_tokens = db.Column(db.Integer, default=0, nullable=False)
+    cached_tokens = db.Column(db.Integer, default=0, nullable=False)  # Prompt tokens served from the provider's prefix cache
+    completion_tokens = db.Column(db.Integer, default=0, nullable=False)
+    latency_ms = db.Column(db.Float, nullable=False)
+    first_token_ms = db.Column(db.Float)  # Streamed calls only
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+
+
+class LLMTask(db.Model):
+    __tablename__ = 'llm_tasks'
+    
+    id = db.Column(db.String(36), primary_key=True, default=generate_uuid)
+    user_id = db.Column(db.String(36), db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    kind = db.Column(db.String(50), nullable=False)  # analyze_resume, analyze_company, generate_letter
+    provider = db.Column(db.String(100), nullable=False)
+    status = db.Column(db.String(50), nullable=False)  # queued, running, done, failed
+    result = db.Column(db.JSON)
+    error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'provider': self.provider,
+            'status': self.status,
+            'result': self.result,
+            'error': self.error,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
+
+
 class Profile(db.Model):
     __tablename__ = 'profiles'
     
@@ -249,3 +508,24 @@ class AuditLog(db.Model):
             'created_at': self.created_at.isoformat() if self.created_at else None
         }
 
+
+
+# Columns added to tables that older databases already have; db.create_all() only creates missing tables
+ADDED_COLUMNS = {
+    'files': [('content_hash', 'VARCHAR(64)')],
+}
+
+def upgrade_schema():
+    """Add the columns in ADDED_COLUMNS, and their indexes, to an existing database that lacks them."""
+    inspector = db.inspect(db.engine)
+    for table_name, columns in ADDED_COLUMNS.items():
+        existing = {column['name'] for column in inspector.get_columns(table_name)}
+        table = db.metadata.tables[table_name]
+        for name, ddl in columns:
+            if name in existing:
+                continue
+            with db.engine.begin() as connection:
+                connection.execute(db.text(f'ALTER TABLE {table_name} ADD COLUMN {name} {ddl}'))
+                for index in table.indexes:
+                    if name in index.columns:
+                        index.create(connection, checkfirst=True)
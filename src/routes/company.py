@@ -1,11 +1,50 @@
-from flask import Blueprint, request, jsonify
-from src.models.models import db, Company, APICredential, AuditLog
+from flask import Blueprint, request, jsonify, current_app
+from src.models.models import db, Company, AuditLog
 from src.utils.auth import token_required
 from src.utils.llm import analyze_company
-from src.utils.encryption import decrypt_api_key
+from src.utils.llm_providers import get_user_api_key
+from src.utils.llm_executor import LLMQueueFull, get_llm_executor, queue_llm_task
+from src.utils.llm_retry import LLMUnavailable
 
 company_bp = Blueprint('company', __name__)
 
+def analyze_company_task(user_id, company_name, website, job_url, api_key, model, force, provider='openai'):
+    """Analyze a company and save it; runs on the LLM executor."""
+    # Analyze company
+    result = analyze_company(company_name, website=website, job_url=job_url, api_key=api_key, model=model, force=force, provider=provider)
+    
+    if result['status'] == 'failed':
+        raise Exception(result.get('error', 'Company analysis failed'))
+    
+    analysis = result['analysis']
+    
+    # Create company record
+    company = Company(
+        user_id=user_id,
+        name=company_name,
+        website=website,
+        source_url=job_url,
+        summary=analysis.get('summary', ''),
+        focus_areas=analysis.get('focus_areas', []),
+        requirements=analysis.get('requirements', [])
+    )
+    
+    db.session.add(company)
+    db.session.commit()
+    
+    # Log the action
+    audit_log = AuditLog(
+        user_id=user_id,
+        action='company_analyzed',
+        entity_type='company',
+        entity_id=company.id,
+        payload={'name': company_name, 'model': model, 'cached': result.get('cached', False)}
+    )
+    db.session.add(audit_log)
+    db.session.commit()
+    
+    return {'company': company.to_dict(), 'cached': result.get('cached', False)}
+
 @company_bp.route('/analyze', methods=['POST'])
 @token_required
 def analyze_company_endpoint(current_user):
@@ -22,53 +61,36 @@ def analyze_company_endpoint(current_user):
         job_url = data.get('job_url')
         
         # Get API key
-        api_key = None
         provider = data.get('provider', 'openai')
-        credential = APICredential.query.filter_by(user_id=current_user.id, provider=provider).first()
-        if credential:
-            api_key = decrypt_api_key(credential.api_key_enc)
+        api_key = get_user_api_key(current_user.id, provider)
         
         # Get model
         model = data.get('model', 'gpt-4.1-mini')
         
-        # Analyze company
-        result = analyze_company(company_name, website=website, job_url=job_url, api_key=api_key, model=model)
-        
-        if result['status'] == 'failed':
-            return jsonify({'error': result.get('error', 'Company analysis failed')}), 500
-        
-        analysis = result['analysis']
-        
-        # Create company record
-        company = Company(
-            user_id=current_user.id,
-            name=company_name,
-            website=website,
-            source_url=job_url,
-            summary=analysis.get('summary', ''),
-            focus_areas=analysis.get('focus_areas', []),
-            requirements=analysis.get('requirements', [])
-        )
+        # The task runs in its own session, so it only captures plain values
+        user_id = current_user.id
+        task = lambda: analyze_company_task(user_id, company_name, website, job_url, api_key, model, bool(data.get('force', False)), provider)
+        app = current_app._get_current_object()
         
-        db.session.add(company)
-        db.session.commit()
+        # Task mode is the default: queue the call and return immediately; "async": false waits for the result
+        if data.get('async', True):
+            llm_task = queue_llm_task(app, current_user.id, 'analyze_company', task, provider, api_key)
+            return jsonify({'message': 'Company analysis queued', 'task': llm_task.to_dict()}), 202
         
-        # Log the action
-        audit_log = AuditLog(
-            user_id=current_user.id,
-            action='company_analyzed',
-            entity_type='company',
-            entity_id=company.id,
-            payload={'name': company_name, 'model': model}
-        )
-        db.session.add(audit_log)
-        db.session.commit()
+        # Analyze company; the call waits for a free slot of its provider and key
+        result = get_llm_executor(app).run(task, provider, api_key)
         
         return jsonify({
             'message': 'Company analyzed successfully',
-            'company': company.to_dict()
+            'company': result['company'],
+            'cached': result['cached']
         }), 200
         
+    except LLMQueueFull as e:
+        return jsonify({'error': str(e)}), 503, {'Retry-After': '5'}
+    except LLMUnavailable as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 503, {'Retry-After': str(e.retry_after)}
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
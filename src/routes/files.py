@@ -1,17 +1,38 @@
-from flask import Blueprint, request, jsonify, send_file
+from flask import Blueprint, request, jsonify, send_file, redirect, current_app
+from werkzeug.exceptions import ClientDisconnected, RequestedRangeNotSatisfiable
 from werkzeug.utils import secure_filename
 import os
-from src.models.models import db, File, Document, AuditLog
+import time
+import zipfile
+from datetime import datetime, timedelta
+from src.models.models import db, File, Document, OCRJob, UploadSession, ImportJob, ImportItem, AuditLog
 from src.utils.auth import token_required
 from src.utils.ocr import process_file_ocr
+from src.utils.ocr_jobs import get_ocr_job_queue
+from src.utils.importers import get_import_provider, get_import_runner
+from src.utils.uploads import UPLOAD_CHUNK_TIMEOUT, claim_upload, release_upload, get_upload_hasher, save_upload_hasher, discard_upload_hasher
+from src.utils.storage import UPLOAD_FOLDER, S3_PRESIGN_EXPIRES, get_storage, create_temp_file, commit_blob, store_blob, reference_blobs, release_blob, release_failed_blobs
 
 files_bp = Blueprint('files', __name__)
 
-UPLOAD_FOLDER = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'uploads')
 ALLOWED_EXTENSIONS = {'pdf', 'png', 'jpg', 'jpeg', 'docx'}
 
-# Create upload folder if it doesn't exist
-os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+# Limits for batch uploads and zip archives
+BATCH_MAX_FILES = int(os.environ.get('BATCH_MAX_FILES', 500))
+BATCH_MAX_FILE_SIZE = int(os.environ.get('BATCH_MAX_FILE_SIZE_MB', 50)) * 1024 * 1024
+BATCH_MAX_TOTAL_SIZE = int(os.environ.get('BATCH_MAX_TOTAL_SIZE_MB', 1024)) * 1024 * 1024
+
+# Limits for resumable chunked uploads
+CHUNKED_UPLOAD_MAX_SIZE = int(os.environ.get('CHUNKED_UPLOAD_MAX_SIZE_MB', 100)) * 1024 * 1024
+CHUNKED_UPLOAD_TTL = timedelta(hours=int(os.environ.get('CHUNKED_UPLOAD_TTL_HOURS', 24)))
+
+# Files a single import job may bring in
+IMPORT_MAX_FILES = int(os.environ.get('IMPORT_MAX_FILES', 500))
+
+# Hand download bodies to the front proxy: '' (serve from Python), 'x-accel-redirect' (nginx) or 'x-sendfile' (Apache, lighttpd)
+DOWNLOAD_OFFLOAD = os.environ.get('DOWNLOAD_OFFLOAD', '').lower()
+# Internal nginx location that aliases the upload folder, used with x-accel-redirect
+DOWNLOAD_ACCEL_PREFIX = os.environ.get('DOWNLOAD_ACCEL_PREFIX', '/protected-uploads/')
 
 def allowed_file(filename):
     """Check if file extension is allowed."""
@@ -29,10 +50,45 @@ def get_mime_type(filename):
     }
     return mime_types.get(ext, 'application/octet-stream')
 
+def offload_download(file, etag):
+    """Build a bodiless download response that tells the front proxy which file to send."""
+    response = current_app.response_class(mimetype=file.mime_type)
+    response.headers.set('Content-Disposition', 'attachment', filename=file.file_name)
+    if DOWNLOAD_OFFLOAD == 'x-accel-redirect':
+        relative_path = os.path.relpath(file.storage_url, UPLOAD_FOLDER).replace(os.sep, '/')
+        response.headers['X-Accel-Redirect'] = DOWNLOAD_ACCEL_PREFIX.rstrip('/') + '/' + relative_path
+    else:
+        response.headers['X-Sendfile'] = os.path.abspath(file.storage_url)
+    
+    # Answer revalidations here; the proxy serves the body and Range requests itself
+    response.set_etag(etag)
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+def iter_batch_items():
+    """Yield (name, stream) for every file of a batch request, streaming the members of zip archives."""
+    uploads = request.files.getlist('files') + request.files.getlist('file')
+    for upload in uploads:
+        if upload.filename.lower().endswith('.zip'):
+            # The archive is read in place from the request; members are streamed out one by one
+            with zipfile.ZipFile(upload.stream) as archive:
+                for member in archive.infolist():
+                    if member.is_dir() or os.path.basename(member.filename).startswith('.'):
+                        continue
+                    if member.file_size > BATCH_MAX_FILE_SIZE:
+                        yield member.filename, None
+                        continue
+                    with archive.open(member) as stream:
+                        yield member.filename, stream
+        else:
+            yield upload.filename, upload.stream
+
 @files_bp.route('/upload', methods=['POST'])
 @token_required
 def upload_file(current_user):
     """Upload a file."""
+    content_hash = None
     try:
         # Check if file is present
         if 'file' not in request.files:
@@ -48,11 +104,9 @@ def upload_file(current_user):
         
         # Save file
         filename = secure_filename(file.filename)
-        file_path = os.path.join(UPLOAD_FOLDER, f"{current_user.id}_{filename}")
-        file.save(file_path)
+        content_hash, file_path, file_size = store_blob(file.stream)
         
         # Get file info
-        file_size = os.path.getsize(file_path)
         mime_type = get_mime_type(filename)
         
         # Create file record
@@ -62,10 +116,12 @@ def upload_file(current_user):
             file_name=filename,
             mime_type=mime_type,
             size=file_size,
-            storage_url=file_path
+            storage_url=file_path,
+            content_hash=content_hash
         )
         
         db.session.add(new_file)
+        reference_blobs([content_hash])
         db.session.commit()
         
         # Log the action
@@ -74,7 +130,7 @@ def upload_file(current_user):
             action='file_upload',
             entity_type='file',
             entity_id=new_file.id,
-            payload={'filename': filename, 'size': file_size}
+            payload={'filename': filename, 'size': file_size, 'sha256': content_hash}
         )
         db.session.add(audit_log)
         db.session.commit()
@@ -86,6 +142,347 @@ def upload_file(current_user):
         
     except Exception as e:
         db.session.rollback()
+        # A blob no committed row references is removed again
+        release_failed_blobs([content_hash])
+        return jsonify({'error': str(e)}), 500
+
+@files_bp.route('/batch', methods=['POST'])
+@token_required
+def upload_batch(current_user):
+    """Upload several files or a zip archive and schedule OCR for each of them."""
+    stored_hashes = []
+    try:
+        if not request.files:
+            return jsonify({'error': 'No files provided'}), 400
+        
+        doc_type = request.form.get('doc_type', 'resume')
+        run_ocr = request.form.get('ocr', 'true').lower() not in ('0', 'false', 'no')
+        
+        manifest = []
+        new_files = []
+        total_size = 0
+        
+        for name, stream in iter_batch_items():
+            filename = secure_filename(os.path.basename(name))
+            item = {'name': name}
+            manifest.append(item)
+            
+            if len(new_files) >= BATCH_MAX_FILES:
+                item.update(status='rejected', error=f'Batch is limited to {BATCH_MAX_FILES} files')
+                continue
+            if not filename or not allowed_file(filename):
+                item.update(status='rejected', error='File type not allowed')
+                continue
+            if stream is None:
+                item.update(status='rejected', error='File is too large')
+                continue
+            
+            max_size = min(BATCH_MAX_FILE_SIZE, BATCH_MAX_TOTAL_SIZE - total_size)
+            try:
+                content_hash, file_path, file_size = store_blob(stream, max_size=max_size)
+            except ValueError as e:
+                item.update(status='rejected', error=f'{filename}: {e}')
+                continue
+            stored_hashes.append(content_hash)
+            total_size += file_size
+            
+            new_file = File(
+                user_id=current_user.id,
+                source='local',
+                file_name=filename,
+                mime_type=get_mime_type(filename),
+                size=file_size,
+                storage_url=file_path,
+                content_hash=content_hash
+            )
+            new_files.append(new_file)
+            item['record'] = new_file
+        
+        if not new_files:
+            return jsonify({'error': 'No valid files in batch', 'items': manifest}), 400
+        
+        # All rows of the batch are written in a single transaction
+        db.session.add_all(new_files)
+        db.session.flush()
+        
+        jobs = []
+        for item in manifest:
+            new_file = item.pop('record', None)
+            if new_file is None:
+                continue
+            item.update(status='stored', file=new_file.to_dict())
+            if run_ocr:
+                job = OCRJob(user_id=current_user.id, file_id=new_file.id, doc_type=doc_type, status='queued')
+                jobs.append(job)
+                item['job'] = job
+        db.session.add_all(jobs)
+        
+        # Log the action
+        db.session.add_all([
+            AuditLog(
+                user_id=current_user.id,
+                action='file_upload',
+                entity_type='file',
+                entity_id=new_file.id,
+                payload={'filename': new_file.file_name, 'size': new_file.size, 'sha256': new_file.content_hash, 'batch': True}
+            )
+            for new_file in new_files
+        ])
+        reference_blobs(stored_hashes)
+        db.session.commit()
+        
+        # OCR for every file runs concurrently on the OCR worker pool
+        if jobs:
+            job_queue = get_ocr_job_queue(current_app._get_current_object())
+            for job in jobs:
+                job_queue.submit(job.id)
+        for item in manifest:
+            if 'job' in item:
+                item['job'] = item['job'].to_dict()
+        
+        return jsonify({
+            'message': f'{len(new_files)} of {len(manifest)} files uploaded successfully',
+            'items': manifest
+        }), 201
+        
+    except Exception as e:
+        db.session.rollback()
+        # Blobs already shared with other files are kept
+        release_failed_blobs(stored_hashes)
+        if isinstance(e, zipfile.BadZipFile):
+            return jsonify({'error': 'Invalid zip archive'}), 400
+        return jsonify({'error': str(e)}), 500
+
+def expire_upload_sessions(user_id):
+    """Delete a user's abandoned upload sessions and their partial files."""
+    cutoff = datetime.utcnow() - CHUNKED_UPLOAD_TTL
+    stale = UploadSession.query.filter(
+        UploadSession.user_id == user_id,
+        UploadSession.status.in_(('active', 'writing')),
+        UploadSession.updated_at < cutoff
+    ).all()
+    for session in stale:
+        if os.path.exists(session.storage_path):
+            os.remove(session.storage_path)
+        discard_upload_hasher(session.id)
+        db.session.delete(session)
+    db.session.commit()
+
+@files_bp.route('/uploads', methods=['POST'])
+@token_required
+def create_upload_session(current_user):
+    """Start a resumable chunked upload."""
+    try:
+        data = request.get_json()
+        
+        # Validate input
+        if not data or not data.get('file_name') or data.get('size') is None:
+            return jsonify({'error': 'file_name and size are required'}), 400
+        
+        if not allowed_file(data['file_name']):
+            return jsonify({'error': 'File type not allowed'}), 400
+        
+        size = int(data['size'])
+        if size < 0 or size > CHUNKED_UPLOAD_MAX_SIZE:
+            return jsonify({'error': f'File size must be at most {CHUNKED_UPLOAD_MAX_SIZE // (1024 * 1024)} MB'}), 400
+        
+        expire_upload_sessions(current_user.id)
+        
+        filename = secure_filename(data['file_name'])
+        session = UploadSession(
+            user_id=current_user.id,
+            file_name=filename,
+            mime_type=get_mime_type(filename),
+            size=size,
+            sha256=data.get('sha256'),
+            storage_path='',
+            status='active'
+        )
+        db.session.add(session)
+        db.session.flush()
+        
+        # Chunks are assembled in a temporary file and moved into blob storage on finalize
+        session.storage_path = create_temp_file()
+        db.session.commit()
+        
+        return jsonify({'upload': session.to_dict()}), 201, {'Upload-Offset': '0'}
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+@files_bp.route('/uploads/<upload_id>', methods=['GET'])
+@token_required
+def get_upload_session(current_user, upload_id):
+    """Get the state of a chunked upload; the offset tells the client where to resume."""
+    try:
+        session = UploadSession.query.filter_by(id=upload_id, user_id=current_user.id).first()
+        
+        if not session:
+            return jsonify({'error': 'Upload not found'}), 404
+        
+        return jsonify({'upload': session.to_dict()}), 200, {'Upload-Offset': str(session.offset)}
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@files_bp.route('/uploads/<upload_id>', methods=['PATCH'])
+@token_required
+def upload_chunk(current_user, upload_id):
+    """Append a chunk at the offset given by the Upload-Offset header."""
+    try:
+        session = UploadSession.query.filter_by(id=upload_id, user_id=current_user.id).first()
+        
+        if not session:
+            return jsonify({'error': 'Upload not found'}), 404
+        
+        if session.status == 'complete':
+            return jsonify({'error': 'Upload is already complete'}), 409
+        
+        try:
+            offset = int(request.headers['Upload-Offset'])
+        except (KeyError, ValueError):
+            return jsonify({'error': 'Upload-Offset header is required'}), 400
+        
+        # Only one request at a time, in any app process, may write to a session
+        if not claim_upload(session.id, offset):
+            db.session.refresh(session)
+            if session.offset == offset and session.status == 'writing':
+                return jsonify({'error': 'Another chunk is being written', 'offset': session.offset}), 409, {'Upload-Offset': str(session.offset)}
+            return jsonify({'error': 'Offset mismatch', 'offset': session.offset}), 409, {'Upload-Offset': str(session.offset)}
+        
+        start = offset
+        disconnected = False
+        timed_out = False
+        too_large = False
+        try:
+            hasher = get_upload_hasher(session.id, session.storage_path, offset)
+            remaining = session.size - offset
+            # Writing stops before the claim can be taken over by another request
+            deadline = time.monotonic() + UPLOAD_CHUNK_TIMEOUT
+            
+            # Read the body as it arrives instead of letting Werkzeug buffer it
+            with open(session.storage_path, 'r+b') as f:
+                f.seek(offset)
+                try:
+                    while True:
+                        if time.monotonic() > deadline:
+                            timed_out = True
+                            break
+                        chunk = request.stream.read(min(1024 * 1024, remaining + 1))
+                        if not chunk:
+                            break
+                        if len(chunk) > remaining:
+                            # The whole chunk is rejected, so the session goes back to where it started
+                            too_large = True
+                            offset = start
+                            break
+                        f.write(chunk)
+                        hasher.update(chunk)
+                        offset += len(chunk)
+                        remaining -= len(chunk)
+                except ClientDisconnected:
+                    # Keep what arrived so the client can resume from there
+                    disconnected = True
+                f.truncate(offset)
+            
+            if too_large:
+                # The running hash has taken in the rejected bytes
+                discard_upload_hasher(session.id)
+            else:
+                save_upload_hasher(session.id, offset, hasher)
+        finally:
+            release_upload(session.id, offset)
+        
+        if too_large:
+            return jsonify({'error': 'Chunk exceeds the announced file size', 'offset': offset}), 413, {'Upload-Offset': str(offset)}
+        if disconnected:
+            return jsonify({'error': 'Client disconnected', 'offset': offset}), 400, {'Upload-Offset': str(offset)}
+        if timed_out:
+            return jsonify({'error': 'Chunk took too long to upload', 'offset': offset}), 408, {'Upload-Offset': str(offset)}
+        
+        db.session.refresh(session)
+        return jsonify({'upload': session.to_dict()}), 200, {'Upload-Offset': str(offset)}
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+@files_bp.route('/uploads/<upload_id>/finalize', methods=['POST'])
+@token_required
+def finalize_upload(current_user, upload_id):
+    """Finish a chunked upload and create its file record."""
+    stored_hash = None
+    try:
+        session = UploadSession.query.filter_by(id=upload_id, user_id=current_user.id).first()
+        
+        if not session:
+            return jsonify({'error': 'Upload not found'}), 404
+        
+        if session.status == 'complete':
+            file = File.query.filter_by(id=session.file_id, user_id=current_user.id).first()
+            return jsonify({'message': 'File uploaded successfully', 'file': file.to_dict() if file else None}), 200
+        
+        if session.offset != session.size:
+            return jsonify({'error': 'Upload is incomplete', 'offset': session.offset}), 409, {'Upload-Offset': str(session.offset)}
+        
+        # Claimed like a chunk write, so a repeated finalize cannot create the file twice
+        if not claim_upload(session.id, session.size):
+            return jsonify({'error': 'Upload is being finalized'}), 409
+        
+        try:
+            sha256 = get_upload_hasher(session.id, session.storage_path, session.size).hexdigest()
+            if session.sha256 and session.sha256.lower() != sha256:
+                release_upload(session.id, session.size)
+                return jsonify({'error': 'Checksum mismatch', 'sha256': sha256}), 422
+            
+            file_path = commit_blob(session.storage_path, sha256)
+            stored_hash = sha256
+        except Exception:
+            db.session.rollback()
+            release_upload(session.id, session.size)
+            raise
+        
+        # Create file record
+        new_file = File(
+            user_id=current_user.id,
+            source='local',
+            file_name=session.file_name,
+            mime_type=session.mime_type,
+            size=session.size,
+            storage_url=file_path,
+            content_hash=sha256
+        )
+        db.session.add(new_file)
+        db.session.flush()
+        reference_blobs([sha256])
+        
+        session.status = 'complete'
+        session.file_id = new_file.id
+        session.storage_path = file_path
+        
+        # Log the action
+        audit_log = AuditLog(
+            user_id=current_user.id,
+            action='file_upload',
+            entity_type='file',
+            entity_id=new_file.id,
+            payload={'filename': session.file_name, 'size': session.size, 'sha256': sha256, 'chunked': True}
+        )
+        db.session.add(audit_log)
+        db.session.commit()
+        discard_upload_hasher(session.id)
+        
+        return jsonify({
+            'message': 'File uploaded successfully',
+            'file': new_file.to_dict(),
+            'sha256': sha256
+        }), 201
+        
+    except Exception as e:
+        db.session.rollback()
+        # A blob no committed row references is removed again
+        release_failed_blobs([stored_hash])
         return jsonify({'error': str(e)}), 500
 
 @files_bp.route('/<file_id>', methods=['GET'])
@@ -103,20 +500,99 @@ def get_file(current_user, file_id):
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@files_bp.route('/<file_id>', methods=['DELETE'])
+@token_required
+def delete_file(current_user, file_id):
+    """Delete a file; its blob is removed once no other file shares it."""
+    try:
+        file = File.query.filter_by(id=file_id, user_id=current_user.id).first()
+        
+        if not file:
+            return jsonify({'error': 'File not found'}), 404
+        
+        content_hash = file.content_hash
+        OCRJob.query.filter_by(file_id=file.id).delete()
+        UploadSession.query.filter_by(file_id=file.id).update({'file_id': None})
+        ImportItem.query.filter_by(file_id=file.id).update({'file_id': None})
+        db.session.delete(file)
+        
+        # Log the action
+        audit_log = AuditLog(
+            user_id=current_user.id,
+            action='file_delete',
+            entity_type='file',
+            entity_id=file_id,
+            payload={'filename': file.file_name, 'sha256': content_hash}
+        )
+        db.session.add(audit_log)
+        db.session.commit()
+        
+        # Files uploaded before content addressing own their path outright
+        if content_hash:
+            release_blob(content_hash)
+        elif os.path.exists(file.storage_url):
+            os.remove(file.storage_url)
+        
+        return jsonify({'message': 'File deleted successfully'}), 200
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
 @files_bp.route('/<file_id>/download', methods=['GET'])
 @token_required
 def download_file(current_user, file_id):
-    """Download a file."""
+    """Download a file, answering conditional and Range requests."""
+    try:
+        file = File.query.filter_by(id=file_id, user_id=current_user.id).first()
+        
+        if not file:
+            return jsonify({'error': 'File not found'}), 404
+        
+        # Object storage serves the bytes itself through a short-lived presigned URL
+        url = get_storage().presigned_url(file.content_hash, file.file_name, file.mime_type) if file.content_hash else None
+        if url:
+            return redirect(url, code=302)
+        
+        # The content hash is a strong validator; older files fall back to one derived from mtime and size
+        if DOWNLOAD_OFFLOAD and file.content_hash:
+            return offload_download(file, file.content_hash)
+        
+        response = send_file(
+            file.storage_url,
+            mimetype=file.mime_type,
+            as_attachment=True,
+            download_name=file.file_name,
+            conditional=True,
+            etag=file.content_hash or True
+        )
+        response.cache_control.private = True
+        response.cache_control.no_cache = True
+        return response
+        
+    except FileNotFoundError:
+        return jsonify({'error': 'File not found on disk'}), 404
+    except RequestedRangeNotSatisfiable as e:
+        # Tells the client the file size in Content-Range
+        return e
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@files_bp.route('/<file_id>/url', methods=['GET'])
+@token_required
+def get_download_url(current_user, file_id):
+    """Get a URL the file can be fetched from without the API's auth header."""
     try:
         file = File.query.filter_by(id=file_id, user_id=current_user.id).first()
         
         if not file:
             return jsonify({'error': 'File not found'}), 404
         
-        if not os.path.exists(file.storage_url):
-            return jsonify({'error': 'File not found on disk'}), 404
+        url = get_storage().presigned_url(file.content_hash, file.file_name, file.mime_type) if file.content_hash else None
+        if not url:
+            return jsonify({'url': None, 'presigned': False}), 200
         
-        return send_file(file.storage_url, as_attachment=True, download_name=file.file_name)
+        return jsonify({'url': url, 'presigned': True, 'expires_in': S3_PRESIGN_EXPIRES}), 200
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -124,18 +600,121 @@ def download_file(current_user, file_id):
 @files_bp.route('/import', methods=['POST'])
 @token_required
 def import_file(current_user):
-    """Import a file from cloud storage (placeholder for future implementation)."""
+    """Import files or a whole folder from a cloud provider; files are transferred in the background."""
     try:
         data = request.get_json()
         
-        # This is a placeholder for cloud import functionality
-        # In production, implement OAuth flows for Google Drive, Dropbox, OneDrive
+        # Validate input
+        if not data or not data.get('source'):
+            return jsonify({'error': 'source is required'}), 400
+        
+        try:
+            provider = get_import_provider(data['source'], data.get('credentials'))
+            if data.get('file_ids'):
+                entries = [provider.get_file(provider_file_id) for provider_file_id in data['file_ids']]
+            else:
+                entries = provider.list_files(data.get('folder_id'))
+        except (ValueError, OSError) as e:
+            return jsonify({'error': str(e)}), 400
+        
+        job = ImportJob(
+            user_id=current_user.id,
+            source=provider.name,
+            folder_id=data.get('folder_id'),
+            doc_type=data.get('doc_type', 'resume') if data.get('ocr') else None,
+            status='queued'
+        )
+        db.session.add(job)
+        db.session.flush()
+        
+        skipped = []
+        items = []
+        for entry in entries:
+            filename = secure_filename(entry['name'])
+            if len(items) >= IMPORT_MAX_FILES:
+                skipped.append({'name': entry['name'], 'error': f'Import is limited to {IMPORT_MAX_FILES} files'})
+            elif not filename or not allowed_file(filename):
+                skipped.append({'name': entry['name'], 'error': 'File type not allowed'})
+            else:
+                items.append(ImportItem(
+                    job_id=job.id,
+                    provider_file_id=entry['id'],
+                    file_name=filename,
+                    mime_type=get_mime_type(filename),
+                    size=entry.get('size'),
+                    checksum=entry.get('checksum'),
+                    checksum_algorithm=provider.checksum_algorithm if entry.get('checksum') else None,
+                    status='queued'
+                ))
+        
+        if not items:
+            db.session.rollback()
+            return jsonify({'error': 'No files to import', 'skipped': skipped}), 400
+        db.session.add_all(items)
+        
+        # Log the action
+        audit_log = AuditLog(
+            user_id=current_user.id,
+            action='import_start',
+            entity_type='import_job',
+            entity_id=job.id,
+            payload={'source': provider.name, 'folder_id': job.folder_id, 'files': len(items)}
+        )
+        db.session.add(audit_log)
+        db.session.commit()
+        
+        get_import_runner(current_app._get_current_object()).submit(job.id, provider)
         
         return jsonify({
-            'message': 'Cloud import feature coming soon',
-            'requested_source': data.get('source')
-        }), 501
+            'message': f'Importing {len(items)} files',
+            'job': job.to_dict(),
+            'skipped': skipped
+        }), 202
         
     except Exception as e:
+        db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
+@files_bp.route('/import/<job_id>', methods=['GET'])
+@token_required
+def get_import_job(current_user, job_id):
+    """Get the progress of an import job and each of its files."""
+    try:
+        job = ImportJob.query.filter_by(id=job_id, user_id=current_user.id).first()
+        
+        if not job:
+            return jsonify({'error': 'Import job not found'}), 404
+        
+        return jsonify({'job': job.to_dict(include_items=True)}), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@files_bp.route('/import/<job_id>/resume', methods=['POST'])
+@token_required
+def resume_import_job(current_user, job_id):
+    """Retry the unfinished files of an import job, continuing partial downloads."""
+    try:
+        data = request.get_json(silent=True) or {}
+        job = ImportJob.query.filter_by(id=job_id, user_id=current_user.id).first()
+        
+        if not job:
+            return jsonify({'error': 'Import job not found'}), 404
+        
+        runner = get_import_runner(current_app._get_current_object())
+        if runner.is_active(job.id):
+            return jsonify({'error': 'Import job is still running'}), 409
+        
+        # Provider credentials are never stored, so the client sends them again
+        try:
+            provider = get_import_provider(job.source, data.get('credentials'))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        runner.submit(job.id, provider)
+        
+        return jsonify({'message': 'Import resumed', 'job': job.to_dict()}), 202
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
@@ -1,11 +1,93 @@
-from flask import Blueprint, request, jsonify
-from src.models.models import db, Letter, Profile, Company, APICredential, AuditLog
+from flask import Blueprint, Response, request, jsonify, current_app, stream_with_context
+from concurrent.futures import FIRST_COMPLETED, wait
+from functools import partial
+import os
+from src.models.models import db, Letter, Profile, Company, AuditLog, generate_uuid
 from src.utils.auth import token_required
-from src.utils.llm import generate_cover_letter
-from src.utils.encryption import decrypt_api_key
+from src.utils.llm import generate_cover_letter, stream_cover_letter
+from src.utils.llm_providers import get_user_api_key
+from src.utils.llm_executor import LLMQueueFull, get_llm_executor, queue_llm_task
+from src.utils.llm_retry import LLMUnavailable
+from src.utils.sse import sse_event, SSE_HEADERS
 
 letter_bp = Blueprint('letter', __name__)
 
+# Companies a single batch request may generate letters for
+LETTER_BATCH_MAX_COMPANIES = int(os.environ.get('LETTER_BATCH_MAX_COMPANIES', 50))
+
+def get_profile_data(profile):
+    """Get the profile fields used in cover letter prompts."""
+    return {
+        'sectors': profile.sectors or [],
+        'roles': profile.roles or [],
+        'skills': profile.skills or [],
+        'summary': profile.summary or ''
+    }
+
+def get_company_data(company):
+    """Get the company fields used in cover letter prompts."""
+    return {
+        'name': company.name,
+        'summary': company.summary or '',
+        'focus_areas': company.focus_areas or [],
+        'requirements': company.requirements or []
+    }
+
+def save_letters(user_id, profile, generated, language, tone, model, streamed=False, batch_id=None):
+    """Create the letter records of generated (company, letter text) pairs and log the actions in one commit."""
+    letters = [
+        Letter(
+            user_id=user_id,
+            profile_id=profile.id,
+            company_id=company.id,
+            language=language,
+            tone=tone,
+            subject=f"Application for position at {company.name}",
+            body=letter_text,
+            status='draft'
+        )
+        for company, letter_text in generated
+    ]
+    db.session.add_all(letters)
+    db.session.flush()
+    
+    # Log the actions
+    audit_logs = []
+    for letter in letters:
+        payload = {'profile_id': profile.id, 'company_id': letter.company_id, 'model': model}
+        if streamed:
+            payload['streamed'] = True
+        if batch_id:
+            payload['batch_id'] = batch_id
+        audit_logs.append(AuditLog(
+            user_id=user_id,
+            action='letter_generated',
+            entity_type='letter',
+            entity_id=letter.id,
+            payload=payload
+        ))
+    db.session.add_all(audit_logs)
+    db.session.commit()
+    return letters
+
+def save_letter(user_id, profile, company, language, tone, model, letter_text, streamed=False):
+    """Create the letter record of a generated letter and log the action."""
+    return save_letters(user_id, profile, [(company, letter_text)], language, tone, model, streamed=streamed)[0]
+
+def generate_letter_task(user_id, profile_id, company_id, language, tone, api_key, model, provider='openai'):
+    """Generate and save a cover letter; runs on the LLM executor."""
+    profile = Profile.query.filter_by(id=profile_id, user_id=user_id).first()
+    company = Company.query.filter_by(id=company_id, user_id=user_id).first()
+    if not profile or not company:
+        raise Exception('Profile or company no longer exists')
+    
+    result = generate_cover_letter(get_profile_data(profile), get_company_data(company), language=language, tone=tone, api_key=api_key, model=model, provider=provider)
+    if result['status'] == 'failed':
+        raise Exception(result.get('error', 'Letter generation failed'))
+    
+    letter = save_letter(user_id, profile, company, language, tone, model, result['letter'])
+    return {'letter': letter.to_dict()}
+
 @letter_bp.route('/generate', methods=['POST'])
 @token_required
 def generate_letter(current_user):
@@ -32,72 +114,201 @@ def generate_letter(current_user):
         tone = data.get('tone', 'formal')
         
         # Get API key
-        api_key = None
         provider = data.get('provider', 'openai')
-        credential = APICredential.query.filter_by(user_id=current_user.id, provider=provider).first()
-        if credential:
-            api_key = decrypt_api_key(credential.api_key_enc)
+        api_key = get_user_api_key(current_user.id, provider)
         
         # Get model
         model = data.get('model', 'gpt-4.1-mini')
         
-        # Prepare profile and company data
-        profile_data = {
-            'sectors': profile.sectors or [],
-            'roles': profile.roles or [],
-            'skills': profile.skills or [],
-            'summary': profile.summary or ''
-        }
+        # The task runs in its own session, so it only captures plain values
+        user_id, profile_id, company_id = current_user.id, profile.id, company.id
+        task = lambda: generate_letter_task(user_id, profile_id, company_id, language, tone, api_key, model, provider)
+        app = current_app._get_current_object()
         
-        company_data = {
-            'name': company.name,
-            'summary': company.summary or '',
-            'focus_areas': company.focus_areas or [],
-            'requirements': company.requirements or []
-        }
+        # Task mode is the default: queue the call and return immediately; "async": false waits for the result
+        if data.get('async', True):
+            llm_task = queue_llm_task(app, current_user.id, 'generate_letter', task, provider, api_key)
+            return jsonify({'message': 'Letter generation queued', 'task': llm_task.to_dict()}), 202
         
-        # Generate cover letter
-        result = generate_cover_letter(profile_data, company_data, language=language, tone=tone, api_key=api_key, model=model)
+        # Generate cover letter; the call waits for a free slot of its provider and key
+        result = get_llm_executor(app).run(task, provider, api_key)
         
-        if result['status'] == 'failed':
-            return jsonify({'error': result.get('error', 'Letter generation failed')}), 500
+        return jsonify({
+            'message': 'Letter generated successfully',
+            'letter': result['letter']
+        }), 200
         
-        letter_text = result['letter']
+    except LLMQueueFull as e:
+        return jsonify({'error': str(e)}), 503, {'Retry-After': '5'}
+    except LLMUnavailable as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 503, {'Retry-After': str(e.retry_after)}
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+@letter_bp.route('/generate/stream', methods=['POST'])
+@token_required
+def generate_letter_stream(current_user):
+    """Generate a cover letter, streaming its text as server-sent events while it is written."""
+    try:
+        data = request.get_json()
         
-        # Create letter record
-        letter = Letter(
-            user_id=current_user.id,
-            profile_id=profile.id,
-            company_id=company.id,
-            language=language,
-            tone=tone,
-            subject=f"Application for position at {company.name}",
-            body=letter_text,
-            status='draft'
-        )
+        # Validate input
+        if not data or not data.get('profile_id') or not data.get('company_id'):
+            return jsonify({'error': 'profile_id and company_id are required'}), 400
         
-        db.session.add(letter)
-        db.session.commit()
+        # Get profile
+        profile = Profile.query.filter_by(id=data['profile_id'], user_id=current_user.id).first()
+        if not profile:
+            return jsonify({'error': 'Profile not found'}), 404
         
-        # Log the action
-        audit_log = AuditLog(
-            user_id=current_user.id,
-            action='letter_generated',
-            entity_type='letter',
-            entity_id=letter.id,
-            payload={'profile_id': profile.id, 'company_id': company.id, 'model': model}
-        )
-        db.session.add(audit_log)
-        db.session.commit()
+        # Get company
+        company = Company.query.filter_by(id=data['company_id'], user_id=current_user.id).first()
+        if not company:
+            return jsonify({'error': 'Company not found'}), 404
         
-        return jsonify({
-            'message': 'Letter generated successfully',
-            'letter': letter.to_dict()
-        }), 200
+        # Get parameters
+        language = data.get('language', 'en')
+        tone = data.get('tone', 'formal')
+        model = data.get('model', 'gpt-4.1-mini')
+        provider = data.get('provider', 'openai')
+        api_key = get_user_api_key(current_user.id, provider)
+        
+        user_id = current_user.id
+        profile_data = get_profile_data(profile)
+        company_data = get_company_data(company)
         
     except Exception as e:
-        db.session.rollback()
         return jsonify({'error': str(e)}), 500
+    
+    def generate():
+        tokens = stream_cover_letter(profile_data, company_data, language=language, tone=tone, api_key=api_key, model=model, provider=provider)
+        try:
+            parts = []
+            for delta in tokens:
+                parts.append(delta)
+                yield sse_event('token', {'text': delta})
+            
+            # Nothing is saved unless the whole letter arrived
+            letter = save_letter(user_id, profile, company, language, tone, model, "".join(parts).strip(), streamed=True)
+            
+            yield sse_event('done', {
+                'message': 'Letter generated successfully',
+                'letter': letter.to_dict()
+            })
+            
+        except Exception as e:
+            db.session.rollback()
+            yield sse_event('error', {'error': str(e)})
+        finally:
+            # On client disconnect the server closes this generator; closing the token stream aborts the upstream request
+            tokens.close()
+    
+    return Response(stream_with_context(generate()), mimetype='text/event-stream', headers=SSE_HEADERS)
+
+@letter_bp.route('/generate/batch', methods=['POST'])
+@token_required
+def generate_letter_batch(current_user):
+    """Generate cover letters for one profile and many companies at once, streaming each letter as server-sent events once it is saved."""
+    try:
+        data = request.get_json()
+        
+        # Validate input
+        if not data or not data.get('profile_id') or not data.get('company_ids'):
+            return jsonify({'error': 'profile_id and company_ids are required'}), 400
+        
+        company_ids = list(dict.fromkeys(data['company_ids']))
+        if len(company_ids) > LETTER_BATCH_MAX_COMPANIES:
+            return jsonify({'error': f'A batch is limited to {LETTER_BATCH_MAX_COMPANIES} companies'}), 400
+        
+        # Get profile
+        profile = Profile.query.filter_by(id=data['profile_id'], user_id=current_user.id).first()
+        if not profile:
+            return jsonify({'error': 'Profile not found'}), 404
+        
+        # Get companies
+        companies = Company.query.filter(Company.id.in_(company_ids), Company.user_id == current_user.id).all()
+        found = {company.id for company in companies}
+        missing = [company_id for company_id in company_ids if company_id not in found]
+        if missing:
+            return jsonify({'error': 'Company not found', 'company_ids': missing}), 404
+        companies.sort(key=lambda company: company_ids.index(company.id))
+        
+        # Get parameters
+        language = data.get('language', 'en')
+        tone = data.get('tone', 'formal')
+        model = data.get('model', 'gpt-4.1-mini')
+        provider = data.get('provider', 'openai')
+        api_key = get_user_api_key(current_user.id, provider)
+        
+        user_id = current_user.id
+        batch_id = generate_uuid()
+        profile_data = get_profile_data(profile)
+        
+        # Queue every letter up front; the executor runs them as soon as the provider and key have free slots
+        executor = get_llm_executor(current_app._get_current_object())
+        futures = {}
+        try:
+            for company in companies:
+                call = partial(generate_cover_letter, profile_data, get_company_data(company), language=language, tone=tone, api_key=api_key, model=model, provider=provider)
+                futures[executor.submit(call, provider, api_key)] = company
+        except LLMQueueFull:
+            for future in futures:
+                future.cancel()
+            raise
+        
+    except LLMQueueFull as e:
+        return jsonify({'error': str(e)}), 503, {'Retry-After': '5'}
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    
+    def generate():
+        pending = set(futures)
+        generated_count = 0
+        failed_count = 0
+        try:
+            yield sse_event('queued', {'batch_id': batch_id, 'companies': len(futures)})
+            
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                
+                # Letters that finished together are saved together
+                generated = []
+                for future in done:
+                    company = futures[future]
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        result = {'status': 'failed', 'error': str(e)}
+                    
+                    if result['status'] == 'failed':
+                        failed_count += 1
+                        yield sse_event('failed', {'company_id': company.id, 'error': result.get('error', 'Letter generation failed')})
+                    else:
+                        generated.append((company, result['letter']))
+                
+                if generated:
+                    for letter in save_letters(user_id, profile, generated, language, tone, model, batch_id=batch_id):
+                        generated_count += 1
+                        yield sse_event('letter', {'company_id': letter.company_id, 'letter': letter.to_dict()})
+            
+            yield sse_event('done', {
+                'message': 'Letters generated',
+                'batch_id': batch_id,
+                'generated': generated_count,
+                'failed': failed_count
+            })
+            
+        except Exception as e:
+            db.session.rollback()
+            yield sse_event('error', {'error': str(e)})
+        finally:
+            # Letters that have not started yet are dropped when the client goes away
+            for future in pending:
+                future.cancel()
+    
+    return Response(stream_with_context(generate()), mimetype='text/event-stream', headers=SSE_HEADERS)
 
 @letter_bp.route('/<letter_id>', methods=['GET'])
 @token_required
@@ -1,7 +1,11 @@
-from flask import Blueprint, request, jsonify
-from src.models.models import db, File, Document, AuditLog
+from flask import Blueprint, Response, request, jsonify, current_app, stream_with_context
+from src.models.models import db, File, Document, OCRJob, AuditLog
 from src.utils.auth import token_required
-from src.utils.ocr import process_file_ocr
+from src.utils.ocr import iter_file_pages, detect_language
+from src.utils.ocr_cache import run_cached_ocr, lookup_ocr_cache, store_cached_ocr, get_ocr_cache_stats
+from src.utils.ocr_jobs import save_ocr_document, get_ocr_job_queue
+from src.utils.sse import sse_event, SSE_HEADERS
+from src.utils.storage import open_local_file
 
 ocr_bp = Blueprint('ocr', __name__)
 
@@ -21,58 +25,129 @@ def run_ocr(current_user):
         if not file:
             return jsonify({'error': 'File not found'}), 404
         
-        # Process OCR
-        ocr_result = process_file_ocr(file.storage_url, file.mime_type)
-        
-        if ocr_result['status'] == 'failed':
-            return jsonify({'error': ocr_result.get('error', 'OCR processing failed')}), 500
-        
-        # Create or update document
         doc_type = data.get('doc_type', 'resume')
-        existing_doc = Document.query.filter_by(file_id=file.id, user_id=current_user.id).first()
-        
-        if existing_doc:
-            # Update existing document
-            existing_doc.raw_text = ocr_result['text']
-            existing_doc.language = ocr_result['language']
-            existing_doc.status = 'ocred'
-            existing_doc.version += 1
-            document = existing_doc
-        else:
-            # Create new document
-            document = Document(
+        force = bool(data.get('force', False))
+        
+        # Job mode: queue the work and return immediately
+        if data.get('async'):
+            job = OCRJob(
                 user_id=current_user.id,
                 file_id=file.id,
                 doc_type=doc_type,
-                language=ocr_result['language'],
-                raw_text=ocr_result['text'],
-                status='ocred'
+                status='queued'
             )
-            db.session.add(document)
+            db.session.add(job)
+            db.session.commit()
+            
+            get_ocr_job_queue(current_app._get_current_object()).submit(job.id, force=force)
+            
+            return jsonify({
+                'message': 'OCR job queued',
+                'job': job.to_dict()
+            }), 202
         
-        db.session.commit()
+        # Process OCR
+        ocr_result = run_cached_ocr(file, force=force)
         
-        # Log the action
-        audit_log = AuditLog(
-            user_id=current_user.id,
-            action='ocr_processed',
-            entity_type='document',
-            entity_id=document.id,
-            payload={'file_id': file.id, 'language': ocr_result['language']}
-        )
-        db.session.add(audit_log)
-        db.session.commit()
+        if ocr_result['status'] == 'failed':
+            return jsonify({'error': ocr_result.get('error', 'OCR processing failed')}), 500
+        
+        # Create or update document
+        document = save_ocr_document(current_user.id, file, doc_type, ocr_result)
         
         return jsonify({
             'message': 'OCR processing completed',
             'document': document.to_dict(),
-            'text': ocr_result['text']
+            'text': ocr_result['text'],
+            'cached': ocr_result.get('cached', False)
         }), 200
         
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
+@ocr_bp.route('/stream', methods=['POST'])
+@token_required
+def stream_ocr(current_user):
+    """Run OCR on an uploaded file, streaming each page's text as server-sent events."""
+    try:
+        data = request.get_json()
+        
+        # Validate input
+        if not data or not data.get('file_id'):
+            return jsonify({'error': 'file_id is required'}), 400
+        
+        # Get file
+        file = File.query.filter_by(id=data['file_id'], user_id=current_user.id).first()
+        if not file:
+            return jsonify({'error': 'File not found'}), 404
+        
+        doc_type = data.get('doc_type', 'resume')
+        force = bool(data.get('force', False))
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    
+    def generate():
+        try:
+            content_hash, key, ocr_result = lookup_ocr_cache(file, force=force)
+            
+            if ocr_result:
+                yield sse_event('page', {'page': 1, 'pages': 1, 'text': ocr_result['text']})
+                yield sse_event('progress', {'completed': 1, 'pages': 1})
+            else:
+                # Pages are sent as soon as they are extracted; only their text is kept for the document
+                pages = []
+                with open_local_file(file) as file_path:
+                    for page_number, page_count, page_text in iter_file_pages(file_path, file.mime_type):
+                        pages.append(page_text)
+                        yield sse_event('page', {'page': page_number, 'pages': page_count, 'text': page_text})
+                        yield sse_event('progress', {'completed': page_number, 'pages': page_count})
+                
+                text = "\n".join(page_text for page_text in pages if page_text)
+                ocr_result = {'text': text, 'language': detect_language(text), 'status': 'success'}
+                store_cached_ocr(key, content_hash, ocr_result)
+            
+            # Create or update document
+            document = save_ocr_document(current_user.id, file, doc_type, ocr_result)
+            
+            yield sse_event('done', {
+                'message': 'OCR processing completed',
+                'document': document.to_dict(),
+                'cached': ocr_result.get('cached', False)
+            })
+            
+        except Exception as e:
+            db.session.rollback()
+            yield sse_event('error', {'error': str(e)})
+    
+    return Response(stream_with_context(generate()), mimetype='text/event-stream', headers=SSE_HEADERS)
+
+@ocr_bp.route('/cache/stats', methods=['GET'])
+@token_required
+def get_cache_stats(current_user):
+    """Get OCR cache statistics."""
+    try:
+        return jsonify({'stats': get_ocr_cache_stats()}), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@ocr_bp.route('/jobs/<job_id>', methods=['GET'])
+@token_required
+def get_ocr_job(current_user, job_id):
+    """Get the status of an OCR job."""
+    try:
+        job = OCRJob.query.filter_by(id=job_id, user_id=current_user.id).first()
+        
+        if not job:
+            return jsonify({'error': 'Job not found'}), 404
+        
+        return jsonify({'job': job.to_dict()}), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @ocr_bp.route('/<document_id>', methods=['GET'])
 @token_required
 def get_ocr_result(current_user, document_id):
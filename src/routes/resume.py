@@ -1,11 +1,61 @@
-from flask import Blueprint, request, jsonify
-from src.models.models import db, Document, Profile, APICredential, AuditLog
+from flask import Blueprint, request, jsonify, current_app
+from src.models.models import db, Document, Profile, AuditLog
 from src.utils.auth import token_required
 from src.utils.llm import analyze_resume
-from src.utils.encryption import decrypt_api_key
+from src.utils.llm_providers import get_user_api_key
+from src.utils.llm_executor import LLMQueueFull, get_llm_executor, queue_llm_task
+from src.utils.llm_retry import LLMUnavailable
 
 resume_bp = Blueprint('resume', __name__)
 
+def analyze_resume_task(user_id, document_id, text, api_key, model, force, provider='openai'):
+    """Analyze a resume and create or update its profile; runs on the LLM executor."""
+    # Analyze resume
+    result = analyze_resume(text, api_key=api_key, model=model, force=force, provider=provider)
+    
+    if result['status'] == 'failed':
+        raise Exception(result.get('error', 'Resume analysis failed'))
+    
+    analysis = result['analysis']
+    
+    # Create or update profile
+    existing_profile = Profile.query.filter_by(document_id=document_id, user_id=user_id).first()
+    
+    if existing_profile:
+        # Update existing profile
+        existing_profile.sectors = analysis.get('sectors', [])
+        existing_profile.roles = analysis.get('roles', [])
+        existing_profile.skills = analysis.get('skills', [])
+        existing_profile.summary = analysis.get('summary', '')
+        profile = existing_profile
+    else:
+        # Create new profile
+        profile = Profile(
+            user_id=user_id,
+            document_id=document_id,
+            sectors=analysis.get('sectors', []),
+            roles=analysis.get('roles', []),
+            skills=analysis.get('skills', []),
+            summary=analysis.get('summary', '')
+        )
+        db.session.add(profile)
+    
+    db.session.commit()
+    
+    # Log the action
+    audit_log = AuditLog(
+        user_id=user_id,
+        action='resume_analyzed',
+        entity_type='profile',
+        entity_id=profile.id,
+        payload={'document_id': document_id, 'model': model, 'cached': result.get('cached', False),
+                 'tokens': result.get('tokens'), 'chunks': result.get('chunks', 1)}
+    )
+    db.session.add(audit_log)
+    db.session.commit()
+    
+    return {'profile': profile.to_dict(), 'cached': result.get('cached', False)}
+
 @resume_bp.route('/analyze', methods=['POST'])
 @token_required
 def analyze_resume_endpoint(current_user):
@@ -28,63 +78,36 @@ def analyze_resume_endpoint(current_user):
             return jsonify({'error': 'Document has no text to analyze'}), 400
         
         # Get API key
-        api_key = None
         provider = data.get('provider', 'openai')
-        credential = APICredential.query.filter_by(user_id=current_user.id, provider=provider).first()
-        if credential:
-            api_key = decrypt_api_key(credential.api_key_enc)
+        api_key = get_user_api_key(current_user.id, provider)
         
         # Get model
         model = data.get('model', 'gpt-4.1-mini')
         
-        # Analyze resume
-        result = analyze_resume(text_to_analyze, api_key=api_key, model=model)
-        
-        if result['status'] == 'failed':
-            return jsonify({'error': result.get('error', 'Resume analysis failed')}), 500
-        
-        analysis = result['analysis']
-        
-        # Create or update profile
-        existing_profile = Profile.query.filter_by(document_id=document.id, user_id=current_user.id).first()
-        
-        if existing_profile:
-            # Update existing profile
-            existing_profile.sectors = analysis.get('sectors', [])
-            existing_profile.roles = analysis.get('roles', [])
-            existing_profile.skills = analysis.get('skills', [])
-            existing_profile.summary = analysis.get('summary', '')
-            profile = existing_profile
-        else:
-            # Create new profile
-            profile = Profile(
-                user_id=current_user.id,
-                document_id=document.id,
-                sectors=analysis.get('sectors', []),
-                roles=analysis.get('roles', []),
-                skills=analysis.get('skills', []),
-                summary=analysis.get('summary', '')
-            )
-            db.session.add(profile)
+        # The task runs in its own session, so it only captures plain values
+        user_id, document_id = current_user.id, document.id
+        task = lambda: analyze_resume_task(user_id, document_id, text_to_analyze, api_key, model, bool(data.get('force', False)), provider)
+        app = current_app._get_current_object()
         
-        db.session.commit()
+        # Task mode is the default: queue the call and return immediately; "async": false waits for the result
+        if data.get('async', True):
+            llm_task = queue_llm_task(app, current_user.id, 'analyze_resume', task, provider, api_key)
+            return jsonify({'message': 'Resume analysis queued', 'task': llm_task.to_dict()}), 202
         
-        # Log the action
-        audit_log = AuditLog(
-            user_id=current_user.id,
-            action='resume_analyzed',
-            entity_type='profile',
-            entity_id=profile.id,
-            payload={'document_id': document.id, 'model': model}
-        )
-        db.session.add(audit_log)
-        db.session.commit()
+        # Analyze resume; the call waits for a free slot of its provider and key
+        result = get_llm_executor(app).run(task, provider, api_key)
         
         return jsonify({
             'message': 'Resume analyzed successfully',
-            'profile': profile.to_dict()
+            'profile': result['profile'],
+            'cached': result['cached']
         }), 200
         
+    except LLMQueueFull as e:
+        return jsonify({'error': str(e)}), 503, {'Retry-After': '5'}
+    except LLMUnavailable as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 503, {'Retry-After': str(e.retry_after)}
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
@@ -1,8 +1,12 @@
 from flask import Blueprint, request, jsonify
+from datetime import datetime, timedelta
 from src.models.models import db, APICredential, AuditLog
 from src.utils.auth import token_required
 from src.utils.encryption import encrypt_api_key, decrypt_api_key
 from src.utils.llm import validate_api_key
+from src.utils.llm_cache import get_llm_cache_stats
+from src.utils.llm_providers import LLM_PROVIDERS
+from src.utils.llm_usage import get_llm_usage_report
 
 settings_bp = Blueprint('settings', __name__)
 
@@ -10,6 +14,8 @@ AVAILABLE_MODELS = [
     {'id': 'gpt-4.1-mini', 'name': 'GPT-4.1 Mini', 'provider': 'openai'},
     {'id': 'gpt-4.1-nano', 'name': 'GPT-4.1 Nano', 'provider': 'openai'},
     {'id': 'gemini-2.5-flash', 'name': 'Gemini 2.5 Flash', 'provider': 'google'},
+    # Routed to whichever configured backend is currently fastest
+    {'id': 'auto', 'name': 'Fastest available', 'provider': 'auto'},
 ]
 
 @settings_bp.route('/models', methods=['GET'])
@@ -18,6 +24,27 @@ def get_models(current_user):
     """Get available LLM models."""
     return jsonify({'models': AVAILABLE_MODELS}), 200
 
+@settings_bp.route('/llm-cache/stats', methods=['GET'])
+@token_required
+def get_llm_cache_stats_endpoint(current_user):
+    """Get LLM response cache statistics."""
+    try:
+        return jsonify({'stats': get_llm_cache_stats()}), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@settings_bp.route('/llm-usage/report', methods=['GET'])
+@token_required
+def get_llm_usage_report_endpoint(current_user):
+    """Get the prompt cache hit ratio and latency of each prompt type over the last days."""
+    try:
+        days = request.args.get('days', 7, type=int)
+        return jsonify({'report': get_llm_usage_report(datetime.utcnow() - timedelta(days=days))}), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @settings_bp.route('/api-key', methods=['POST'])
 @token_required
 def save_api_key(current_user):
@@ -33,11 +60,17 @@ def save_api_key(current_user):
         api_key = data['api_key']
         
         # Validate API key format
-        if not api_key.startswith('sk-'):
+        llm_provider = LLM_PROVIDERS.get(provider)
+        if llm_provider:
+            if not llm_provider.is_key_format_valid(api_key):
+                return jsonify({'error': f'Invalid API key format; {provider} keys start with {llm_provider.key_prefix}'}), 400
+        elif not api_key.startswith('sk-'):
             return jsonify({'error': 'Invalid API key format'}), 400
         
         # Optionally validate the key by making a test request
         if data.get('validate', False):
+            if not llm_provider:
+                return jsonify({'error': f'Validation is not supported for provider {provider}'}), 400
             is_valid = validate_api_key(api_key, provider)
             if not is_valid:
                 return jsonify({'error': 'API key validation failed'}), 400
@@ -0,0 +1,37 @@
+from flask import Blueprint, jsonify, current_app
+from src.models.models import LLMTask
+from src.utils.auth import token_required
+from src.utils.llm_executor import get_llm_executor
+from src.utils.llm_retry import get_llm_retry_stats
+from src.utils.llm_router import get_router_stats
+
+tasks_bp = Blueprint('tasks', __name__)
+
+@tasks_bp.route('/stats', methods=['GET'])
+@token_required
+def get_task_stats(current_user):
+    """Get LLM queue depth, wait times and in-flight calls of this process, and the state of its retry machinery and router."""
+    try:
+        return jsonify({
+            'stats': get_llm_executor(current_app._get_current_object()).get_stats(),
+            'retries': get_llm_retry_stats(),
+            'router': get_router_stats()
+        }), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@tasks_bp.route('/<task_id>', methods=['GET'])
+@token_required
+def get_task(current_user, task_id):
+    """Get the status and result of a queued LLM task."""
+    try:
+        task = LLMTask.query.filter_by(id=task_id, user_id=current_user.id).first()
+        
+        if not task:
+            return jsonify({'error': 'Task not found'}), 404
+        
+        return jsonify({'task': task.to_dict()}), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
@@ -0,0 +1,355 @@
+import atexit
+import hashlib
+import json
+import os
+import threading
+import time
+import urllib.parse
+import urllib.request
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from src.models.models import db, File, ImportJob, ImportItem, OCRJob, AuditLog
+from src.utils.ocr_jobs import get_ocr_job_queue
+from src.utils.storage import UPLOAD_FOLDER, create_temp_file, commit_blob, reference_blobs, release_failed_blobs
+
+# Files transferred at the same time across all imports of this process
+IMPORT_CONCURRENCY = int(os.environ.get('IMPORT_CONCURRENCY', 4))
+# Transfer attempts per file before it is marked failed; each retry resumes where the last one stopped
+IMPORT_MAX_ATTEMPTS = int(os.environ.get('IMPORT_MAX_ATTEMPTS', 3))
+# Base delay between attempts, in seconds, doubled on every retry
+IMPORT_RETRY_DELAY = float(os.environ.get('IMPORT_RETRY_DELAY', 1.0))
+# Progress is written to the database after every this many bytes
+IMPORT_PROGRESS_BYTES = 4 * 1024 * 1024
+# The local provider reads the server's own disk, so it is only offered when enabled for development and tests
+IMPORT_LOCAL_ENABLED = os.environ.get('IMPORT_LOCAL_ENABLED', '0') == '1'
+# Folder the local provider imports from
+IMPORT_LOCAL_ROOT = os.environ.get('IMPORT_LOCAL_ROOT', os.path.join(UPLOAD_FOLDER, 'import'))
+
+_runner = None
+_runner_lock = threading.Lock()
+
+class ImportProvider(ABC):
+    """Source of importable files; subclasses list files and stream their bytes."""
+    name = None
+    # hashlib algorithm of the checksums the provider reports, or None if it reports none
+    checksum_algorithm = None
+
+    def __init__(self, credentials=None):
+        self.credentials = credentials or {}
+
+    @abstractmethod
+    def list_files(self, folder_id=None):
+        """List the files of a folder as dicts with id, name, size and checksum."""
+
+    @abstractmethod
+    def get_file(self, file_id):
+        """Describe a single file like list_files does."""
+
+    @abstractmethod
+    def iter_chunks(self, file_id, offset=0, chunk_size=1024 * 1024):
+        """Yield a file's bytes starting at offset."""
+
+class LocalProvider(ImportProvider):
+    """Imports from a folder on the server's disk; lets the whole pipeline run without a cloud account."""
+    name = 'local'
+
+    def __init__(self, credentials=None, root=None):
+        super().__init__(credentials)
+        self.root = os.path.realpath(root or IMPORT_LOCAL_ROOT)
+
+    def resolve(self, relative_path):
+        path = os.path.realpath(os.path.join(self.root, relative_path or ''))
+        if path != self.root and not path.startswith(self.root + os.sep):
+            raise ValueError(f"Path is outside the import folder: {relative_path}")
+        return path
+
+    def describe(self, path):
+        # No checksum: the transfer worker hashes the bytes as it copies them, so listing stays cheap
+        return {
+            'id': os.path.relpath(path, self.root).replace(os.sep, '/'),
+            'name': os.path.basename(path),
+            'size': os.path.getsize(path),
+            'checksum': None
+        }
+
+    def list_files(self, folder_id=None):
+        folder = self.resolve(folder_id)
+        files = []
+        for directory, _, names in os.walk(folder):
+            for name in sorted(names):
+                if not name.startswith('.'):
+                    files.append(self.describe(os.path.join(directory, name)))
+        return files
+
+    def get_file(self, file_id):
+        return self.describe(self.resolve(file_id))
+
+    def iter_chunks(self, file_id, offset=0, chunk_size=1024 * 1024):
+        with open(self.resolve(file_id), 'rb') as f:
+            f.seek(offset)
+            for chunk in iter(lambda: f.read(chunk_size), b''):
+                yield chunk
+
+class GoogleDriveProvider(ImportProvider):
+    """Imports from Google Drive with an OAuth access token obtained by the client."""
+    name = 'gdrive'
+    checksum_algorithm = 'md5'
+    API_URL = 'https://www.googleapis.com/drive/v3/files'
+    FIELDS = 'id,name,size,md5Checksum,mimeType'
+
+    def request(self, url, headers=None):
+        if not self.credentials.get('access_token'):
+            raise ValueError("Google Drive import requires an access_token")
+        headers = dict(headers or {}, Authorization=f"Bearer {self.credentials['access_token']}")
+        return urllib.request.urlopen(urllib.request.Request(url, headers=headers), timeout=60)
+
+    def describe(self, entry):
+        return {
+            'id': entry['id'],
+            'name': entry['name'],
+            'size': int(entry['size']) if entry.get('size') else None,
+            'checksum': entry.get('md5Checksum')
+        }
+
+    def list_files(self, folder_id=None):
+        query = f"'{folder_id or 'root'}' in parents and trashed = false and not mimeType contains 'application/vnd.google-apps.'"
+        files = []
+        page_token = None
+        while True:
+            params = {'q': query, 'fields': f'nextPageToken,files({self.FIELDS})', 'pageSize': 1000}
+            if page_token:
+                params['pageToken'] = page_token
+            with self.request(f"{self.API_URL}?{urllib.parse.urlencode(params)}") as response:
+                data = json.load(response)
+            files.extend(self.describe(entry) for entry in data.get('files', []))
+            page_token = data.get('nextPageToken')
+            if not page_token:
+                return files
+
+    def get_file(self, file_id):
+        with self.request(f"{self.API_URL}/{urllib.parse.quote(file_id)}?fields={self.FIELDS}") as response:
+            return self.describe(json.load(response))
+
+    def iter_chunks(self, file_id, offset=0, chunk_size=1024 * 1024):
+        headers = {'Range': f'bytes={offset}-'} if offset else {}
+        with self.request(f"{self.API_URL}/{urllib.parse.quote(file_id)}?alt=media", headers) as response:
+            if offset and response.status != 206:
+                raise Exception("Provider ignored the range request; cannot resume")
+            for chunk in iter(lambda: response.read(chunk_size), b''):
+                yield chunk
+
+# Import providers by File.source name
+IMPORT_PROVIDERS = {
+    GoogleDriveProvider.name: GoogleDriveProvider
+}
+if IMPORT_LOCAL_ENABLED:
+    IMPORT_PROVIDERS[LocalProvider.name] = LocalProvider
+
+def get_import_provider(source, credentials=None):
+    """Create the import provider for a source name."""
+    if source not in IMPORT_PROVIDERS:
+        raise ValueError(f"Unsupported import source: {source}")
+    return IMPORT_PROVIDERS[source](credentials)
+
+class ImportRunner:
+    """Transfers the items of import jobs on a bounded thread pool, resuming partial downloads on retry."""
+
+    def __init__(self, app, concurrency=IMPORT_CONCURRENCY):
+        self.app = app
+        self.executor = ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix='import')
+        self.lock = threading.Lock()
+        self.pending = {}
+        atexit.register(self.shutdown)
+
+    def is_active(self, job_id):
+        """Tell whether a job still has items scheduled in this process."""
+        with self.lock:
+            return job_id in self.pending
+
+    def submit(self, job_id, provider):
+        """Schedule every unfinished item of an import job."""
+        items = ImportItem.query.filter(ImportItem.job_id == job_id, ImportItem.status != 'done').all()
+        for item in items:
+            item.status = 'queued'
+            item.error = None
+        job = ImportJob.query.filter_by(id=job_id).first()
+        job.status = 'running' if items else 'done'
+        job.error = None
+        db.session.commit()
+
+        if not items:
+            return
+        with self.lock:
+            self.pending[job_id] = self.pending.get(job_id, 0) + len(items)
+        for item in items:
+            self.executor.submit(self._serve, job_id, item.id, provider)
+
+    def shutdown(self):
+        """Stop scheduling transfers; partial downloads stay on disk for a later resume."""
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def _serve(self, job_id, item_id, provider):
+        with self.app.app_context():
+            try:
+                self._process(item_id, provider)
+            except Exception as e:
+                db.session.rollback()
+                item = ImportItem.query.filter_by(id=item_id).first()
+                if item:
+                    item.status = 'failed'
+                    item.error = str(e)
+                    db.session.commit()
+            finally:
+                self._finish_item(job_id)
+
+    def _finish_item(self, job_id):
+        with self.lock:
+            self.pending[job_id] -= 1
+            if self.pending[job_id] > 0:
+                return
+            del self.pending[job_id]
+
+        job = ImportJob.query.filter_by(id=job_id).first()
+        statuses = {item.status for item in job.items}
+        if statuses <= {'done'}:
+            job.status = 'done'
+        elif 'done' in statuses:
+            job.status = 'partial'
+        else:
+            job.status = 'failed'
+        db.session.commit()
+
+    def _process(self, item_id, provider):
+        item = ImportItem.query.filter_by(id=item_id).first()
+        if not item or item.status != 'queued':
+            return
+        item.status = 'running'
+        db.session.commit()
+
+        for attempt in range(IMPORT_MAX_ATTEMPTS):
+            item.attempts += 1
+            db.session.commit()
+            try:
+                content_hash = self._transfer(item, provider)
+                break
+            except Exception as e:
+                db.session.rollback()
+                item.error = str(e)
+                db.session.commit()
+                if attempt + 1 == IMPORT_MAX_ATTEMPTS:
+                    raise
+                time.sleep(IMPORT_RETRY_DELAY * 2 ** attempt)
+
+        self._store(item, content_hash)
+
+    def _transfer(self, item, provider):
+        """Download an item into its temporary file, continuing a partial download, and verify it."""
+        if not item.temp_path or not os.path.exists(item.temp_path):
+            item.temp_path = create_temp_file()
+            item.bytes_done = 0
+            db.session.commit()
+
+        digest = hashlib.sha256()
+        checksum = None
+        if item.checksum and item.checksum_algorithm and item.checksum_algorithm != 'sha256':
+            checksum = hashlib.new(item.checksum_algorithm)
+
+        with open(item.temp_path, 'r+b') as f:
+            # Rehash what a previous attempt already fetched, then append from there
+            remaining = item.bytes_done
+            while remaining > 0:
+                chunk = f.read(min(1024 * 1024, remaining))
+                if not chunk:
+                    break
+                digest.update(chunk)
+                if checksum:
+                    checksum.update(chunk)
+                remaining -= len(chunk)
+            item.bytes_done -= remaining
+            f.seek(item.bytes_done)
+            f.truncate()
+
+            committed = item.bytes_done
+            try:
+                for chunk in provider.iter_chunks(item.provider_file_id, offset=item.bytes_done):
+                    f.write(chunk)
+                    digest.update(chunk)
+                    if checksum:
+                        checksum.update(chunk)
+                    item.bytes_done += len(chunk)
+                    if item.bytes_done - committed >= IMPORT_PROGRESS_BYTES:
+                        f.flush()
+                        db.session.commit()
+                        committed = item.bytes_done
+            finally:
+                # Only bytes that reached the file count towards a resume
+                f.flush()
+                item.bytes_done = f.tell()
+                db.session.commit()
+
+        content_hash = digest.hexdigest()
+        actual = checksum.hexdigest() if checksum else content_hash
+        if (item.size is not None and item.bytes_done != item.size) or (item.checksum and actual != item.checksum.lower()):
+            # A corrupt download cannot be resumed; the next attempt starts over
+            os.remove(item.temp_path)
+            item.temp_path = None
+            item.bytes_done = 0
+            db.session.commit()
+            raise Exception(f"Checksum mismatch for {item.file_name}")
+        return content_hash
+
+    def _store(self, item, content_hash):
+        """Move a verified download into blob storage and create its file record."""
+        job = item.job
+        storage_url = commit_blob(item.temp_path, content_hash)
+        try:
+            new_file = File(
+                user_id=job.user_id,
+                source=job.source,
+                provider_file_id=item.provider_file_id,
+                file_name=item.file_name,
+                mime_type=item.mime_type,
+                size=item.bytes_done,
+                storage_url=storage_url,
+                content_hash=content_hash
+            )
+            db.session.add(new_file)
+            db.session.flush()
+
+            item.file_id = new_file.id
+            item.temp_path = None
+            item.status = 'done'
+            item.error = None
+
+            ocr_job = None
+            if job.doc_type:
+                ocr_job = OCRJob(user_id=job.user_id, file_id=new_file.id, doc_type=job.doc_type, status='queued')
+                db.session.add(ocr_job)
+
+            # Log the action
+            audit_log = AuditLog(
+                user_id=job.user_id,
+                action='file_import',
+                entity_type='file',
+                entity_id=new_file.id,
+                payload={'filename': item.file_name, 'size': item.bytes_done, 'sha256': content_hash, 'source': job.source, 'import_job_id': job.id}
+            )
+            db.session.add(audit_log)
+            reference_blobs([content_hash])
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            # A blob no committed row references is removed again
+            release_failed_blobs([content_hash])
+            raise
+
+        if ocr_job:
+            get_ocr_job_queue(self.app).submit(ocr_job.id)
+
+def get_import_runner(app):
+    """Get the import runner of this process, starting it on first use."""
+    global _runner
+    with _runner_lock:
+        if _runner is None:
+            _runner = ImportRunner(app)
+        return _runner
@@ -0,0 +1,110 @@
+import json
+import os
+import re
+import threading
+from collections import Counter
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Characters of the text sample used for identification
+LANGID_SAMPLE_CHARS = 2000
+# Samples with fewer letters than this are too short to identify
+LANGID_MIN_LETTERS = 20
+# Log-probability given to trigrams a language profile has never seen
+LANGID_UNSEEN_LOGPROB = -12.0
+
+# Trigram profiles per Tesseract language code, built offline by langid_build.py
+LANGID_PROFILES_PATH = os.path.join(os.path.dirname(__file__), 'langid_profiles.json')
+
+_non_letters = re.compile(r"[^\w']+|[\d_]+")
+_profiles = None
+_profile_matrix = None
+_profiles_lock = threading.Lock()
+
+def normalize_sample(text, limit=LANGID_SAMPLE_CHARS):
+    """Lowercase a text sample and collapse everything but letters into single spaces."""
+    return " " + _non_letters.sub(" ", text[:limit].lower()).strip() + " "
+
+def count_trigrams(text):
+    """Count the character trigrams of a normalized sample."""
+    return Counter(text[i:i + 3] for i in range(len(text) - 2))
+
+def get_script(text):
+    """Tell which script dominates a text: 'cyrillic' or 'latin'."""
+    cyrillic = sum(1 for char in text if 'Ѐ' <= char <= 'ӿ')
+    latin = sum(1 for char in text if char.isalpha() and char < 'ɐ')
+    return 'cyrillic' if cyrillic > latin else 'latin'
+
+def get_profiles():
+    """Get the language profiles, loading them on first use."""
+    global _profiles
+    with _profiles_lock:
+        if _profiles is None:
+            with open(LANGID_PROFILES_PATH, encoding='utf-8') as f:
+                _profiles = json.load(f)['profiles']
+        return _profiles
+
+def get_profile_matrix():
+    """Get the profiles as one log-probability matrix for numpy scoring, building it on first use.
+
+    Returns the languages, their scripts, the column of every known trigram and the matrix, whose
+    last column holds the log-probability of trigrams no profile has seen."""
+    global _profile_matrix
+    profiles = get_profiles()
+    with _profiles_lock:
+        if _profile_matrix is None:
+            langs = sorted(profiles)
+            columns = {}
+            for lang in langs:
+                for trigram in profiles[lang]['logprobs']:
+                    columns.setdefault(trigram, len(columns))
+            matrix = numpy.full((len(langs), len(columns) + 1), LANGID_UNSEEN_LOGPROB)
+            for row, lang in enumerate(langs):
+                logprobs = profiles[lang]['logprobs']
+                matrix[row, [columns[trigram] for trigram in logprobs]] = list(logprobs.values())
+            scripts = numpy.array([profiles[lang]['script'] for lang in langs])
+            _profile_matrix = (langs, scripts, columns, matrix)
+        return _profile_matrix
+
+def score_languages(text):
+    """Score every candidate language for a text; higher is more likely."""
+    sample = normalize_sample(text)
+    trigrams = count_trigrams(sample)
+    if not trigrams:
+        return {}
+
+    script = get_script(sample)
+    total = sum(trigrams.values())
+    if numpy is not None:
+        langs, scripts, columns, matrix = get_profile_matrix()
+        unseen = matrix.shape[1] - 1
+        indices = [columns.get(trigram, unseen) for trigram in trigrams]
+        counts = numpy.fromiter(trigrams.values(), dtype=float, count=len(trigrams))
+        rows = numpy.flatnonzero(scripts == script)
+        # Average log-likelihood of the sample's trigrams under every profile of its script at once
+        averages = matrix[numpy.ix_(rows, indices)] @ counts / total
+        return {langs[row]: float(average) for row, average in zip(rows, averages)}
+
+    scores = {}
+    for lang, profile in get_profiles().items():
+        if profile['script'] != script:
+            continue
+        logprobs = profile['logprobs']
+        # Average log-likelihood of the sample's trigrams under the language profile
+        scores[lang] = sum(
+            count * logprobs.get(trigram, LANGID_UNSEEN_LOGPROB) for trigram, count in trigrams.items()
+        ) / total
+    return scores
+
+def identify_language(text, default='eng'):
+    """Identify the language of a text, returning its Tesseract language code."""
+    if sum(1 for char in text[:LANGID_SAMPLE_CHARS] if char.isalpha()) < LANGID_MIN_LETTERS:
+        return default
+
+    scores = score_languages(text)
+    if not scores:
+        return default
+    return max(scores, key=scores.get)
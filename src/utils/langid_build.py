@@ -0,0 +1,77 @@
+import argparse
+import json
+import math
+import os
+import sys
+from collections import Counter
+
+# Make the src package importable when run as a script
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+
+from src.utils.langid import LANGID_PROFILES_PATH, normalize_sample, count_trigrams, get_script
+
+# Most frequent trigrams kept per language; rarer ones score as unseen
+LANGID_PROFILE_TRIGRAMS = 1000
+
+def count_corpus_trigrams(path):
+    """Count the trigrams of a corpus and their total: a plain text file, or a langdetect
+    n-gram profile (JSON with 'freq' and 'n_words') that was counted from Wikipedia."""
+    with open(path, encoding='utf-8') as f:
+        head = f.read(1)
+        f.seek(0)
+        if head == '{':
+            profile = json.load(f)
+            counts = Counter()
+            for ngram, count in profile['freq'].items():
+                if len(ngram) == 3:
+                    counts[ngram.lower()] += count
+            # The profile is pruned to its frequent n-grams, but n_words counts every trigram of the corpus
+            return counts, profile['n_words'][2]
+
+        counts = Counter()
+        for line in f:
+            counts.update(count_trigrams(normalize_sample(line, limit=len(line))))
+        return counts, sum(counts.values())
+
+def build_profile(counts, total, size=LANGID_PROFILE_TRIGRAMS):
+    """Build the profile of a language from its trigram counts."""
+    kept = counts.most_common(size)
+    letters = ''.join(trigram * count for trigram, count in kept[:100])
+    return {
+        'script': get_script(letters),
+        'logprobs': {trigram: round(math.log(count / total), 3) for trigram, count in kept}
+    }
+
+def build_profiles(corpora, size=LANGID_PROFILE_TRIGRAMS):
+    """Build the profiles of every language from {lang: [corpus paths]}."""
+    profiles = {}
+    for lang, paths in sorted(corpora.items()):
+        counts = Counter()
+        total = 0
+        for path in paths:
+            path_counts, path_total = count_corpus_trigrams(path)
+            counts.update(path_counts)
+            total += path_total
+        profiles[lang] = build_profile(counts, total, size)
+    return profiles
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Build the trigram language profiles used by langid.py from text corpora.')
+    parser.add_argument('corpora', nargs='+', help='lang=path pairs with a Tesseract language code, e.g. eng=en.txt; repeat a code to add more files')
+    parser.add_argument('--size', type=int, default=LANGID_PROFILE_TRIGRAMS, help='trigrams kept per language')
+    parser.add_argument('--source', default='', help='description of the corpora, stored with the profiles')
+    parser.add_argument('--output', default=LANGID_PROFILES_PATH, help='profiles file to write')
+    args = parser.parse_args()
+
+    corpora = {}
+    for corpus in args.corpora:
+        lang, _, path = corpus.partition('=')
+        if not path:
+            parser.error(f"Expected lang=path, got {corpus}")
+        corpora.setdefault(lang, []).append(path)
+
+    profiles = build_profiles(corpora, args.size)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump({'source': args.source, 'trigrams': args.size, 'profiles': profiles}, f, ensure_ascii=False, sort_keys=True)
+        f.write("\n")
+    print(f"Wrote {len(profiles)} profiles to {args.output}")
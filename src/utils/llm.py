@@ -1,31 +1,201 @@
-from openai import OpenAI
+from openai import DefaultHttpxClient
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+from flask import current_app
+import hashlib
+import httpx
 import os
 import json
+import threading
+import time
+from src.utils.llm_cache import lookup_llm_cache, store_cached_response
+from src.utils.llm_executor import get_llm_executor
+from src.utils.llm_providers import get_llm_provider
+from src.utils.llm_retry import LLMUnavailable, call_with_retries
+from src.utils.llm_router import get_backends, record_latency, route_call
+from src.utils.llm_tokens import count_tokens, trim_to_budget, chunk_text
+from src.utils.llm_usage import record_llm_usage
 
-def get_llm_client(api_key=None, provider='openai'):
-    """Get an LLM client based on the provider."""
-    if api_key:
-        return OpenAI(api_key=api_key)
-    else:
-        # Use default API key from environment
-        return OpenAI()
+# Clients kept alive for reuse, one per provider and API key
+LLM_CLIENT_CACHE_SIZE = int(os.environ.get('LLM_CLIENT_CACHE_SIZE', 32))
+# Connection pool of each client
+LLM_MAX_CONNECTIONS = int(os.environ.get('LLM_MAX_CONNECTIONS', 20))
+LLM_MAX_KEEPALIVE_CONNECTIONS = int(os.environ.get('LLM_MAX_KEEPALIVE_CONNECTIONS', 10))
+LLM_KEEPALIVE_EXPIRY = float(os.environ.get('LLM_KEEPALIVE_EXPIRY', 60))
+# Request timeouts, in seconds; completions can take a while, connecting should not
+LLM_TIMEOUT = float(os.environ.get('LLM_TIMEOUT', 120))
+LLM_CONNECT_TIMEOUT = float(os.environ.get('LLM_CONNECT_TIMEOUT', 10))
+# Resume tokens sent in one prompt, and in all prompts of one analysis; longer resumes are trimmed, then analyzed in chunks
+LLM_RESUME_PROMPT_TOKENS = int(os.environ.get('LLM_RESUME_PROMPT_TOKENS', 6000))
+LLM_RESUME_TOKEN_BUDGET = int(os.environ.get('LLM_RESUME_TOKEN_BUDGET', 24000))
 
-def analyze_resume(resume_text, api_key=None, model='gpt-4.1-mini'):
-    """Analyze a resume using LLM and extract structured information."""
-    client = get_llm_client(api_key)
-    
-    prompt = f"""Analyze the following resume and extract structured information in JSON format.
+_clients = OrderedDict()
+# Calls using each client; a client evicted from the pool while in use is closed by its last user
+_client_users = Counter()
+_clients_lock = threading.Lock()
+
+def create_llm_client(api_key=None, provider='openai'):
+    """Create an LLM client with its own keep-alive connection pool."""
+    http_client = DefaultHttpxClient(
+        limits=httpx.Limits(
+            max_connections=LLM_MAX_CONNECTIONS,
+            max_keepalive_connections=LLM_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=LLM_KEEPALIVE_EXPIRY
+        ),
+        timeout=httpx.Timeout(LLM_TIMEOUT, connect=LLM_CONNECT_TIMEOUT)
+    )
+    # Retries are left to call_with_retries, which knows about rate limits and provider outages;
+    # without an api_key the provider's default key from the environment is used
+    return get_llm_provider(provider).create_client(api_key, http_client=http_client, max_retries=0)
+
+def acquire_llm_client(api_key=None, provider='openai'):
+    """Get a pooled LLM client for the provider and API key, creating it on first use; pair with release_llm_client()."""
+    # Keyed by a digest so raw keys are not kept around as dictionary keys
+    client_key = hashlib.sha256(f"{provider}:{api_key or ''}".encode('utf-8')).hexdigest()
+    evicted = []
+    with _clients_lock:
+        client = _clients.get(client_key)
+        if client is not None:
+            _clients.move_to_end(client_key)
+        else:
+            client = create_llm_client(api_key, provider)
+            _clients[client_key] = client
+            while len(_clients) > LLM_CLIENT_CACHE_SIZE:
+                _, old_client = _clients.popitem(last=False)
+                if not _client_users[old_client]:
+                    evicted.append(old_client)
+        _client_users[client] += 1
+    # Closed outside the lock, since closing waits for the client's connections
+    for old_client in evicted:
+        old_client.close()
+    return client
+
+def release_llm_client(client):
+    """Mark a client from acquire_llm_client() as no longer used, closing it if it was evicted meanwhile."""
+    with _clients_lock:
+        _client_users[client] -= 1
+        if _client_users[client] > 0:
+            return
+        del _client_users[client]
+        if any(pooled is client for pooled in _clients.values()):
+            return
+    client.close()
+
+@contextmanager
+def llm_client(api_key=None, provider='openai'):
+    """Context manager yielding a pooled LLM client that stays open while in use."""
+    client = acquire_llm_client(api_key, provider)
+    try:
+        yield client
+    finally:
+        release_llm_client(client)
+
+def _create_completion(endpoint, messages, backend, temperature=0.3):
+    """Run a chat completion on one (provider, model, api_key) backend; returns the response text."""
+    provider, model, api_key = backend
+    started = time.perf_counter()
+    with llm_client(api_key, provider) as client:
+        response = call_with_retries(lambda: client.chat.completions.with_raw_response.create(
+            model=model,
+            messages=messages,
+            temperature=temperature
+        ), provider, api_key)
+    latency = time.perf_counter() - started
+    record_latency(provider, model, latency)
+    record_llm_usage(endpoint, provider, model, response.usage, latency)
+    return response.choices[0].message.content.strip()
+
+def _complete(endpoint, messages, api_key=None, model='gpt-4.1-mini', provider='openai', temperature=0.3, parse=None, force=False):
+    """Run a chat completion through the response cache and the router; returns (result, cached)."""
+    # parse turns the response text into the result; responses it rejects are never cached
+    key, cached = lookup_llm_cache(endpoint, provider, model, temperature, messages, force=force)
+    if cached is not None:
+        return (parse(cached) if parse else cached), True
+
+    app = current_app._get_current_object()
+
+    def call(backend):
+        # Hedged requests run on other threads, which need their own app context
+        with app.app_context():
+            return _create_completion(endpoint, messages, backend, temperature)
+
+    # Every request, failovers and hedges included, holds a slot of the backend it goes to
+    content = route_call(endpoint, get_backends(provider, model, api_key), call, slots=get_llm_executor(app))
+    result = parse(content) if parse else content
 
-Resume:
-{resume_text}
+    if key:
+        store_cached_response(key, endpoint, provider, model, content)
+    return result, False
+
+def _stream_complete(endpoint, messages, api_key=None, model='gpt-4.1-mini', provider='openai', temperature=0.3, force=False):
+    """Stream a chat completion as text deltas, serving and filling the response cache like _complete."""
+    key, cached = lookup_llm_cache(endpoint, provider, model, temperature, messages, force=force)
+    if cached is not None:
+        yield cached
+        return
+
+    # Streams go to the best backend and are not hedged, since text is passed on as soon as it arrives
+    backends = get_backends(provider, model, api_key)
+    executor = get_llm_executor(current_app._get_current_object())
+    started = time.perf_counter()
+    for index, (backend_provider, backend_model, backend_key) in enumerate(backends):
+        # The slot is held until the stream ends
+        slot = executor.acquire(backend_provider, backend_key)
+        client = acquire_llm_client(backend_key, backend_provider)
+        try:
+            # Only opening the stream is retried; once text has been yielded a failure is final
+            stream = call_with_retries(lambda: client.chat.completions.with_raw_response.create(
+                model=backend_model,
+                messages=messages,
+                temperature=temperature,
+                stream=True,
+                # The last chunk then carries the token usage
+                stream_options={'include_usage': True}
+            ), backend_provider, backend_key)
+            break
+        except Exception as e:
+            release_llm_client(client)
+            executor.release(slot)
+            if not isinstance(e, LLMUnavailable) or index == len(backends) - 1:
+                raise
+    parts = []
+    usage = None
+    first_token = None
+    try:
+        for chunk in stream:
+            if chunk.usage:
+                usage = chunk.usage
+            delta = chunk.choices[0].delta.content if chunk.choices else None
+            if delta:
+                if first_token is None:
+                    first_token = time.perf_counter() - started
+                parts.append(delta)
+                yield delta
+    finally:
+        # Runs when the consumer stops early too, releasing the connection instead of reading the rest
+        stream.close()
+        release_llm_client(client)
+        executor.release(slot)
+
+    record_llm_usage(endpoint, backend_provider, backend_model, usage, time.perf_counter() - started, first_token)
+
+    # Only complete responses are cached
+    if key:
+        store_cached_response(key, endpoint, provider, model, "".join(parts).strip())
+
+# Prompts keep everything that is the same on every call in front, so providers can serve it from their
+# prefix cache; the variable content of each call goes last
+RESUME_ANALYSIS_PROMPT = """You are an expert HR analyst specializing in resume analysis.
+
+Analyze the resume given by the user and extract structured information in JSON format.
 
 Please provide the analysis in the following JSON format:
-{{
+{
     "sectors": ["sector1", "sector2", ...],
     "roles": ["role1", "role2", ...],
     "skills": ["skill1", "skill2", ...],
     "summary": "A brief summary of the candidate's profile"
-}}
+}
 
 Focus on:
 - Identifying the main sectors/industries the candidate has worked in
@@ -33,91 +203,218 @@ Focus on:
 - Technical and soft skills
 - A concise summary highlighting the candidate's strengths and experience
 
+If you are given an excerpt of a longer resume, analyze only what the excerpt contains.
+
 Respond ONLY with valid JSON, no additional text."""
-    
-    try:
-        response = client.chat.completions.create(
+
+RESUME_SUMMARY_MERGE_PROMPT = """You are an expert HR analyst specializing in resume analysis.
+
+Combine the summaries of consecutive parts of one candidate's resume given by the user into a single brief summary of the candidate's profile, highlighting their strengths and experience.
+
+Respond ONLY with valid JSON in the format {"summary": "..."}, no additional text."""
+
+COMPANY_ANALYSIS_PROMPT = """You are an expert business analyst specializing in company research.
+
+Analyze the company information given by the user and provide a structured analysis in JSON format.
+
+Please provide the analysis in the following JSON format:
+{
+    "summary": "A brief summary of the company (mission, products, values)",
+    "focus_areas": ["area1", "area2", ...],
+    "requirements": ["requirement1", "requirement2", ...]
+}
+
+Focus on:
+- Company mission, products, and core values
+- Main focus areas and technologies used
+- Key requirements for typical roles (if job posting is provided)
+
+Respond ONLY with valid JSON, no additional text."""
+
+COVER_LETTER_PROMPT = """You are an expert career counselor specializing in writing compelling cover letters.
+
+Generate a professional cover letter based on the candidate profile and company information given by the user.
+
+Please generate a cover letter that:
+1. Is 150-300 words long
+2. Highlights 2-3 specific matches between the candidate's skills and company requirements
+3. Demonstrates genuine interest in the company
+4. Is written in the tone given by the user
+5. Is in the language given by the user
+
+Respond ONLY with the cover letter text, no additional formatting or explanations."""
+
+def get_resume_messages(resume_text, part=None, parts=None):
+    """Build the chat messages asking for the structured analysis of a resume, or of one part of a long resume."""
+    if part:
+        content = f"Resume excerpt (part {part} of {parts}):\n{resume_text}"
+    else:
+        content = f"Resume:\n{resume_text}"
+    return [
+        {"role": "system", "content": RESUME_ANALYSIS_PROMPT},
+        {"role": "user", "content": content}
+    ]
+
+def merge_values(lists):
+    """Merge lists of extracted values, dropping case-insensitive duplicates and putting those found in most lists first."""
+    counts = Counter()
+    first_seen = {}
+    for values in lists:
+        keys = set()
+        for value in values or []:
+            if not isinstance(value, str) or not value.strip():
+                continue
+            key = value.strip().lower()
+            first_seen.setdefault(key, value.strip())
+            keys.add(key)
+        counts.update(keys)
+    # sorted() is stable, so values found equally often keep the order they were first seen in
+    return [first_seen[key] for key in sorted(first_seen, key=lambda key: -counts[key])]
+
+def _analyze_resume_chunks(chunks, api_key=None, model='gpt-4.1-mini', provider='openai', force=False):
+    """Analyze the chunks of a long resume concurrently and merge the results; returns (analysis, cached)."""
+    def analyze_chunk(part, chunk):
+        return _complete(
+            'analyze_resume',
+            get_resume_messages(chunk, part, len(chunks)),
+            api_key=api_key,
             model=model,
-            messages=[
-                {"role": "system", "content": "You are an expert HR analyst specializing in resume analysis."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.3
+            provider=provider,
+            temperature=0.3,
+            parse=json.loads,
+            force=force
         )
+
+    # Chunks are LLM calls like any other, so they wait for slots of the provider and key
+    executor = get_llm_executor(current_app._get_current_object())
+    futures = [
+        executor.submit(lambda part=part, chunk=chunk: analyze_chunk(part, chunk), provider, api_key)
+        for part, chunk in enumerate(chunks, 1)
+    ]
+    results = []
+    try:
+        for (part, chunk), future in zip(enumerate(chunks, 1), futures):
+            # This analysis usually holds a slot of the same key already; chunks still waiting for one
+            # run here in that slot, so a saturated key cannot leave it waiting on its own chunks
+            if future.cancel():
+                results.append(analyze_chunk(part, chunk))
+            else:
+                results.append(future.result())
+    except Exception:
+        # The analysis fails as a whole, so chunks that have not started are dropped
+        for future in futures:
+            future.cancel()
+        raise
+    partials = [analysis for analysis, _ in results]
+
+    # Lists are merged here; only the summaries need the model to combine them
+    summaries = "\n".join(f"{part}. {analysis.get('summary', '')}" for part, analysis in enumerate(partials, 1))
+    combined, summary_cached = _complete(
+        'analyze_resume',
+        [
+            {"role": "system", "content": RESUME_SUMMARY_MERGE_PROMPT},
+            {"role": "user", "content": f"Summaries:\n{summaries}"}
+        ],
+        api_key=api_key,
+        model=model,
+        provider=provider,
+        temperature=0.3,
+        parse=json.loads,
+        force=force
+    )
+
+    analysis = {
+        'sectors': merge_values(partial.get('sectors') for partial in partials),
+        'roles': merge_values(partial.get('roles') for partial in partials),
+        'skills': merge_values(partial.get('skills') for partial in partials),
+        'summary': combined.get('summary', '')
+    }
+    return analysis, summary_cached and all(cached for _, cached in results)
+
+def analyze_resume(resume_text, api_key=None, model='gpt-4.1-mini', force=False, provider='openai'):
+    """Analyze a resume using LLM and extract structured information."""
+    try:
+        # Bound what is sent by the token budget, then split what is left into prompts of a bounded size
+        tokens = count_tokens(resume_text, model)
+        if tokens > LLM_RESUME_TOKEN_BUDGET:
+            resume_text = trim_to_budget(resume_text, LLM_RESUME_TOKEN_BUDGET, model)
+        chunks = chunk_text(resume_text, LLM_RESUME_PROMPT_TOKENS, model)
         
-        result = response.choices[0].message.content.strip()
-        
-        # Parse JSON response
-        analysis = json.loads(result)
+        if len(chunks) > 1:
+            analysis, cached = _analyze_resume_chunks(chunks, api_key=api_key, model=model, provider=provider, force=force)
+        else:
+            # Parse JSON response
+            analysis, cached = _complete(
+                'analyze_resume',
+                get_resume_messages(chunks[0]),
+                api_key=api_key,
+                model=model,
+                provider=provider,
+                temperature=0.3,
+                parse=json.loads,
+                force=force
+            )
         
         return {
             'status': 'success',
-            'analysis': analysis
+            'analysis': analysis,
+            'cached': cached,
+            'tokens': tokens,
+            'chunks': len(chunks),
+            'trimmed': tokens > LLM_RESUME_TOKEN_BUDGET
         }
+    except LLMUnavailable:
+        # Left to the caller, which can tell the client when to come back
+        raise
     except Exception as e:
         return {
             'status': 'failed',
             'error': str(e)
         }
 
-def analyze_company(company_name, website=None, job_url=None, api_key=None, model='gpt-4.1-mini'):
+def analyze_company(company_name, website=None, job_url=None, api_key=None, model='gpt-4.1-mini', force=False, provider='openai'):
     """Analyze a company using LLM and extract key information."""
-    client = get_llm_client(api_key)
-    
     company_info = f"Company Name: {company_name}"
     if website:
         company_info += f"\nWebsite: {website}"
     if job_url:
         company_info += f"\nJob Posting URL: {job_url}"
     
-    prompt = f"""Analyze the following company information and provide a structured analysis in JSON format.
-
-{company_info}
-
-Please provide the analysis in the following JSON format:
-{{
-    "summary": "A brief summary of the company (mission, products, values)",
-    "focus_areas": ["area1", "area2", ...],
-    "requirements": ["requirement1", "requirement2", ...]
-}}
-
-Focus on:
-- Company mission, products, and core values
-- Main focus areas and technologies used
-- Key requirements for typical roles (if job posting is provided)
-
-Respond ONLY with valid JSON, no additional text."""
-    
     try:
-        response = client.chat.completions.create(
-            model=model,
-            messages=[
-                {"role": "system", "content": "You are an expert business analyst specializing in company research."},
-                {"role": "user", "content": prompt}
+        # Parse JSON response
+        analysis, cached = _complete(
+            'analyze_company',
+            [
+                {"role": "system", "content": COMPANY_ANALYSIS_PROMPT},
+                {"role": "user", "content": company_info}
             ],
-            temperature=0.3
+            api_key=api_key,
+            model=model,
+            provider=provider,
+            temperature=0.3,
+            parse=json.loads,
+            force=force
         )
         
-        result = response.choices[0].message.content.strip()
-        
-        # Parse JSON response
-        analysis = json.loads(result)
-        
         return {
             'status': 'success',
-            'analysis': analysis
+            'analysis': analysis,
+            'cached': cached
         }
+    except LLMUnavailable:
+        # Left to the caller, which can tell the client when to come back
+        raise
     except Exception as e:
         return {
             'status': 'failed',
             'error': str(e)
         }
 
-def generate_cover_letter(profile, company, language='en', tone='formal', api_key=None, model='gpt-4.1-mini'):
-    """Generate a personalized cover letter using LLM."""
-    client = get_llm_client(api_key)
-    
-    prompt = f"""Generate a professional cover letter based on the following information:
+def get_cover_letter_messages(profile, company, language='en', tone='formal'):
+    """Build the chat messages asking for a cover letter."""
+    # The profile comes before the company so letters of one profile for many companies share a longer prefix
+    content = f"""Language: {language}
+Tone: {tone}
 
 Candidate Profile:
 - Sectors: {', '.join(profile.get('sectors', []))}
@@ -129,53 +426,57 @@ Company Information:
 - Name: {company.get('name', '')}
 - Summary: {company.get('summary', '')}
 - Focus Areas: {', '.join(company.get('focus_areas', []))}
-- Requirements: {', '.join(company.get('requirements', []))}
-
-Language: {language}
-Tone: {tone}
-
-Please generate a cover letter that:
-1. Is 150-300 words long
-2. Highlights 2-3 specific matches between the candidate's skills and company requirements
-3. Demonstrates genuine interest in the company
-4. Is written in a {tone} tone
-5. Is in {language} language
-
-Respond ONLY with the cover letter text, no additional formatting or explanations."""
+- Requirements: {', '.join(company.get('requirements', []))}"""
     
+    return [
+        {"role": "system", "content": COVER_LETTER_PROMPT},
+        {"role": "user", "content": content}
+    ]
+
+def generate_cover_letter(profile, company, language='en', tone='formal', api_key=None, model='gpt-4.1-mini', force=False, provider='openai'):
+    """Generate a personalized cover letter using LLM."""
     try:
-        response = client.chat.completions.create(
+        letter, cached = _complete(
+            'generate_cover_letter',
+            get_cover_letter_messages(profile, company, language, tone),
+            api_key=api_key,
             model=model,
-            messages=[
-                {"role": "system", "content": "You are an expert career counselor specializing in writing compelling cover letters."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.7
+            provider=provider,
+            temperature=0.7,
+            force=force
         )
         
-        letter = response.choices[0].message.content.strip()
-        
         return {
             'status': 'success',
-            'letter': letter
+            'letter': letter,
+            'cached': cached
         }
+    except LLMUnavailable:
+        # Left to the caller, which can tell the client when to come back
+        raise
     except Exception as e:
         return {
             'status': 'failed',
             'error': str(e)
         }
 
+def stream_cover_letter(profile, company, language='en', tone='formal', api_key=None, model='gpt-4.1-mini', force=False, provider='openai'):
+    """Generate a personalized cover letter using LLM, yielding its text as it is written."""
+    return _stream_complete(
+        'generate_cover_letter',
+        get_cover_letter_messages(profile, company, language, tone),
+        api_key=api_key,
+        model=model,
+        provider=provider,
+        temperature=0.7,
+        force=force
+    )
+
 def validate_api_key(api_key, provider='openai'):
-    """Validate an API key by making a test request."""
+    """Validate an API key by making a test request to its provider."""
+    # Keys being validated are not added to the client pool
+    client = create_llm_client(api_key, provider)
     try:
-        client = OpenAI(api_key=api_key)
-        # Make a minimal test request
-        response = client.chat.completions.create(
-            model='gpt-4.1-nano',
-            messages=[{"role": "user", "content": "test"}],
-            max_tokens=5
-        )
-        return True
-    except Exception as e:
-        return False
-
+        return get_llm_provider(provider).validate_key(client)
+    finally:
+        client.close()
@@ -0,0 +1,112 @@
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Make the src package importable when run as a script
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+
+from src.utils.llm import create_llm_client, llm_client
+
+class MockLLMHandler(BaseHTTPRequestHandler):
+    """Answers chat completion requests with a canned reply over keep-alive HTTP/1.1."""
+    protocol_version = 'HTTP/1.1'
+    # Delayed ACKs would otherwise add ~40 ms to every keep-alive request
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        super().setup()
+        # Stand-in for the TCP and TLS handshake of a new connection to a remote API
+        self.server.connections += 1
+        time.sleep(self.server.handshake_ms / 1000)
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        body = json.dumps({
+            'id': 'chatcmpl-mock',
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': 'mock',
+            'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': 'ok'}, 'finish_reason': 'stop'}],
+            'usage': {'prompt_tokens': 1, 'completion_tokens': 1, 'total_tokens': 2}
+        }).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def start_mock_server(handshake_ms=50):
+    """Start the mock endpoint on a free local port; returns the server and its base URL."""
+    server = ThreadingHTTPServer(('127.0.0.1', 0), MockLLMHandler)
+    server.daemon_threads = True
+    server.handshake_ms = handshake_ms
+    server.connections = 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/v1"
+
+def complete(client):
+    client.chat.completions.create(model='mock', messages=[{'role': 'user', 'content': 'ping'}], max_tokens=1)
+
+def benchmark_clients(requests=50, threads=1, api_key='sk-benchmark', server=None):
+    """Time chat completions with a new client per call against the pooled client registry."""
+    def fresh_call():
+        client = create_llm_client(api_key)
+        try:
+            complete(client)
+        finally:
+            client.close()
+
+    def pooled_call():
+        with llm_client(api_key) as client:
+            complete(client)
+
+    results = {}
+    for mode, call in (('fresh', fresh_call), ('pooled', pooled_call)):
+        def timed_call(_):
+            started = time.perf_counter()
+            call()
+            return time.perf_counter() - started
+
+        opened = server.connections if server else None
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            timings = sorted(executor.map(timed_call, range(requests)))
+        results[mode] = {
+            'median_ms': timings[len(timings) // 2] * 1000,
+            'p95_ms': timings[min(len(timings) - 1, int(len(timings) * 0.95))] * 1000,
+            'total_s': sum(timings),
+            # New connections the mock server accepted during this mode
+            'connections': server.connections - opened if server else None
+        }
+    return results
+
+def print_report(results):
+    """Print benchmark results as a table."""
+    print(f"{'client':8} {'median ms':>10} {'p95 ms':>8} {'total s':>8} {'connections':>12}")
+    for mode, result in results.items():
+        opened = result['connections'] if result['connections'] is not None else '-'
+        print(f"{mode:8} {result['median_ms']:10.1f} {result['p95_ms']:8.1f} {result['total_s']:8.2f} {opened:>12}")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark per-call LLM clients against pooled clients on a local mock endpoint.')
+    parser.add_argument('--requests', type=int, default=50, help='calls per client mode')
+    parser.add_argument('--threads', type=int, default=1, help='concurrent callers')
+    parser.add_argument('--handshake-ms', type=float, default=50, help='delay the mock server adds to every new connection')
+    parser.add_argument('--base-url', help='benchmark a real OpenAI compatible endpoint instead of the mock')
+    args = parser.parse_args()
+
+    server = None
+    if args.base_url:
+        os.environ['OPENAI_BASE_URL'] = args.base_url
+    else:
+        server, os.environ['OPENAI_BASE_URL'] = start_mock_server(args.handshake_ms)
+
+    api_key = os.environ.get('OPENAI_API_KEY', 'sk-benchmark') if args.base_url else 'sk-benchmark'
+    print_report(benchmark_clients(args.requests, args.threads, api_key=api_key, server=server))
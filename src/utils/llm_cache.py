@@ -0,0 +1,134 @@
+import hashlib
+import json
+import os
+import threading
+from datetime import datetime, timedelta
+from sqlalchemy import func
+from src.models.models import db, LLMCacheEntry
+
+# How long a cached LLM response stays valid, in hours
+LLM_CACHE_TTL = timedelta(hours=int(os.environ.get('LLM_CACHE_TTL_HOURS', 24 * 7)))
+# Upper bound on the total size of cached responses, in megabytes
+LLM_CACHE_MAX_MB = int(os.environ.get('LLM_CACHE_MAX_MB', 64))
+# Endpoints whose responses are cached; generation with a high temperature is left out by default
+LLM_CACHE_ENDPOINTS = {
+    endpoint.strip()
+    for endpoint in os.environ.get('LLM_CACHE_ENDPOINTS', 'analyze_resume,analyze_company').split(',')
+    if endpoint.strip()
+}
+# Entries removed per eviction round
+LLM_CACHE_EVICT_BATCH = 100
+
+_stats = {}
+_stats_lock = threading.Lock()
+
+def _count(endpoint, stat, amount=1):
+    with _stats_lock:
+        counters = _stats.setdefault(endpoint, {'hits': 0, 'misses': 0, 'bypassed': 0, 'expired': 0, 'evictions': 0})
+        counters[stat] += amount
+
+def is_llm_cache_enabled(endpoint):
+    """Tell whether responses of an endpoint are cached."""
+    return endpoint in LLM_CACHE_ENDPOINTS
+
+def normalize_prompt(text):
+    """Collapse whitespace so formatting-only differences map to the same prompt."""
+    return " ".join(text.split())
+
+def get_llm_cache_key(provider, model, temperature, messages):
+    """Build the cache key for a completion request."""
+    material = json.dumps({
+        'provider': provider,
+        'model': model,
+        'temperature': temperature,
+        'messages': [[message['role'], normalize_prompt(message['content'])] for message in messages]
+    }, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+def get_cached_response(key, endpoint):
+    """Return the cached response text for a key, or None if it is missing or expired."""
+    entry = LLMCacheEntry.query.filter_by(key=key).first()
+    if not entry:
+        _count(endpoint, 'misses')
+        return None
+
+    now = datetime.utcnow()
+    if entry.expires_at and entry.expires_at <= now:
+        db.session.delete(entry)
+        db.session.commit()
+        _count(endpoint, 'expired')
+        _count(endpoint, 'misses')
+        return None
+
+    entry.hits += 1
+    entry.last_used_at = now
+    db.session.commit()
+    _count(endpoint, 'hits')
+    return entry.response
+
+def store_cached_response(key, endpoint, provider, model, response):
+    """Store a response and evict expired and least recently used entries over the limit."""
+    entry = LLMCacheEntry.query.filter_by(key=key).first()
+    if not entry:
+        entry = LLMCacheEntry(key=key)
+        db.session.add(entry)
+
+    now = datetime.utcnow()
+    entry.endpoint = endpoint
+    entry.provider = provider
+    entry.model = model
+    entry.response = response
+    entry.size = len(response.encode('utf-8'))
+    entry.created_at = now
+    entry.last_used_at = now
+    entry.expires_at = now + LLM_CACHE_TTL
+    db.session.commit()
+
+    evict_llm_cache()
+
+def evict_llm_cache(max_bytes=None):
+    """Delete expired entries, then least recently used ones until the cache fits in max_bytes."""
+    max_bytes = LLM_CACHE_MAX_MB * 1024 * 1024 if max_bytes is None else max_bytes
+    LLMCacheEntry.query.filter(LLMCacheEntry.expires_at <= datetime.utcnow()).delete()
+    db.session.commit()
+    total = db.session.query(func.coalesce(func.sum(LLMCacheEntry.size), 0)).scalar()
+
+    while total > max_bytes:
+        oldest = LLMCacheEntry.query.order_by(LLMCacheEntry.last_used_at).limit(LLM_CACHE_EVICT_BATCH).all()
+        if not oldest:
+            break
+        for entry in oldest:
+            if total <= max_bytes:
+                break
+            total -= entry.size
+            db.session.delete(entry)
+            _count(entry.endpoint, 'evictions')
+        db.session.commit()
+
+def lookup_llm_cache(endpoint, provider, model, temperature, messages, force=False):
+    """Look up the cached response of a completion request; returns (key or None, response or None)."""
+    if not is_llm_cache_enabled(endpoint):
+        return None, None
+
+    key = get_llm_cache_key(provider, model, temperature, messages)
+    if force:
+        _count(endpoint, 'bypassed')
+        return key, None
+    return key, get_cached_response(key, endpoint)
+
+def get_llm_cache_stats():
+    """Get per-endpoint hit/miss counters for this process and the size of the cache."""
+    with _stats_lock:
+        endpoints = {endpoint: dict(counters) for endpoint, counters in _stats.items()}
+    for counters in endpoints.values():
+        lookups = counters['hits'] + counters['misses']
+        counters['hit_rate'] = counters['hits'] / lookups if lookups else 0.0
+
+    return {
+        'endpoints': endpoints,
+        'cached_endpoints': sorted(LLM_CACHE_ENDPOINTS),
+        'entries': LLMCacheEntry.query.count(),
+        'size_bytes': db.session.query(func.coalesce(func.sum(LLMCacheEntry.size), 0)).scalar(),
+        'max_bytes': LLM_CACHE_MAX_MB * 1024 * 1024,
+        'ttl_seconds': int(LLM_CACHE_TTL.total_seconds())
+    }
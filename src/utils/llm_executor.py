@@ -0,0 +1,269 @@
+import atexit
+import hashlib
+import os
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime
+from src.models.models import db, LLMTask
+from src.utils.llm_router import rank_backends
+
+# Threads running LLM calls in each app process
+LLM_EXECUTOR_WORKERS = int(os.environ.get('LLM_EXECUTOR_WORKERS', 16))
+# Requests in flight at the same time against one provider, and with one API key, including
+# hedged and failover requests
+LLM_PROVIDER_CONCURRENCY = int(os.environ.get('LLM_PROVIDER_CONCURRENCY', 8))
+LLM_KEY_CONCURRENCY = int(os.environ.get('LLM_KEY_CONCURRENCY', 4))
+# Calls allowed to wait for a slot before new ones are turned away
+LLM_QUEUE_MAX = int(os.environ.get('LLM_QUEUE_MAX', 200))
+# Recent calls kept for wait time percentiles
+LLM_STATS_WINDOW = 1000
+
+_executor = None
+_executor_lock = threading.Lock()
+
+class LLMQueueFull(Exception):
+    """Raised when the LLM call queue is at LLM_QUEUE_MAX."""
+
+class LLMExecutor:
+    """Runs LLM calls on a thread pool, with at most a fixed number of requests in flight per provider and per API key.
+
+    Slots are counted per backend request. A queued call starts once the backend it will use first has a
+    free slot and keeps that slot reserved for its requests to that backend; requests to any other backend,
+    such as failovers and hedges, take a slot of their own through acquire()."""
+
+    def __init__(self, app, workers=LLM_EXECUTOR_WORKERS, provider_limit=LLM_PROVIDER_CONCURRENCY,
+                 key_limit=LLM_KEY_CONCURRENCY, max_queue=LLM_QUEUE_MAX):
+        self.app = app
+        self.provider_limit = provider_limit
+        self.key_limit = key_limit
+        self.max_queue = max_queue
+        self.pool = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix='llm')
+        self.lock = threading.Lock()
+        self.slot_freed = threading.Condition(self.lock)
+        self.pending = deque()
+        self.running_by_provider = Counter()
+        self.running_by_key = Counter()
+        # Requests of running calls blocked in acquire(); queued calls do not take slots ahead of them
+        self.waiting_by_provider = Counter()
+        self.waiting_by_key = Counter()
+        # The slot reserved by the call running on the current thread
+        self.local = threading.local()
+        self.waits = deque(maxlen=LLM_STATS_WINDOW)
+        self.runs = deque(maxlen=LLM_STATS_WINDOW)
+        self.counters = {'submitted': 0, 'completed': 0, 'failed': 0, 'rejected': 0}
+        atexit.register(self.shutdown)
+
+    def get_slot(self, provider, api_key=None):
+        """Get the (provider, key digest) slot requests to a backend are counted under.
+
+        'auto' calls are counted against the backend the router ranks first, with that provider's key."""
+        if provider == 'auto':
+            try:
+                provider, _, api_key = rank_backends(api_key or {})[0]
+            except Exception:
+                # No provider has a key; the call fails on its own without making a request
+                api_key = None
+        # Keyed by a digest so raw keys are not kept around
+        return provider, hashlib.sha256(f"{provider}:{api_key or ''}".encode('utf-8')).hexdigest()
+
+    def submit(self, fn, provider='openai', api_key=None):
+        """Queue fn() to run in an app context once its backend has a free slot; returns a Future."""
+        entry = {
+            'fn': fn,
+            'slot': self.get_slot(provider, api_key),
+            'future': Future(),
+            'queued_at': time.monotonic()
+        }
+        with self.lock:
+            if len(self.pending) >= self.max_queue:
+                self.counters['rejected'] += 1
+                raise LLMQueueFull("Too many LLM requests are waiting; try again shortly")
+            self.pending.append(entry)
+            self.counters['submitted'] += 1
+            self._dispatch()
+        return entry['future']
+
+    def run(self, fn, provider='openai', api_key=None, timeout=None):
+        """Run fn() through the queue and wait for its result."""
+        return self.submit(fn, provider, api_key).result(timeout)
+
+    def acquire(self, provider, api_key=None, blocking=True):
+        """Take a slot for one request to a backend, waiting for one to free up unless blocking is False.
+
+        Returns a token for release(), or None if the slot is taken and blocking is False. A request the
+        current call reserved a slot for uses that slot."""
+        slot = self.get_slot(provider, api_key)
+        reservation = getattr(self.local, 'reservation', None)
+        with self.lock:
+            if reservation and reservation['held'] and not reservation['in_use'] and reservation['slot'] == slot:
+                reservation['in_use'] = True
+                return slot, reservation
+            if not blocking and not self._has_room(slot):
+                return None
+            if reservation and reservation['held'] and not reservation['in_use']:
+                # The call moved on to another backend; the reserved slot is handed back rather than held while waiting
+                reservation['held'] = False
+                self._give(reservation['slot'])
+
+            provider, key = slot
+            self.waiting_by_provider[provider] += 1
+            self.waiting_by_key[key] += 1
+            try:
+                while not self._has_room(slot):
+                    self.slot_freed.wait()
+            finally:
+                self.waiting_by_provider[provider] -= 1
+                self.waiting_by_key[key] -= 1
+            self._take(slot)
+            # Queued calls held back for this request may start now
+            self._dispatch()
+            return slot, None
+
+    def release(self, token):
+        """Give back the slot of a request that has ended."""
+        slot, reservation = token
+        with self.lock:
+            if reservation is not None:
+                reservation['in_use'] = False
+                if not reservation['done']:
+                    # Kept for the next request of the same call
+                    return
+                reservation['held'] = False
+            self._give(slot)
+
+    @contextmanager
+    def slot(self, provider, api_key=None):
+        """Context manager holding a slot of a backend for one request."""
+        token = self.acquire(provider, api_key)
+        try:
+            yield
+        finally:
+            self.release(token)
+
+    def shutdown(self):
+        """Stop accepting work; queued calls are cancelled."""
+        with self.lock:
+            while self.pending:
+                self.pending.popleft()['future'].cancel()
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+    def _has_room(self, slot):
+        provider, key = slot
+        return self.running_by_provider[provider] < self.provider_limit and self.running_by_key[key] < self.key_limit
+
+    def _take(self, slot):
+        provider, key = slot
+        self.running_by_provider[provider] += 1
+        self.running_by_key[key] += 1
+
+    def _give(self, slot):
+        # Called with the lock held
+        provider, key = slot
+        self.running_by_provider[provider] -= 1
+        self.running_by_key[key] -= 1
+        self.slot_freed.notify_all()
+        self._dispatch()
+
+    def _dispatch(self):
+        # Called with the lock held; starts every queued call that has a free slot, oldest first,
+        # so a saturated key does not hold up calls made with other keys
+        for entry in list(self.pending):
+            provider, key = entry['slot']
+            if not self._has_room(entry['slot']):
+                continue
+            if self.waiting_by_provider[provider] or self.waiting_by_key[key]:
+                continue
+            self.pending.remove(entry)
+            self._take(entry['slot'])
+            self.waits.append(time.monotonic() - entry['queued_at'])
+            self.pool.submit(self._execute, entry)
+
+    def _execute(self, entry):
+        future = entry['future']
+        started = time.monotonic()
+        # held: the slot is still counted for this call; in_use: a request is running in it
+        reservation = {'slot': entry['slot'], 'held': True, 'in_use': False, 'done': False}
+        self.local.reservation = reservation
+        try:
+            if future.set_running_or_notify_cancel():
+                try:
+                    with self.app.app_context():
+                        result = entry['fn']()
+                    future.set_result(result)
+                except Exception as e:
+                    future.set_exception(e)
+        finally:
+            self.local.reservation = None
+            with self.lock:
+                self.runs.append(time.monotonic() - started)
+                self.counters['failed' if future.cancelled() or future.exception() else 'completed'] += 1
+                reservation['done'] = True
+                # A request that lost a hedge may still be running in the slot; it gives it back when it ends
+                if reservation['held'] and not reservation['in_use']:
+                    reservation['held'] = False
+                    self._give(entry['slot'])
+
+    def get_stats(self):
+        """Get queue depth, in-flight calls and wait/run time statistics."""
+        def percentile(values, fraction):
+            if not values:
+                return 0.0
+            values = sorted(values)
+            return values[min(len(values) - 1, int(len(values) * fraction))] * 1000
+
+        with self.lock:
+            waits = list(self.waits)
+            runs = list(self.runs)
+            stats = dict(self.counters)
+            stats['queued'] = len(self.pending)
+            stats['running'] = sum(self.running_by_provider.values())
+            stats['waiting_for_slot'] = sum(self.waiting_by_provider.values())
+            stats['running_by_provider'] = {provider: count for provider, count in self.running_by_provider.items() if count}
+            oldest = self.pending[0]['queued_at'] if self.pending else None
+
+        stats['oldest_wait_ms'] = (time.monotonic() - oldest) * 1000 if oldest else 0.0
+        stats['wait_ms'] = {'p50': percentile(waits, 0.5), 'p95': percentile(waits, 0.95), 'max': max(waits, default=0.0) * 1000}
+        stats['run_ms'] = {'p50': percentile(runs, 0.5), 'p95': percentile(runs, 0.95)}
+        stats['limits'] = {'provider': self.provider_limit, 'key': self.key_limit, 'queue': self.max_queue}
+        return stats
+
+def get_llm_executor(app):
+    """Get the LLM executor of this process, starting it on first use."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = LLMExecutor(app)
+        return _executor
+
+def queue_llm_task(app, user_id, kind, fn, provider='openai', api_key=None):
+    """Run fn() in the background, recording its progress and JSON result in an LLMTask."""
+    task = LLMTask(user_id=user_id, kind=kind, provider=provider, status='queued')
+    db.session.add(task)
+    db.session.commit()
+    task_id = task.id
+
+    def run_task():
+        task = LLMTask.query.filter_by(id=task_id).first()
+        task.status = 'running'
+        task.started_at = datetime.utcnow()
+        db.session.commit()
+        try:
+            task.result = fn()
+            task.status = 'done'
+        except Exception as e:
+            db.session.rollback()
+            task.status = 'failed'
+            task.error = str(e)
+        task.finished_at = datetime.utcnow()
+        db.session.commit()
+
+    try:
+        get_llm_executor(app).submit(run_task, provider, api_key)
+    except LLMQueueFull:
+        db.session.delete(task)
+        db.session.commit()
+        raise
+    return task
@@ -0,0 +1,80 @@
+import os
+import openai
+from openai import OpenAI
+from src.models.models import APICredential
+from src.utils.encryption import decrypt_api_key
+
+# Endpoint of Google's OpenAI compatible Gemini API
+GOOGLE_BASE_URL = os.environ.get('GOOGLE_BASE_URL', 'https://generativelanguage.googleapis.com/v1beta/openai/')
+
+class LLMProvider:
+    """Adapter for an LLM API; subclasses say where it is and which keys it takes."""
+    name = None
+    # Environment variable holding the key used when a user has not saved one
+    default_key_env = None
+    # Prefix every key of the provider starts with, or None if keys have no fixed format
+    key_prefix = None
+    base_url = None
+
+    def get_default_key(self):
+        return os.environ.get(self.default_key_env) if self.default_key_env else None
+
+    def has_key(self, api_key=None):
+        """Tell whether calls can be made with this key, or without one using the default key."""
+        return bool(api_key or self.get_default_key())
+
+    def is_key_format_valid(self, api_key):
+        return bool(api_key) and (not self.key_prefix or api_key.startswith(self.key_prefix))
+
+    def create_client(self, api_key=None, http_client=None, max_retries=0):
+        """Create a chat completions client for the provider."""
+        kwargs = {'http_client': http_client, 'max_retries': max_retries}
+        if self.base_url:
+            kwargs['base_url'] = self.base_url
+        return OpenAI(api_key=api_key or self.get_default_key(), **kwargs)
+
+    def validate_key(self, client):
+        """Validate a key with the cheapest authenticated request the provider offers."""
+        try:
+            client.models.list()
+            return True
+        except openai.RateLimitError:
+            # Throttled, but only after the key was accepted
+            return True
+        except Exception:
+            return False
+
+class OpenAIProvider(LLMProvider):
+    name = 'openai'
+    default_key_env = 'OPENAI_API_KEY'
+    key_prefix = 'sk-'
+    # None keeps the client's own default, which honors OPENAI_BASE_URL
+    base_url = None
+
+class GoogleProvider(LLMProvider):
+    """Gemini models through Google's OpenAI compatible endpoint."""
+    name = 'google'
+    default_key_env = 'GEMINI_API_KEY'
+    key_prefix = 'AIza'
+    base_url = GOOGLE_BASE_URL
+
+LLM_PROVIDERS = {
+    OpenAIProvider.name: OpenAIProvider(),
+    GoogleProvider.name: GoogleProvider()
+}
+
+def get_llm_provider(name):
+    """Get the adapter of an LLM provider."""
+    if name not in LLM_PROVIDERS:
+        raise ValueError(f"Unsupported LLM provider: {name}")
+    return LLM_PROVIDERS[name]
+
+def get_user_api_key(user_id, provider):
+    """Get a user's decrypted API key for a provider, or None to use the default key."""
+    # The router picks the provider of 'auto' calls, so they get the keys of all of them
+    if provider == 'auto':
+        return {name: get_user_api_key(user_id, name) for name in LLM_PROVIDERS}
+    credential = APICredential.query.filter_by(user_id=user_id, provider=provider).first()
+    if credential:
+        return decrypt_api_key(credential.api_key_enc)
+    return None
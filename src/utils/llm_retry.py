@@ -0,0 +1,282 @@
+import hashlib
+import os
+import random
+import re
+import threading
+import time
+import openai
+
+# Attempts after the first one for calls that fail with a retryable error
+LLM_MAX_RETRIES = int(os.environ.get('LLM_MAX_RETRIES', 4))
+# Backoff before retry n is drawn from [0, min(cap, base * 2^n)] seconds
+LLM_BACKOFF_BASE = float(os.environ.get('LLM_BACKOFF_BASE', 0.5))
+LLM_BACKOFF_CAP = float(os.environ.get('LLM_BACKOFF_CAP', 30))
+# Consecutive provider failures that open the circuit, and how long it stays open, in seconds
+LLM_BREAKER_THRESHOLD = int(os.environ.get('LLM_BREAKER_THRESHOLD', 5))
+LLM_BREAKER_COOLDOWN = float(os.environ.get('LLM_BREAKER_COOLDOWN', 30))
+# Providers report request limits per minute
+RATE_LIMIT_WINDOW = 60
+
+_limiters = {}
+_breakers = {}
+_registry_lock = threading.Lock()
+
+class LLMUnavailable(Exception):
+    """Raised without calling the provider while its circuit is open."""
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+def parse_reset(value):
+    """Parse a rate limit reset header such as '1s', '6m0s' or '20ms' into seconds."""
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = re.findall(r'(\d+(?:\.\d+)?)(ms|h|m|s)', value)
+    if not parts:
+        return None
+    scale = {'ms': 0.001, 's': 1, 'm': 60, 'h': 3600}
+    return sum(float(number) * scale[unit] for number, unit in parts)
+
+def get_retry_after(headers):
+    """Get how long the provider asked us to wait, in seconds, or None."""
+    if not headers:
+        return None
+    if headers.get('retry-after-ms'):
+        try:
+            return float(headers['retry-after-ms']) / 1000
+        except ValueError:
+            pass
+    return parse_reset(headers.get('retry-after'))
+
+def is_retryable(error):
+    """Tell whether a failed call may succeed if repeated."""
+    if isinstance(error, openai.RateLimitError):
+        # An exhausted quota does not come back by waiting
+        return getattr(error, 'code', None) != 'insufficient_quota'
+    if isinstance(error, (openai.APITimeoutError, openai.APIConnectionError, openai.InternalServerError, openai.ConflictError)):
+        return True
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code == 408
+    return False
+
+def is_provider_failure(error):
+    """Tell whether an error means the provider itself is failing, as opposed to us being throttled or sending a bad request."""
+    if isinstance(error, openai.APIConnectionError):
+        return True
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code >= 500
+    return False
+
+def get_backoff(attempt, retry_after=None):
+    """Get the delay before a retry: full jitter exponential backoff, but no shorter than the provider asked for."""
+    delay = random.uniform(0, min(LLM_BACKOFF_CAP, LLM_BACKOFF_BASE * 2 ** attempt))
+    if retry_after:
+        delay = max(delay, retry_after)
+    return delay
+
+class RateLimiter:
+    """Token bucket of one provider and API key, sized from the rate limit headers of its responses."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # Unknown until the first response reports a limit; until then calls are not held back
+        self.capacity = None
+        self.tokens = 0.0
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.waited = 0.0
+
+    def _refill(self, now):
+        if self.capacity:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.capacity / RATE_LIMIT_WINDOW)
+        self.updated = now
+
+    def acquire(self):
+        """Wait until a request may be sent."""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self.blocked_until and now >= self.blocked_until:
+                    # The provider's window has reset, so the request it made us wait for can go
+                    self.blocked_until = 0.0
+                    self.tokens = max(self.tokens, 1)
+                if now >= self.blocked_until and (not self.capacity or self.tokens >= 1):
+                    if self.capacity:
+                        self.tokens -= 1
+                    return
+                if now < self.blocked_until:
+                    delay = self.blocked_until - now
+                else:
+                    delay = (1 - self.tokens) * RATE_LIMIT_WINDOW / self.capacity
+                self.waited += delay
+            time.sleep(delay)
+
+    def update(self, headers):
+        """Learn the limit and what is left of it from response headers."""
+        if not headers:
+            return
+        with self.lock:
+            now = time.monotonic()
+            self._refill(now)
+            try:
+                limit = int(headers.get('x-ratelimit-limit-requests') or 0)
+                remaining = headers.get('x-ratelimit-remaining-requests')
+                remaining_tokens = headers.get('x-ratelimit-remaining-tokens')
+                if limit:
+                    if not self.capacity:
+                        self.tokens = limit
+                    self.capacity = limit
+                # Other processes share the key, so the provider's count wins when it is lower
+                if remaining is not None:
+                    self.tokens = min(self.tokens, int(remaining))
+                    if int(remaining) <= 0:
+                        self.block(parse_reset(headers.get('x-ratelimit-reset-requests')), now)
+                if remaining_tokens is not None and int(remaining_tokens) <= 0:
+                    self.block(parse_reset(headers.get('x-ratelimit-reset-tokens')), now)
+            except ValueError:
+                pass
+
+    def block(self, seconds, now=None):
+        """Hold back every request for a number of seconds."""
+        if seconds:
+            self.blocked_until = max(self.blocked_until, (now or time.monotonic()) + seconds)
+
+    def get_stats(self):
+        with self.lock:
+            self._refill(time.monotonic())
+            return {
+                'limit_per_minute': self.capacity,
+                'available': round(self.tokens, 2) if self.capacity else None,
+                'blocked_for_s': round(max(0.0, self.blocked_until - time.monotonic()), 3),
+                'waited_s': round(self.waited, 3)
+            }
+
+class CircuitBreaker:
+    """Fails calls to a provider fast after repeated failures, letting one trial call through once the cooldown has passed."""
+
+    def __init__(self, provider, threshold=LLM_BREAKER_THRESHOLD, cooldown=LLM_BREAKER_COOLDOWN):
+        self.provider = provider
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.lock = threading.Lock()
+        self.failures = 0
+        self.opened_at = None
+        self.trial_running = False
+        self.counters = {'opened': 0, 'rejected': 0}
+
+    def before_call(self):
+        """Raise LLMUnavailable if the circuit is open."""
+        with self.lock:
+            if self.opened_at is None:
+                return
+            remaining = self.opened_at + self.cooldown - time.monotonic()
+            if remaining <= 0 and not self.trial_running:
+                # Half open: this call decides whether the circuit closes again
+                self.trial_running = True
+                return
+            self.counters['rejected'] += 1
+        retry_after = max(1, int(remaining) + 1)
+        raise LLMUnavailable(f"{self.provider} is unavailable; try again in {retry_after} seconds", retry_after)
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_running = False
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.trial_running or (self.opened_at is None and self.failures >= self.threshold):
+                self.opened_at = time.monotonic()
+                self.counters['opened'] += 1
+            self.trial_running = False
+
+    def get_stats(self):
+        with self.lock:
+            return {
+                'state': 'closed' if self.opened_at is None else ('half_open' if self.trial_running else 'open'),
+                'consecutive_failures': self.failures,
+                **self.counters
+            }
+
+def get_rate_limiter(provider, api_key=None):
+    """Get the rate limiter of a provider and API key."""
+    # Keyed by a digest so raw keys are not kept around
+    key = hashlib.sha256(f"{provider}:{api_key or ''}".encode('utf-8')).hexdigest()
+    with _registry_lock:
+        limiter = _limiters.get(key)
+        if limiter is None:
+            limiter = _limiters[key] = RateLimiter()
+        return limiter
+
+def get_circuit_breaker(provider):
+    """Get the circuit breaker of a provider."""
+    with _registry_lock:
+        breaker = _breakers.get(provider)
+        if breaker is None:
+            breaker = _breakers[provider] = CircuitBreaker(provider)
+        return breaker
+
+_stats = {'calls': 0, 'retries': 0, 'failed': 0}
+_stats_lock = threading.Lock()
+
+def _count(stat):
+    with _stats_lock:
+        _stats[stat] += 1
+
+def call_with_retries(request, provider='openai', api_key=None):
+    """Send a raw-response API request under the provider's circuit breaker and the key's rate limit,
+    retrying retryable errors with backoff; returns the parsed response."""
+    breaker = get_circuit_breaker(provider)
+    limiter = get_rate_limiter(provider, api_key)
+    _count('calls')
+    attempt = 0
+    while True:
+        breaker.before_call()
+        limiter.acquire()
+        try:
+            raw = request()
+        except Exception as e:
+            response = getattr(e, 'response', None)
+            headers = response.headers if response is not None else None
+            limiter.update(headers)
+            retry_after = get_retry_after(headers)
+            if isinstance(e, openai.RateLimitError):
+                limiter.block(retry_after or parse_reset(headers.get('x-ratelimit-reset-requests') if headers else None))
+
+            # Throttling and rejected requests still show the provider is up
+            if is_provider_failure(e):
+                breaker.record_failure()
+            else:
+                breaker.record_success()
+
+            if not is_retryable(e) or attempt >= LLM_MAX_RETRIES:
+                _count('failed')
+                raise
+            _count('retries')
+            time.sleep(get_backoff(attempt, retry_after))
+            attempt += 1
+            continue
+
+        limiter.update(raw.headers)
+        breaker.record_success()
+        return raw.parse()
+
+def get_llm_retry_stats():
+    """Get retry counters, and the state of every rate limiter and circuit breaker of this process."""
+    with _stats_lock:
+        stats = dict(_stats)
+    with _registry_lock:
+        limiters = list(_limiters.values())
+        breakers = dict(_breakers)
+    stats['breakers'] = {provider: breaker.get_stats() for provider, breaker in breakers.items()}
+    # Limiters are listed without their key digests
+    stats['rate_limiters'] = [limiter.get_stats() for limiter in limiters]
+    return stats
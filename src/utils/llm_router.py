@@ -0,0 +1,238 @@
+import os
+import threading
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from src.utils.llm_providers import LLM_PROVIDERS
+from src.utils.llm_retry import LLMUnavailable, get_circuit_breaker
+
+# Backends the provider 'auto' routes between, as provider:model pairs
+LLM_ROUTER_BACKENDS = [
+    tuple(backend.strip().split(':', 1))
+    for backend in os.environ.get('LLM_ROUTER_BACKENDS', 'openai:gpt-4.1-mini,google:gemini-2.5-flash').split(',')
+    if ':' in backend
+]
+# Recent calls per backend that its latency percentiles are computed from
+LLM_ROUTER_WINDOW = int(os.environ.get('LLM_ROUTER_WINDOW', 200))
+# Endpoints whose calls get a hedged second request when the first one is slow
+LLM_HEDGE_ENDPOINTS = {
+    endpoint.strip()
+    for endpoint in os.environ.get('LLM_HEDGE_ENDPOINTS', 'generate_cover_letter').split(',')
+    if endpoint.strip()
+}
+# A call is hedged once it takes longer than its backend's p95, or this many milliseconds before enough calls were seen
+LLM_HEDGE_AFTER_MS = float(os.environ.get('LLM_HEDGE_AFTER_MS', 0))
+LLM_HEDGE_MIN_SAMPLES = 20
+# Threads running hedged calls
+LLM_HEDGE_WORKERS = int(os.environ.get('LLM_HEDGE_WORKERS', 16))
+# Hedged calls whose two requests may run at once; a request that lost keeps running until it
+# answers, so past this limit slow calls simply wait instead of adding load
+LLM_HEDGE_MAX_IN_FLIGHT = int(os.environ.get('LLM_HEDGE_MAX_IN_FLIGHT', 4))
+
+_latencies = {}
+_lock = threading.Lock()
+_stats = {'routed': 0, 'hedged': 0, 'hedge_wins': 0, 'hedges_skipped': 0, 'failovers': 0}
+_pool = None
+_hedge_slots = threading.BoundedSemaphore(max(1, LLM_HEDGE_MAX_IN_FLIGHT))
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+def record_latency(provider, model, seconds):
+    """Record how long a completed call to a backend took."""
+    with _lock:
+        window = _latencies.get((provider, model))
+        if window is None:
+            window = _latencies[(provider, model)] = deque(maxlen=LLM_ROUTER_WINDOW)
+        window.append(seconds)
+
+def get_latency(provider, model):
+    """Get the rolling p50 and p95 latency of a backend, in seconds, and the number of calls they are based on."""
+    with _lock:
+        values = list(_latencies.get((provider, model), ()))
+    return {'p50': percentile(values, 0.5), 'p95': percentile(values, 0.95), 'samples': len(values)}
+
+def rank_backends(api_keys):
+    """Rank the (provider, model, api_key) backends the provider 'auto' routes between, given keys by provider, best first."""
+    candidates = [
+        (name, backend_model, api_keys.get(name))
+        for name, backend_model in LLM_ROUTER_BACKENDS
+        if name in LLM_PROVIDERS and LLM_PROVIDERS[name].has_key(api_keys.get(name))
+    ]
+    if not candidates:
+        raise Exception('No LLM provider has an API key')
+
+    # Backends whose circuit is open are skipped, unless all of them are
+    healthy = [backend for backend in candidates if get_circuit_breaker(backend[0]).get_stats()['state'] != 'open']
+    # Fastest first; backends without measurements go first so they get measured, and sorted() is
+    # stable, so backends that are equally fast keep their configured order
+    return sorted(healthy or candidates, key=lambda backend: get_latency(backend[0], backend[1])['p50'] or 0.0)
+
+def get_backends(provider, model, api_key=None):
+    """Get the (provider, model, api_key) backends a call may use, best first."""
+    # A call for a specific provider has a single backend; for 'auto', api_key is a dict of keys by provider
+    if provider != 'auto':
+        return [(provider, model, api_key)]
+
+    backends = rank_backends(api_key or {})
+    with _lock:
+        _stats['routed'] += 1
+    return backends
+
+def get_hedge_delay(backend):
+    """Get how long to wait for a backend before hedging, in seconds, or None to not hedge."""
+    latency = get_latency(backend[0], backend[1])
+    if latency['samples'] >= LLM_HEDGE_MIN_SAMPLES:
+        return max(latency['p95'], LLM_HEDGE_AFTER_MS / 1000)
+    return LLM_HEDGE_AFTER_MS / 1000 or None
+
+def _get_pool():
+    global _pool
+    with _lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=max(2, LLM_HEDGE_WORKERS), thread_name_prefix='llm-hedge')
+        return _pool
+
+def get_hedge_backend(backends):
+    """Get the backend a slow call to backends[0] is hedged on: the best one of another provider, or None."""
+    # Hedging on the same provider would only double the load on the same API key
+    for backend in backends[1:]:
+        if backend[0] != backends[0][0]:
+            return backend
+    return None
+
+def acquire_slot(slots, backend, blocking=True):
+    """Take the slot of a backend for one request from slots (an LLMExecutor), if given."""
+    return slots.acquire(backend[0], backend[2], blocking) if slots else ()
+
+def release_slot(slots, token):
+    if slots:
+        slots.release(token)
+
+def submit_call(pool, call, backend, slots, token):
+    """Start call(backend) on the pool; the slot it holds is given back when it ends."""
+    try:
+        future = pool.submit(call, backend)
+    except Exception:
+        release_slot(slots, token)
+        raise
+    future.add_done_callback(lambda _: release_slot(slots, token))
+    return future
+
+def call_in_order(backends, call, slots=None):
+    """Run call(backend) on the backends in turn until one of them is available."""
+    for index, backend in enumerate(backends):
+        token = acquire_slot(slots, backend)
+        try:
+            return call(backend)
+        except LLMUnavailable:
+            if index == len(backends) - 1:
+                raise
+            with _lock:
+                _stats['failovers'] += 1
+        finally:
+            release_slot(slots, token)
+
+def start_hedge(pool, call, backend, slots):
+    """Send the hedged request of a slow call, or return None if no hedge slot or slot of its backend is free."""
+    if not _hedge_slots.acquire(blocking=False):
+        return None
+    # A hedge is extra load, so it never waits for a slot of its backend
+    token = acquire_slot(slots, backend, blocking=False)
+    if token is None:
+        _hedge_slots.release()
+        return None
+    try:
+        return submit_call(pool, call, backend, slots, token)
+    except Exception:
+        _hedge_slots.release()
+        raise
+
+def route_call(endpoint, backends, call, slots=None):
+    """Run call(backend) on the best backend, falling back to the next while a circuit is open, and hedging slow calls.
+
+    With slots, an LLMExecutor, every request holds a slot of its backend while it runs. A hedged call goes to
+    the other backends after any failure, since another provider may well answer."""
+    hedge_backend = get_hedge_backend(backends) if endpoint in LLM_HEDGE_ENDPOINTS else None
+    delay = get_hedge_delay(backends[0]) if hedge_backend else None
+    if delay is None:
+        return call_in_order(backends, call, slots)
+
+    pool = _get_pool()
+    # Taken here rather than on the pool thread, so the request uses the slot the running call reserved
+    first = submit_call(pool, call, backends[0], slots, acquire_slot(slots, backends[0]))
+    done, _ = wait([first], timeout=delay)
+    hedge = None
+    if not done:
+        hedge = start_hedge(pool, call, hedge_backend, slots)
+        if hedge is None:
+            with _lock:
+                _stats['hedges_skipped'] += 1
+    if hedge is None:
+        try:
+            return first.result()
+        except Exception:
+            # Failed before a hedge was due, or with no slot free for one; the other backends are next
+            with _lock:
+                _stats['failovers'] += 1
+            return call_in_order(backends[1:], call, slots)
+
+    with _lock:
+        _stats['hedged'] += 1
+    # The hedge slot is given back once both requests have ended, including the one that lost
+    unfinished = [2]
+    def finished(_):
+        with _lock:
+            unfinished[0] -= 1
+            if unfinished[0]:
+                return
+        _hedge_slots.release()
+    first.add_done_callback(finished)
+    hedge.add_done_callback(finished)
+
+    pending = {first, hedge}
+    errors = {}
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            try:
+                result = future.result()
+            except Exception as e:
+                # A failed request only loses the race; the other one may still answer
+                errors[future] = e
+                continue
+            # A request the pool has not started yet is dropped; a running one cannot be interrupted
+            for loser in pending:
+                loser.cancel()
+            if future is hedge:
+                with _lock:
+                    _stats['hedge_wins'] += 1
+            return result
+
+    # Both requests failed; the backends not tried yet are next
+    rest = [backend for backend in backends[1:] if backend != hedge_backend]
+    if rest:
+        with _lock:
+            _stats['failovers'] += 1
+        return call_in_order(rest, call, slots)
+    # LLMUnavailable tells the caller when to try again, so it is the error raised if either request got it
+    unavailable = [error for error in (errors[first], errors[hedge]) if isinstance(error, LLMUnavailable)]
+    raise (unavailable or [errors[first]])[0]
+
+def get_router_stats():
+    """Get routing and hedging counters and the rolling latency of every backend, in milliseconds."""
+    with _lock:
+        stats = dict(_stats)
+        backends = list(_latencies)
+    stats['backends'] = {}
+    for provider, model in backends:
+        latency = get_latency(provider, model)
+        stats['backends'][f"{provider}:{model}"] = {
+            'p50_ms': latency['p50'] * 1000,
+            'p95_ms': latency['p95'] * 1000,
+            'samples': latency['samples'],
+            'circuit': get_circuit_breaker(provider).get_stats()['state']
+        }
+    return stats
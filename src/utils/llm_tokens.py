@@ -0,0 +1,185 @@
+import math
+import re
+from functools import lru_cache
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+# Rough characters per token of English text, used when tiktoken is not installed
+CHARS_PER_TOKEN = 4
+
+# Headings recognized as the start of a resume section, besides lines in capitals
+SECTION_HEADINGS = {
+    'summary', 'profile', 'objective', 'about me', 'experience', 'work experience', 'professional experience',
+    'employment', 'employment history', 'education', 'skills', 'technical skills', 'core competencies',
+    'projects', 'certifications', 'certificates', 'languages', 'publications', 'selected publications',
+    'presentations', 'talks', 'conferences', 'patents', 'awards', 'honors', 'volunteering', 'volunteer experience',
+    'interests', 'hobbies', 'references', 'teaching', 'research', 'grants'
+}
+# Sections dropped first when a resume is over budget, least useful first
+LOW_PRIORITY_SECTIONS = [
+    ('references',),
+    ('hobbies', 'interests'),
+    ('publications', 'selected publications'),
+    ('presentations', 'talks', 'conferences'),
+    ('patents', 'grants'),
+    ('volunteering', 'volunteer experience'),
+    ('awards', 'honors')
+]
+
+@lru_cache(maxsize=None)
+def _get_encoding(model):
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding('o200k_base')
+
+def count_tokens(text, model='gpt-4.1-mini'):
+    """Count the tokens of a text for a model, estimating from its length when tiktoken is not installed."""
+    if not text:
+        return 0
+    if tiktoken is not None:
+        return len(_get_encoding(model).encode(text, disallowed_special=()))
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+def get_heading(line):
+    """Get the normalized heading of a line that starts a section, or None."""
+    stripped = line.strip().rstrip(':').strip()
+    if not stripped or len(stripped) > 40 or len(stripped.split()) > 4:
+        return None
+    normalized = re.sub(r'\s+', ' ', stripped.lower())
+    if normalized in SECTION_HEADINGS:
+        return normalized
+    if stripped.isupper() and any(char.isalpha() for char in stripped):
+        return normalized
+    return None
+
+def split_sections(text):
+    """Split a resume into (heading, text) sections; text before the first heading has the heading None."""
+    sections = []
+    heading, lines = None, []
+    for line in text.splitlines():
+        line_heading = get_heading(line)
+        if line_heading and lines:
+            sections.append((heading, "\n".join(lines)))
+            lines = []
+        if line_heading:
+            heading = line_heading
+        lines.append(line)
+    if lines:
+        sections.append((heading, "\n".join(lines)))
+    return sections
+
+def _longest_fit(count, join, max_tokens, model):
+    # Largest n whose join(n) fits in max_tokens, found by bisection since the token count grows with n
+    low, high = 0, count
+    while low < high:
+        middle = (low + high + 1) // 2
+        if count_tokens(join(middle), model) <= max_tokens:
+            low = middle
+        else:
+            high = middle - 1
+    return low
+
+def truncate_words(text, max_tokens, model='gpt-4.1-mini'):
+    """Keep the leading words of a single long line that fit in max_tokens, or its leading characters if not even one word fits."""
+    words = text.split(' ')
+    kept = _longest_fit(len(words), lambda n: ' '.join(words[:n]), max_tokens, model)
+    if kept:
+        return ' '.join(words[:kept])
+    return text[:_longest_fit(len(words[0]), lambda n: words[0][:n], max_tokens, model)]
+
+def split_line(line, max_tokens, model='gpt-4.1-mini'):
+    """Split a line longer than max_tokens into consecutive pieces that fit, breaking between words where possible."""
+    pieces = []
+    while line:
+        # At least one character per piece, so even a budget below one character makes progress
+        piece = truncate_words(line, max_tokens, model) or line[0]
+        pieces.append(piece)
+        line = line[len(piece):].lstrip(' ')
+    return pieces
+
+def truncate_to_tokens(text, max_tokens, model='gpt-4.1-mini'):
+    """Keep the leading lines of a text that fit in max_tokens, and the leading words of the first line that does not."""
+    kept = []
+    used = 0
+    for line in text.splitlines():
+        tokens = count_tokens(line + "\n", model)
+        if used + tokens > max_tokens:
+            # The rest of the budget goes to the start of this line rather than going unused
+            partial = truncate_words(line, max_tokens - used, model)
+            if partial:
+                kept.append(partial)
+            break
+        kept.append(line)
+        used += tokens
+    return "\n".join(kept)
+
+def trim_to_budget(text, budget, model='gpt-4.1-mini'):
+    """Fit a resume in a token budget: drop low priority sections first, then shorten the longest sections evenly."""
+    sections = split_sections(text)
+    counts = [count_tokens(section_text, model) for _, section_text in sections]
+    if sum(counts) <= budget:
+        return text
+
+    for headings in LOW_PRIORITY_SECTIONS:
+        if sum(counts) <= budget:
+            break
+        for index, (heading, _) in enumerate(sections):
+            if heading in headings:
+                counts[index] = 0
+
+    # Share what is left so that short sections stay whole and long ones are cut to the same size
+    allowances = [0] * len(sections)
+    remaining = budget
+    kept = [index for index, count in enumerate(counts) if count]
+    for position, index in enumerate(sorted(kept, key=lambda index: counts[index])):
+        allowances[index] = min(counts[index], remaining // (len(kept) - position))
+        remaining -= allowances[index]
+
+    parts = []
+    for index, (_, section_text) in enumerate(sections):
+        if allowances[index] >= counts[index] > 0:
+            parts.append(section_text)
+        elif allowances[index]:
+            parts.append(truncate_to_tokens(section_text, allowances[index], model))
+    return "\n".join(part for part in parts if part)
+
+def pack_pieces(pieces, max_tokens):
+    """Join (text, tokens) pieces in order into as few texts of at most max_tokens as possible."""
+    packed = []
+    current, used = [], 0
+    for text, tokens in pieces:
+        # Every join adds a newline, about one token
+        if current and used + 1 + tokens > max_tokens:
+            packed.append("\n".join(current))
+            current, used = [], 0
+        used += tokens + (1 if current else 0)
+        current.append(text)
+    if current:
+        packed.append("\n".join(current))
+    return packed
+
+def chunk_text(text, max_tokens, model='gpt-4.1-mini'):
+    """Split a resume into chunks of at most max_tokens, breaking between sections where possible."""
+    if count_tokens(text, model) <= max_tokens:
+        return [text]
+
+    pieces = []
+    for _, section_text in split_sections(text):
+        tokens = count_tokens(section_text, model)
+        if tokens <= max_tokens:
+            pieces.append((section_text, tokens))
+            continue
+        # Sections that do not fit in a chunk on their own are broken between lines, and lines that are too long between words
+        lines = []
+        for line in section_text.splitlines():
+            line_tokens = count_tokens(line, model)
+            if line_tokens <= max_tokens:
+                lines.append((line, line_tokens))
+                continue
+            lines.extend((piece, count_tokens(piece, model)) for piece in split_line(line, max_tokens, model))
+        pieces.extend((part, count_tokens(part, model)) for part in pack_pieces(lines, max_tokens))
+    return pack_pieces(pieces, max_tokens)
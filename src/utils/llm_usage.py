@@ -0,0 +1,79 @@
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from src.models.models import db, LLMUsage
+
+# How long usage records are kept, in days
+LLM_USAGE_RETENTION = timedelta(days=int(os.environ.get('LLM_USAGE_RETENTION_DAYS', 30)))
+# Seconds between deletions of expired records by one process
+LLM_USAGE_PRUNE_INTERVAL = 3600
+
+_last_pruned = 0.0
+_prune_lock = threading.Lock()
+
+def get_cached_tokens(usage):
+    """Get the prompt tokens a provider served from its prefix cache, from the usage of a response."""
+    details = getattr(usage, 'prompt_tokens_details', None)
+    return (getattr(details, 'cached_tokens', None) or 0) if details else 0
+
+def record_llm_usage(endpoint, provider, model, usage, latency, first_token=None):
+    """Record the token usage and latency, in seconds, of a call to a provider."""
+    global _last_pruned
+    db.session.add(LLMUsage(
+        endpoint=endpoint,
+        provider=provider,
+        model=model,
+        prompt_tokens=getattr(usage, 'prompt_tokens', 0) or 0,
+        cached_tokens=get_cached_tokens(usage),
+        completion_tokens=getattr(usage, 'completion_tokens', 0) or 0,
+        latency_ms=latency * 1000,
+        first_token_ms=first_token * 1000 if first_token is not None else None
+    ))
+
+    with _prune_lock:
+        prune = time.monotonic() - _last_pruned > LLM_USAGE_PRUNE_INTERVAL
+        if prune:
+            _last_pruned = time.monotonic()
+    if prune:
+        LLMUsage.query.filter(LLMUsage.created_at < datetime.utcnow() - LLM_USAGE_RETENTION).delete()
+    db.session.commit()
+
+def get_llm_usage_report(since):
+    """Get the cached token ratio and latency of each prompt type since a point in time."""
+    def percentile(values, fraction):
+        if not values:
+            return None
+        values = sorted(values)
+        return round(values[min(len(values) - 1, int(len(values) * fraction))], 1)
+
+    rows = db.session.query(
+        LLMUsage.endpoint, LLMUsage.prompt_tokens, LLMUsage.cached_tokens,
+        LLMUsage.completion_tokens, LLMUsage.latency_ms, LLMUsage.first_token_ms
+    ).filter(LLMUsage.created_at >= since).all()
+
+    grouped = {}
+    for endpoint, prompt_tokens, cached_tokens, completion_tokens, latency_ms, first_token_ms in rows:
+        group = grouped.setdefault(endpoint, {'calls': 0, 'prompt_tokens': 0, 'cached_tokens': 0, 'completion_tokens': 0,
+                                              'latencies': [], 'first_tokens': []})
+        group['calls'] += 1
+        group['prompt_tokens'] += prompt_tokens
+        group['cached_tokens'] += cached_tokens
+        group['completion_tokens'] += completion_tokens
+        group['latencies'].append(latency_ms)
+        if first_token_ms is not None:
+            group['first_tokens'].append(first_token_ms)
+
+    endpoints = {}
+    for endpoint, group in sorted(grouped.items()):
+        latencies = group.pop('latencies')
+        first_tokens = group.pop('first_tokens')
+        group['cached_ratio'] = round(group['cached_tokens'] / group['prompt_tokens'], 4) if group['prompt_tokens'] else 0.0
+        group['latency_ms'] = {'p50': percentile(latencies, 0.5), 'p95': percentile(latencies, 0.95)}
+        group['first_token_ms'] = {'p50': percentile(first_tokens, 0.5), 'p95': percentile(first_tokens, 0.95)}
+        endpoints[endpoint] = group
+
+    return {
+        'since': since.isoformat(),
+        'endpoints': endpoints
+    }
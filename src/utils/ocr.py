@@ -1,67 +1,549 @@
 import pytesseract
-from PIL import Image
+from PIL import Image, ImageChops, ImageFilter, ImageOps
 import pdfplumber
-from docx import Document as DocxDocument
+import multiprocessing
+import multiprocessing.util
 import os
+import re
+import threading
+import weakref
+import zipfile
+import xml.etree.ElementTree as ET
+from abc import ABC, abstractmethod
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from src.utils.langid import LANGID_SAMPLE_CHARS, identify_language
 
-def extract_text_from_image(image_path, lang='eng'):
+try:
+    import tesserocr
+except ImportError:
+    tesserocr = None
+
+# OCR engine: 'tesserocr', 'pytesseract', or 'auto' to prefer tesserocr when it is installed
+OCR_ENGINE = os.environ.get('OCR_ENGINE', 'auto')
+# Tesseract languages used for image OCR
+OCR_LANG = os.environ.get('OCR_LANG', 'eng+rus')
+# Bump whenever a pipeline change alters the text produced for the same file
+OCR_PIPELINE_VERSION = 7
+# Pick the Tesseract language instead of always using OCR_LANG: per image from a quick pass over a band of it,
+# and per PDF from its text layer or first scanned page
+OCR_AUTO_LANG = os.environ.get('OCR_AUTO_LANG', '1') != '0'
+# Language added to the detected one, since resumes mix in English terms ('' to disable)
+OCR_SECONDARY_LANG = os.environ.get('OCR_SECONDARY_LANG', 'eng')
+
+# Clean up images before Tesseract: downscale, grayscale, binarize and deskew (0 disables it)
+OCR_PREPROCESS = os.environ.get('OCR_PREPROCESS', '1') != '0'
+# Resolution Tesseract works best at; sharper scans are downscaled to it
+OCR_TARGET_DPI = int(os.environ.get('OCR_TARGET_DPI', 300))
+# Longest side for images without a trustworthy resolution, such as phone photos
+OCR_MAX_DIMENSION = int(os.environ.get('OCR_MAX_DIMENSION', 2400))
+# Largest skew corrected by deskewing, and the search step, in degrees
+OCR_DESKEW_MAX_ANGLE = 5.0
+OCR_DESKEW_STEP = 0.5
+
+# Worker processes for page-parallel PDF extraction (1 disables it). Every OCR job worker process has its
+# own pool, so by default the cores are shared between them rather than each taking all of them
+PDF_WORKERS = int(os.environ.get('PDF_WORKERS', max(1, (os.cpu_count() or 1) // int(os.environ.get('OCR_JOB_WORKERS', 2)))))
+# PDFs with fewer pages than this are extracted in the calling process
+PDF_PARALLEL_MIN_PAGES = int(os.environ.get('PDF_PARALLEL_MIN_PAGES', 8))
+# Upper bound on the number of pages handled by one worker task
+PDF_PAGES_PER_TASK = int(os.environ.get('PDF_PAGES_PER_TASK', 8))
+# Pages with images and a text layer shorter than this are treated as scans and OCRed
+PDF_MIN_TEXT_CHARS = int(os.environ.get('PDF_MIN_TEXT_CHARS', 20))
+# Resolution used to rasterize scanned PDF pages for OCR
+PDF_OCR_DPI = int(os.environ.get('PDF_OCR_DPI', 300))
+
+_pdf_executor = None
+_pdf_executor_workers = 0
+_pdf_executor_lock = threading.Lock()
+
+# WordprocessingML element names used by the streaming DOCX extractor
+DOCX_W = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+DOCX_MC_FALLBACK = '{http://schemas.openxmlformats.org/markup-compatibility/2006}Fallback'
+DOCX_PART_NUMBER = re.compile(r'word/(header|footer)(\d*)\.xml')
+
+_ocr_engines = {}
+_ocr_engines_lock = threading.Lock()
+
+class OCREngine(ABC):
+    """Interface of the OCR engines used to turn images into text."""
+    name = None
+
+    @abstractmethod
+    def image_to_string(self, image, lang):
+        """Recognize the text of a PIL image."""
+
+    @abstractmethod
+    def get_languages(self):
+        """Get the codes of the installed Tesseract languages."""
+
+    def close(self):
+        """Release resources held by the engine."""
+
+class PytesseractEngine(OCREngine):
+    """Runs the tesseract binary once per image, reloading the language models every time."""
+    name = 'pytesseract'
+
+    def __init__(self):
+        self.languages = None
+
+    def image_to_string(self, image, lang):
+        return pytesseract.image_to_string(image, lang=lang)
+
+    def get_languages(self):
+        if self.languages is None:
+            self.languages = set(pytesseract.get_languages(config=''))
+        return self.languages
+
+class TesserocrEngine(OCREngine):
+    """Keeps Tesseract loaded in-process through its C API, one instance per thread and language."""
+    name = 'tesserocr'
+
+    def __init__(self):
+        self.local = threading.local()
+        self.languages = None
+        # One per thread that used the engine; ends its instances when the thread exits or on close()
+        self.finalizers = []
+        self.lock = threading.Lock()
+
+    def get_api(self, lang):
+        """Get this thread's Tesseract instance for a language, loading its models once."""
+        thread_apis = getattr(self.local, 'apis', None)
+        if thread_apis is None:
+            thread_apis = self.local.apis = ThreadAPIs()
+            # The thread-local object is dropped when its thread exits, which frees its instances
+            finalizer = weakref.finalize(thread_apis, end_tesseract_apis, thread_apis.apis)
+            with self.lock:
+                self.finalizers = [f for f in self.finalizers if f.alive] + [finalizer]
+        api = thread_apis.apis.get(lang)
+        if api is None:
+            api = thread_apis.apis[lang] = tesserocr.PyTessBaseAPI(lang=lang)
+        return api
+
+    def image_to_string(self, image, lang):
+        api = self.get_api(lang)
+        api.SetImage(image)
+        return api.GetUTF8Text()
+
+    def get_languages(self):
+        if self.languages is None:
+            self.languages = set(tesserocr.get_languages()[1])
+        return self.languages
+
+    def close(self):
+        with self.lock:
+            finalizers, self.finalizers = self.finalizers, []
+        for finalizer in finalizers:
+            finalizer()
+        self.local = threading.local()
+
+class ThreadAPIs:
+    """Holder of one thread's Tesseract instances by language."""
+
+    def __init__(self):
+        self.apis = {}
+
+def end_tesseract_apis(apis):
+    """Free Tesseract instances and their loaded models."""
+    for api in apis.values():
+        api.End()
+    apis.clear()
+
+def close_ocr_engines():
+    """Release the resources of every OCR engine of this process."""
+    with _ocr_engines_lock:
+        engines = list(_ocr_engines.values())
+        _ocr_engines.clear()
+    for engine in engines:
+        engine.close()
+
+# Also runs when PDF pool and OCR job worker processes exit, where atexit handlers are skipped
+multiprocessing.util.Finalize(None, close_ocr_engines, exitpriority=0)
+
+def get_ocr_engine_name():
+    """Resolve the configured OCR engine name."""
+    if OCR_ENGINE == 'auto':
+        return 'tesserocr' if tesserocr is not None else 'pytesseract'
+    return OCR_ENGINE
+
+def get_ocr_engine(name=None):
+    """Get this process's OCR engine, creating it on first use."""
+    name = name or get_ocr_engine_name()
+    with _ocr_engines_lock:
+        engine = _ocr_engines.get(name)
+        if engine is None:
+            if name == 'tesserocr':
+                if tesserocr is None:
+                    raise Exception("OCR engine 'tesserocr' is not installed")
+                engine = TesserocrEngine()
+            elif name == 'pytesseract':
+                engine = PytesseractEngine()
+            else:
+                raise Exception(f"Unknown OCR engine: {name}")
+            _ocr_engines[name] = engine
+        return engine
+
+def get_ocr_scale(image, dpi=None, target_dpi=OCR_TARGET_DPI, max_dimension=OCR_MAX_DIMENSION):
+    """Get the downscale factor that brings an image to the OCR target resolution."""
+    dpi = dpi or (image.info.get('dpi') or (0,))[0]
+    if dpi and dpi >= target_dpi:
+        return target_dpi / dpi
+    # Camera images usually report a meaningless 72 DPI, so cap their size instead
+    return min(1.0, max_dimension / max(image.size))
+
+def otsu_threshold(image):
+    """Compute the Otsu threshold of a grayscale image."""
+    histogram = image.histogram()[:256]
+    total = sum(histogram)
+    sum_all = sum(value * count for value, count in enumerate(histogram))
+    sum_below = 0
+    weight_below = 0
+    best_threshold = 0
+    best_variance = 0.0
+
+    for value, count in enumerate(histogram):
+        weight_below += count
+        if weight_below == 0:
+            continue
+        weight_above = total - weight_below
+        if weight_above == 0:
+            break
+        sum_below += value * count
+        mean_below = sum_below / weight_below
+        mean_above = (sum_all - sum_below) / weight_above
+        variance = weight_below * weight_above * (mean_below - mean_above) ** 2
+        if variance > best_variance:
+            best_variance = variance
+            best_threshold = value
+
+    return best_threshold
+
+def binarize_image(image):
+    """Binarize a grayscale image, compensating for uneven lighting."""
+    # Ink is whatever is darker than the local background, which removes shadows and gradients
+    radius = max(image.size) // 40 or 1
+    background = image.filter(ImageFilter.BoxBlur(radius))
+    ink = ImageChops.subtract(background, image)
+    threshold = otsu_threshold(ink)
+    return ink.point(lambda value: 0 if value > threshold else 255)
+
+def estimate_skew(image, max_angle=OCR_DESKEW_MAX_ANGLE, step=OCR_DESKEW_STEP):
+    """Estimate the skew angle of a binarized text image by projection profiles."""
+    thumbnail = ImageOps.invert(image)
+    thumbnail.thumbnail((800, 800))
+
+    best_angle = 0.0
+    best_score = -1
+    steps = int(max_angle / step)
+    for i in range(-steps, steps + 1):
+        angle = i * step
+        rotated = thumbnail.rotate(angle, resample=Image.BILINEAR, fillcolor=0)
+        # Averaging every row down to one pixel gives the horizontal projection profile
+        profile = list(rotated.resize((1, rotated.height), Image.BOX).getdata())
+        # Text lines aligned with the rows give the sharpest jumps between neighbouring rows
+        score = sum((profile[j + 1] - profile[j]) ** 2 for j in range(len(profile) - 1))
+        if score > best_score:
+            best_score = score
+            best_angle = angle
+
+    return best_angle
+
+def preprocess_image(image, dpi=None, grayscale=True, binarize=True, deskew=True):
+    """Prepare an image for OCR: downscale to the target resolution, grayscale, binarize and deskew."""
+    if image.getexif().get(0x0112, 1) != 1:  # EXIF orientation of phone photos
+        image = ImageOps.exif_transpose(image)
+
+    scale = get_ocr_scale(image, dpi=dpi)
+    size = (max(1, round(image.width * scale)), max(1, round(image.height * scale)))
+    grayscale = grayscale or binarize or deskew
+
+    # Let the JPEG decoder do most of the downscaling and color conversion while decoding
+    if image.format == 'JPEG':
+        image.draft('L' if grayscale else image.mode, size)
+    if grayscale:
+        image = image.convert('L')
+    if image.size != size:
+        image = image.resize(size, Image.LANCZOS, reducing_gap=3.0)
+
+    if binarize or deskew:
+        binary = binarize_image(image)
+        if binarize:
+            image = binary
+        if deskew:
+            angle = estimate_skew(binary)
+            if angle:
+                image = image.rotate(angle, resample=Image.BICUBIC, expand=True, fillcolor=255)
+
+    return image
+
+def get_document_language(text, engine=None):
+    """Choose the Tesseract languages for the rest of a document from text already read from it, or None if unsure."""
+    lang = identify_language(text, default=None)
+    if lang is None:
+        return None
+
+    langs = [lang]
+    if OCR_SECONDARY_LANG and OCR_SECONDARY_LANG != lang:
+        langs.append(OCR_SECONDARY_LANG)
+    if not set(langs) <= get_ocr_engine(engine).get_languages():
+        return OCR_LANG
+    return '+'.join(langs)
+
+def detect_image_language(image, engine=None):
+    """Choose the Tesseract languages for an image from a quick OCR pass over a band of it."""
+    # The middle of a page is mostly body text, and a third of it is plenty to tell the language
+    band = image.crop((0, image.height // 3, image.width, 2 * image.height // 3))
+    sample = get_ocr_engine(engine).image_to_string(band, OCR_LANG)
+    return get_document_language(sample, engine) or OCR_LANG
+
+def ocr_image(image, lang=None, dpi=None, preprocess=None, engine=None):
+    """Run OCR on a PIL image, preprocessing it first unless disabled; lang defaults to OCR_LANG."""
+    preprocess = OCR_PREPROCESS if preprocess is None else preprocess
+    if preprocess:
+        image = preprocess_image(image, dpi=dpi)
+    return get_ocr_engine(engine).image_to_string(image, lang or OCR_LANG).strip()
+
+def extract_text_from_image(image_path, lang=None):
     """Extract text from an image using Tesseract OCR."""
     try:
         image = Image.open(image_path)
-        text = pytesseract.image_to_string(image, lang=lang)
-        return text.strip()
+        if lang is None and OCR_AUTO_LANG:
+            # Preprocessed once, for both the language pass and the full one
+            if OCR_PREPROCESS:
+                image = preprocess_image(image)
+            return ocr_image(image, lang=detect_image_language(image), preprocess=False)
+        return ocr_image(image, lang=lang)
     except Exception as e:
         raise Exception(f"Error extracting text from image: {str(e)}")
 
-def extract_text_from_pdf(pdf_path):
-    """Extract text from a PDF file using pdfplumber."""
+def get_pdf_executor(workers):
+    """Get the shared process pool for PDF page extraction."""
+    global _pdf_executor, _pdf_executor_workers
+    with _pdf_executor_lock:
+        if _pdf_executor is None or _pdf_executor_workers != workers:
+            if _pdf_executor is not None:
+                _pdf_executor.shutdown(wait=False)
+            _pdf_executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+            _pdf_executor_workers = workers
+        return _pdf_executor
+
+def get_page_text_layer(page):
+    """Get the text layer of a PDF page, or None if the page is a scan that needs OCR."""
+    text = page.extract_text() or ''
+    if len(text.strip()) < PDF_MIN_TEXT_CHARS and page.images:
+        return None
+    return text
+
+def extract_pdf_page_range(pdf_path, start, end):
+    """Extract the text layer of pages [start, end) of a PDF; None marks pages that need OCR."""
+    with pdfplumber.open(pdf_path) as pdf:
+        return [get_page_text_layer(page) for page in pdf.pages[start:end]]
+
+def ocr_pdf_page(pdf_path, page_number, lang=None):
+    """Rasterize a single PDF page and OCR it."""
+    with pdfplumber.open(pdf_path) as pdf:
+        image = pdf.pages[page_number].to_image(resolution=PDF_OCR_DPI).original
+    return ocr_image(image, lang=lang, dpi=PDF_OCR_DPI)
+
+def iter_pdf_text_layers(pdf_path, workers):
+    """Yield (page_number, text) for each page of a PDF in order as soon as its text layer is read; None marks scans."""
+    with pdfplumber.open(pdf_path) as pdf:
+        page_count = len(pdf.pages)
+        if workers <= 1 or page_count < PDF_PARALLEL_MIN_PAGES:
+            for page_number, page in enumerate(pdf.pages):
+                yield page_number, get_page_text_layer(page)
+            return
+
+        # Small enough ranges to keep every worker busy, large enough to amortize reopening the PDF
+        pages_per_task = max(1, min(PDF_PAGES_PER_TASK, -(-(page_count - 1) // workers)))
+        executor = get_pdf_executor(workers)
+        futures = [
+            (start, executor.submit(extract_pdf_page_range, pdf_path, start, min(start + pages_per_task, page_count)))
+            for start in range(1, page_count, pages_per_task)
+        ]
+        try:
+            # The first page is read here while the workers start on the rest, so it is not held up by them
+            yield 0, get_page_text_layer(pdf.pages[0])
+            for start, future in futures:
+                for offset, text in enumerate(future.result()):
+                    yield start + offset, text
+        finally:
+            for _, future in futures:
+                future.cancel()
+
+def iter_pdf_pages(pdf_path, workers=None, lang=None):
+    """Yield the text of each PDF page in order as soon as it is extracted, OCRing only the pages without a text layer.
+
+    Without lang, scanned pages are OCRed in the language of the text layers read before them, or else of the
+    first scanned page, which is OCRed with all of OCR_LANG."""
+    workers = PDF_WORKERS if workers is None else workers
+    detect = lang is None and OCR_AUTO_LANG
+    sample = []
+    sample_chars = 0
+    first_scan = None
+    # Pages in order that have not been yielded yet: text, or the OCR future of a scanned page
+    pending = deque()
+
+    def ocr(page_number, page_lang):
+        if workers <= 1:
+            return ocr_pdf_page(pdf_path, page_number, page_lang)
+        # Scanned pages are OCRed concurrently while the text layers of later pages are read
+        return get_pdf_executor(workers).submit(ocr_pdf_page, pdf_path, page_number, page_lang)
+
     try:
-        text = ""
-        with pdfplumber.open(pdf_path) as pdf:
-            for page in pdf.pages:
-                page_text = page.extract_text()
-                if page_text:
-                    text += page_text + "\n"
-        return text.strip()
+        for page_number, text in iter_pdf_text_layers(pdf_path, workers):
+            if text is not None:
+                if detect and lang is None and sample_chars < LANGID_SAMPLE_CHARS:
+                    sample.append(text)
+                    sample_chars += len(text)
+            elif not detect:
+                text = ocr(page_number, lang)
+            else:
+                if lang is None:
+                    lang = get_document_language("\n".join(sample))
+                if lang is None and first_scan is not None:
+                    # Later scanned pages wait for the first one to tell the language
+                    first_text = first_scan.result() if isinstance(first_scan, Future) else first_scan
+                    lang = get_document_language(first_text) or OCR_LANG
+                if lang is None:
+                    first_scan = text = ocr(page_number, OCR_LANG)
+                else:
+                    text = ocr(page_number, lang)
+
+            pending.append(text)
+            while pending and not (isinstance(pending[0], Future) and not pending[0].done()):
+                page_text = pending.popleft()
+                yield page_text.result() if isinstance(page_text, Future) else page_text
+
+        while pending:
+            page_text = pending.popleft()
+            yield page_text.result() if isinstance(page_text, Future) else page_text
+    finally:
+        for page_text in pending:
+            if isinstance(page_text, Future):
+                page_text.cancel()
+
+def extract_text_from_pdf(pdf_path, workers=None, lang=None):
+    """Extract text from a PDF file, OCRing scanned pages."""
+    try:
+        return "\n".join(page_text for page_text in iter_pdf_pages(pdf_path, workers, lang) if page_text).strip()
     except Exception as e:
         raise Exception(f"Error extracting text from PDF: {str(e)}")
 
+def iter_docx_part_paragraphs(stream):
+    """Yield the text of each paragraph of a WordprocessingML part in document order."""
+    open_elements = []
+    paragraphs = []  # Text boxes nest paragraphs inside paragraphs
+    fallback_depth = 0
+
+    for event, element in ET.iterparse(stream, events=('start', 'end')):
+        tag = element.tag
+        if event == 'start':
+            open_elements.append(element)
+            if tag == DOCX_MC_FALLBACK:
+                # Alternate renderings repeat the text of the preferred choice
+                fallback_depth += 1
+            elif tag == DOCX_W + 'p' and not fallback_depth:
+                paragraphs.append([])
+            continue
+
+        if tag == DOCX_MC_FALLBACK:
+            fallback_depth -= 1
+        elif not fallback_depth and paragraphs:
+            if tag == DOCX_W + 't':
+                paragraphs[-1].append(element.text or '')
+            elif tag == DOCX_W + 'tab':
+                paragraphs[-1].append('\t')
+            elif tag in (DOCX_W + 'br', DOCX_W + 'cr'):
+                paragraphs[-1].append('\n')
+            elif tag == DOCX_W + 'p':
+                yield ''.join(paragraphs.pop())
+
+        # Drop finished elements so memory stays bounded by the nesting depth
+        open_elements.pop()
+        if open_elements:
+            open_elements[-1].remove(element)
+
+def get_docx_text_parts(archive):
+    """List the parts of a DOCX archive that hold text: headers, the body, then footers."""
+    headers, footers = [], []
+    for name in archive.namelist():
+        match = DOCX_PART_NUMBER.fullmatch(name)
+        if match:
+            part = (int(match.group(2) or 0), name)
+            (headers if match.group(1) == 'header' else footers).append(part)
+    return [name for _, name in sorted(headers)] + ['word/document.xml'] + [name for _, name in sorted(footers)]
+
+def iter_docx_paragraphs(docx_path):
+    """Yield the text of every paragraph of a DOCX file, including tables, text boxes, headers and footers."""
+    with zipfile.ZipFile(docx_path) as archive:
+        for part in get_docx_text_parts(archive):
+            with archive.open(part) as stream:
+                yield from iter_docx_part_paragraphs(stream)
+
 def extract_text_from_docx(docx_path):
     """Extract text from a DOCX file."""
     try:
-        doc = DocxDocument(docx_path)
-        text = "\n".join([paragraph.text for paragraph in doc.paragraphs])
+        text = "\n".join(iter_docx_paragraphs(docx_path))
         return text.strip()
     except Exception as e:
         raise Exception(f"Error extracting text from DOCX: {str(e)}")
 
 def detect_language(text):
-    """Detect the language of the text (simplified version)."""
-    # This is a simplified version. In production, use a proper language detection library
-    # like langdetect or polyglot
-    if any(ord(char) >= 0x0400 and ord(char) <= 0x04FF for char in text[:100]):
-        return 'rus'  # Russian (Cyrillic)
-    return 'eng'  # Default to English
+    """Detect the language of the text as a Tesseract language code."""
+    return identify_language(text)
+
+def get_ocr_settings():
+    """Get the settings that affect OCR output, used to key cached results."""
+    return {
+        'version': OCR_PIPELINE_VERSION,
+        'engine': get_ocr_engine_name(),
+        'lang': OCR_LANG,
+        'auto_lang': OCR_AUTO_LANG,
+        'secondary_lang': OCR_SECONDARY_LANG,
+        'pdf_min_text_chars': PDF_MIN_TEXT_CHARS,
+        'pdf_ocr_dpi': PDF_OCR_DPI,
+        'preprocess': OCR_PREPROCESS,
+        'target_dpi': OCR_TARGET_DPI,
+        'max_dimension': OCR_MAX_DIMENSION
+    }
+
+def extract_text(file_path, mime_type):
+    """Extract the raw text of a file based on its MIME type."""
+    if mime_type == 'application/pdf':
+        return extract_text_from_pdf(file_path)
+    elif mime_type == 'application/vnd.openxmlformats-officedocument.wordprocessingml.document':
+        return extract_text_from_docx(file_path)
+    elif mime_type.startswith('image/'):
+        return extract_text_from_image(file_path)
+    else:
+        raise Exception(f"Unsupported file type: {mime_type}")
+
+def normalize_text(text):
+    """Post-processing: remove extra whitespace and empty lines."""
+    return "\n".join([line.strip() for line in text.split("\n") if line.strip()])
+
+def iter_file_pages(file_path, mime_type):
+    """Yield (page_number, page_count, text) for each page of a file as soon as it is extracted."""
+    if mime_type != 'application/pdf':
+        yield 1, 1, normalize_text(extract_text(file_path, mime_type))
+        return
+
+    try:
+        with pdfplumber.open(file_path) as pdf:
+            page_count = len(pdf.pages)
+        for page_number, page_text in enumerate(iter_pdf_pages(file_path), start=1):
+            yield page_number, page_count, normalize_text(page_text)
+    except Exception as e:
+        raise Exception(f"Error extracting text from PDF: {str(e)}")
 
 def process_file_ocr(file_path, mime_type):
     """Process a file and extract text based on its MIME type."""
-    text = ""
-    lang = 'eng'
-    
     try:
-        if mime_type == 'application/pdf':
-            text = extract_text_from_pdf(file_path)
-        elif mime_type == 'application/vnd.openxmlformats-officedocument.wordprocessingml.document':
-            text = extract_text_from_docx(file_path)
-        elif mime_type.startswith('image/'):
-            # Detect language first (simplified)
-            lang = 'eng+rus'  # Support multiple languages
-            text = extract_text_from_image(file_path, lang=lang)
-        else:
-            raise Exception(f"Unsupported file type: {mime_type}")
+        text = extract_text(file_path, mime_type)
         
         # Post-processing: remove extra whitespace and normalize
-        text = "\n".join([line.strip() for line in text.split("\n") if line.strip()])
+        text = normalize_text(text)
         
         # Detect language from extracted text
         detected_lang = detect_language(text)
@@ -78,4 +560,3 @@ def process_file_ocr(file_path, mime_type):
             'status': 'failed',
             'error': str(e)
         }
-
@@ -0,0 +1,184 @@
+import argparse
+import difflib
+import os
+import sys
+import time
+from PIL import Image
+
+# Make the src package importable when run as a script
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+
+from src.utils.ocr import OCR_LANG, PDF_WORKERS, ocr_image, get_ocr_engine, tesserocr, extract_text_from_docx, iter_pdf_pages
+
+def character_accuracy(reference, hypothesis):
+    """Character accuracy of OCR output: 1 - edit distance / reference length."""
+    reference = " ".join(reference.split())
+    hypothesis = " ".join(hypothesis.split())
+    if not reference:
+        return 1.0 if not hypothesis else 0.0
+
+    errors = 0
+    matcher = difflib.SequenceMatcher(None, reference, hypothesis, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag != 'equal':
+            errors += max(i2 - i1, j2 - j1)
+    return max(0.0, 1 - errors / len(reference))
+
+def load_reference(image_path):
+    """Load the ground-truth text stored next to an image as <name>.txt, if any."""
+    reference_path = os.path.splitext(image_path)[0] + '.txt'
+    if not os.path.exists(reference_path):
+        return None
+    with open(reference_path, encoding='utf-8') as f:
+        return f.read()
+
+def benchmark_preprocessing(image_paths, lang=OCR_LANG, repeat=1):
+    """Time OCR of each image with and without preprocessing and measure its accuracy."""
+    results = []
+    for image_path in image_paths:
+        reference = load_reference(image_path)
+        result = {'image': image_path}
+        for mode, preprocess in (('raw', False), ('preprocessed', True)):
+            timings = []
+            for _ in range(repeat):
+                image = Image.open(image_path)
+                started = time.perf_counter()
+                text = ocr_image(image, lang=lang, preprocess=preprocess)
+                timings.append(time.perf_counter() - started)
+            result[mode] = {
+                'seconds': min(timings),
+                'accuracy': character_accuracy(reference, text) if reference is not None else None
+            }
+        result['speedup'] = result['raw']['seconds'] / result['preprocessed']['seconds']
+        results.append(result)
+    return results
+
+def benchmark_engines(image_paths, lang=OCR_LANG, repeat=3, engines=None):
+    """Measure per-page OCR latency of each OCR engine on the same preprocessed images."""
+    if engines is None:
+        engines = ['pytesseract'] + (['tesserocr'] if tesserocr is not None else [])
+
+    results = {}
+    for name in engines:
+        engine = get_ocr_engine(name)
+        first_page = None
+        timings = []
+        for _ in range(repeat):
+            for image_path in image_paths:
+                image = Image.open(image_path)
+                started = time.perf_counter()
+                ocr_image(image, lang=lang, engine=name)
+                elapsed = time.perf_counter() - started
+                if first_page is None:
+                    first_page = elapsed
+                else:
+                    timings.append(elapsed)
+        timings.sort()
+        results[name] = {
+            'first_page_seconds': first_page,
+            'median_page_seconds': timings[len(timings) // 2] if timings else first_page,
+            'pages': len(timings) + 1
+        }
+        engine.close()
+    return results
+
+def benchmark_docx(docx_paths, repeat=3):
+    """Compare the streaming DOCX extractor with building the python-docx object model."""
+    from docx import Document as DocxDocument
+
+    def python_docx_text(docx_path):
+        doc = DocxDocument(docx_path)
+        return "\n".join([paragraph.text for paragraph in doc.paragraphs]).strip()
+
+    results = []
+    for docx_path in docx_paths:
+        result = {'file': docx_path}
+        for mode, extract in (('python-docx', python_docx_text), ('streaming', extract_text_from_docx)):
+            timings = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                text = extract(docx_path)
+                timings.append(time.perf_counter() - started)
+            result[mode] = {'seconds': min(timings), 'chars': len(text)}
+        results.append(result)
+    return results
+
+def benchmark_pdf(pdf_paths, workers=None, repeat=1):
+    """Compare serial and page-parallel PDF extraction: time to the first page and to the whole document."""
+    workers = workers or max(2, PDF_WORKERS)
+    results = []
+    for pdf_path in pdf_paths:
+        result = {'file': pdf_path}
+        for mode, mode_workers in (('serial', 1), ('parallel', workers)):
+            first_pages, totals = [], []
+            # The first run also starts the worker pool, so it is not timed
+            for run in range(repeat + (1 if mode_workers > 1 else 0)):
+                started = time.perf_counter()
+                first_page = None
+                pages = 0
+                for _ in iter_pdf_pages(pdf_path, workers=mode_workers):
+                    if first_page is None:
+                        first_page = time.perf_counter() - started
+                    pages += 1
+                if mode_workers > 1 and run == 0:
+                    continue
+                first_pages.append(first_page or 0.0)
+                totals.append(time.perf_counter() - started)
+            result[mode] = {'first_page_seconds': min(first_pages), 'seconds': min(totals), 'pages': pages}
+        result['workers'] = workers
+        result['speedup'] = result['serial']['seconds'] / result['parallel']['seconds']
+        results.append(result)
+    return results
+
+def print_pdf_report(results):
+    """Print PDF benchmark results as a table."""
+    print(f"{'file':40} {'pages':>6} {'workers':>8} {'serial s':>9} {'par s':>8} {'speedup':>8} {'first s':>8}")
+    for result in results:
+        serial, parallel = result['serial'], result['parallel']
+        print(f"{os.path.basename(result['file'])[:40]:40} {serial['pages']:6} {result['workers']:8} "
+              f"{serial['seconds']:9.3f} {parallel['seconds']:8.3f} {result['speedup']:7.1f}x "
+              f"{parallel['first_page_seconds']:8.3f}")
+
+def print_docx_report(results):
+    """Print DOCX benchmark results as a table."""
+    print(f"{'file':40} {'docx s':>8} {'stream s':>9} {'docx chars':>11} {'stream chars':>13}")
+    for result in results:
+        old, new = result['python-docx'], result['streaming']
+        print(f"{os.path.basename(result['file'])[:40]:40} {old['seconds']:8.3f} {new['seconds']:9.3f} "
+              f"{old['chars']:11} {new['chars']:13}")
+
+def print_engine_report(results):
+    """Print engine benchmark results as a table."""
+    print(f"{'engine':12} {'pages':>6} {'first s':>8} {'median s':>9}")
+    for name, result in results.items():
+        print(f"{name:12} {result['pages']:6} {result['first_page_seconds']:8.3f} {result['median_page_seconds']:9.3f}")
+
+def print_report(results):
+    """Print benchmark results as a table."""
+    print(f"{'image':40} {'raw s':>8} {'prep s':>8} {'speedup':>8} {'raw acc':>8} {'prep acc':>8}")
+    for result in results:
+        raw, prep = result['raw'], result['preprocessed']
+        raw_acc = f"{raw['accuracy']:.3f}" if raw['accuracy'] is not None else '-'
+        prep_acc = f"{prep['accuracy']:.3f}" if prep['accuracy'] is not None else '-'
+        print(f"{os.path.basename(result['image'])[:40]:40} {raw['seconds']:8.2f} {prep['seconds']:8.2f} "
+              f"{result['speedup']:7.1f}x {raw_acc:>8} {prep_acc:>8}")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark OCR image preprocessing, OCR engines, PDF and DOCX extraction. Ground truth is read from <image>.txt when present.')
+    parser.add_argument('images', nargs='+', help='image files to OCR, or PDF and DOCX files with --pdf and --docx')
+    parser.add_argument('--engines', action='store_true', help='compare per-page latency of the OCR engines instead')
+    parser.add_argument('--docx', action='store_true', help='compare DOCX extractors instead')
+    parser.add_argument('--pdf', action='store_true', help='compare serial and page-parallel PDF extraction instead')
+    parser.add_argument('--workers', type=int, help='worker processes for --pdf (default: PDF_WORKERS, at least 2)')
+    parser.add_argument('--lang', default=OCR_LANG, help='Tesseract languages')
+    parser.add_argument('--repeat', type=int, default=1, help='runs per image; the fastest is reported')
+    args = parser.parse_args()
+
+    if args.pdf:
+        print_pdf_report(benchmark_pdf(args.images, workers=args.workers, repeat=args.repeat))
+    elif args.docx:
+        print_docx_report(benchmark_docx(args.images, repeat=args.repeat))
+    elif args.engines:
+        print_engine_report(benchmark_engines(args.images, lang=args.lang, repeat=max(2, args.repeat)))
+    else:
+        print_report(benchmark_preprocessing(args.images, lang=args.lang, repeat=args.repeat))
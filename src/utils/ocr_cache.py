@@ -0,0 +1,121 @@
+import hashlib
+import json
+import os
+import threading
+from datetime import datetime
+from sqlalchemy import func
+from src.models.models import db, OCRCacheEntry
+from src.utils.ocr import process_file_ocr, get_ocr_settings
+from src.utils.storage import open_local_file
+
+# Upper bound on the total size of cached OCR text, in megabytes
+OCR_CACHE_MAX_MB = int(os.environ.get('OCR_CACHE_MAX_MB', 256))
+# Entries removed per eviction round
+OCR_CACHE_EVICT_BATCH = 100
+
+_stats = {'hits': 0, 'misses': 0, 'bypassed': 0, 'evictions': 0}
+_stats_lock = threading.Lock()
+
+def _count(stat, amount=1):
+    with _stats_lock:
+        _stats[stat] += amount
+
+def hash_file(file_path, chunk_size=1024 * 1024):
+    """Compute the SHA-256 of a file's bytes."""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def get_cache_key(content_hash, settings=None):
+    """Build the cache key for a file hash and the OCR settings used on it."""
+    settings = get_ocr_settings() if settings is None else settings
+    material = content_hash + json.dumps(settings, sort_keys=True)
+    return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+def get_cached_ocr(key):
+    """Return the cached OCR result for a key, or None."""
+    entry = OCRCacheEntry.query.filter_by(key=key).first()
+    if not entry:
+        _count('misses')
+        return None
+
+    entry.hits += 1
+    entry.last_used_at = datetime.utcnow()
+    db.session.commit()
+    _count('hits')
+
+    return {
+        'text': entry.text,
+        'language': entry.language,
+        'status': 'success',
+        'cached': True
+    }
+
+def store_cached_ocr(key, content_hash, ocr_result):
+    """Store a successful OCR result and evict least recently used entries over the limit."""
+    entry = OCRCacheEntry.query.filter_by(key=key).first()
+    if not entry:
+        entry = OCRCacheEntry(key=key, content_hash=content_hash)
+        db.session.add(entry)
+
+    entry.text = ocr_result['text']
+    entry.language = ocr_result['language']
+    entry.size = len(ocr_result['text'].encode('utf-8'))
+    entry.last_used_at = datetime.utcnow()
+    db.session.commit()
+
+    evict_ocr_cache()
+
+def evict_ocr_cache(max_bytes=None):
+    """Delete least recently used entries until the cache fits in max_bytes."""
+    max_bytes = OCR_CACHE_MAX_MB * 1024 * 1024 if max_bytes is None else max_bytes
+    total = db.session.query(func.coalesce(func.sum(OCRCacheEntry.size), 0)).scalar()
+
+    while total > max_bytes:
+        oldest = OCRCacheEntry.query.order_by(OCRCacheEntry.last_used_at).limit(OCR_CACHE_EVICT_BATCH).all()
+        if not oldest:
+            break
+        for entry in oldest:
+            if total <= max_bytes:
+                break
+            total -= entry.size
+            db.session.delete(entry)
+            _count('evictions')
+        db.session.commit()
+
+def lookup_ocr_cache(file, force=False):
+    """Look up the cached OCR result of a stored file; returns (content_hash, key, result or None)."""
+    # Files uploaded before content addressing are hashed from their local path
+    content_hash = file.content_hash or hash_file(file.storage_url)
+    key = get_cache_key(content_hash)
+
+    if force:
+        _count('bypassed')
+        return content_hash, key, None
+    return content_hash, key, get_cached_ocr(key)
+
+def run_cached_ocr(file, force=False, ocr=process_file_ocr):
+    """Run OCR on a stored file through the cache; force skips the lookup and refreshes the entry."""
+    content_hash, key, cached = lookup_ocr_cache(file, force=force)
+    if cached:
+        return cached
+
+    # The file is only fetched from storage on a cache miss
+    with open_local_file(file) as file_path:
+        ocr_result = ocr(file_path, file.mime_type)
+    if ocr_result['status'] == 'success':
+        store_cached_ocr(key, content_hash, ocr_result)
+    return ocr_result
+
+def get_ocr_cache_stats():
+    """Get cache hit/miss counters for this process and the size of the cache."""
+    with _stats_lock:
+        stats = dict(_stats)
+    lookups = stats['hits'] + stats['misses']
+    stats['hit_rate'] = stats['hits'] / lookups if lookups else 0.0
+    stats['entries'] = OCRCacheEntry.query.count()
+    stats['size_bytes'] = db.session.query(func.coalesce(func.sum(OCRCacheEntry.size), 0)).scalar()
+    stats['max_bytes'] = OCR_CACHE_MAX_MB * 1024 * 1024
+    return stats
@@ -0,0 +1,276 @@
+import atexit
+import multiprocessing
+import os
+import queue
+import threading
+from datetime import datetime, timedelta
+from src.models.models import db, File, Document, OCRJob, AuditLog
+from src.utils.ocr import process_file_ocr
+from src.utils.ocr_cache import run_cached_ocr
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+# Number of OCR worker processes per app process
+OCR_JOB_WORKERS = int(os.environ.get('OCR_JOB_WORKERS', 2))
+# Wall-clock limit for a single OCR job, in seconds
+OCR_JOB_TIMEOUT = int(os.environ.get('OCR_JOB_TIMEOUT', 300))
+# Address space limit for each OCR worker process, in megabytes (0 disables it)
+OCR_JOB_MEMORY_LIMIT_MB = int(os.environ.get('OCR_JOB_MEMORY_LIMIT_MB', 2048))
+# Seconds past the timeout after which a running job is known to have been interrupted by a restart
+OCR_JOB_RECOVERY_GRACE = 60
+
+_job_queue = None
+_job_queue_lock = threading.Lock()
+
+def save_ocr_document(user_id, file, doc_type, ocr_result):
+    """Create or update the document of a file from a successful OCR result."""
+    existing_doc = Document.query.filter_by(file_id=file.id, user_id=user_id).first()
+
+    if existing_doc:
+        # Update existing document
+        existing_doc.raw_text = ocr_result['text']
+        existing_doc.language = ocr_result['language']
+        existing_doc.status = 'ocred'
+        existing_doc.version += 1
+        document = existing_doc
+    else:
+        # Create new document
+        document = Document(
+            user_id=user_id,
+            file_id=file.id,
+            doc_type=doc_type,
+            language=ocr_result['language'],
+            raw_text=ocr_result['text'],
+            status='ocred'
+        )
+        db.session.add(document)
+
+    db.session.commit()
+
+    # Log the action
+    audit_log = AuditLog(
+        user_id=user_id,
+        action='ocr_processed',
+        entity_type='document',
+        entity_id=document.id,
+        payload={'file_id': file.id, 'language': ocr_result['language']}
+    )
+    db.session.add(audit_log)
+    db.session.commit()
+
+    return document
+
+def _worker_main(conn, memory_limit_mb):
+    """Entry point of an OCR worker process: serve OCR requests sent over conn."""
+    if resource is not None and memory_limit_mb:
+        limit = memory_limit_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+    while True:
+        try:
+            request = conn.recv()
+        except EOFError:
+            break
+        if request is None:
+            break
+        file_path, mime_type = request
+        conn.send(process_file_ocr(file_path, mime_type))
+
+class OCRWorker:
+    """A long-lived OCR process that is replaced after a timeout or a crash."""
+
+    def __init__(self, memory_limit_mb=OCR_JOB_MEMORY_LIMIT_MB):
+        self.memory_limit_mb = memory_limit_mb
+        self.process = None
+        self.conn = None
+        # Guards process and conn: the serving thread replaces them while shutdown may be stopping them
+        self.lock = threading.RLock()
+
+    def start(self):
+        """Spawn the worker process."""
+        with self.lock:
+            # Spawn rather than fork: the parent runs request threads and holds DB connections
+            ctx = multiprocessing.get_context('spawn')
+            parent_conn, child_conn = ctx.Pipe()
+            self.process = ctx.Process(target=_worker_main, args=(child_conn, self.memory_limit_mb))
+            self.process.start()
+            child_conn.close()
+            self.conn = parent_conn
+
+    def kill(self):
+        """Terminate the worker process immediately."""
+        with self.lock:
+            if self.process is None:
+                return
+            self.process.kill()
+            self.process.join()
+            self.conn.close()
+            self.process = None
+            self.conn = None
+
+    def stop(self, timeout=5):
+        """Ask the worker process to exit, killing it if it does not."""
+        if not self.lock.acquire(timeout=timeout):
+            # A job is still running: kill its process, which run() then handles like a crash
+            process = self.process
+            if process is not None:
+                process.kill()
+            return
+        try:
+            if self.process is None:
+                return
+            try:
+                self.conn.send(None)
+            except OSError:
+                pass
+            self.process.join(timeout=timeout)
+            self.kill()
+        finally:
+            self.lock.release()
+
+    def run(self, file_path, mime_type, timeout):
+        """Run OCR on a file in the worker process and return the OCR result."""
+        with self.lock:
+            if self.process is None or not self.process.is_alive():
+                self.kill()
+                self.start()
+
+            self.conn.send((file_path, mime_type))
+            if not self.conn.poll(timeout):
+                self.kill()
+                raise TimeoutError(f"OCR job timed out after {timeout} seconds")
+
+            try:
+                return self.conn.recv()
+            except EOFError:
+                exit_code = self.process.exitcode
+                self.kill()
+                raise Exception(f"OCR worker exited unexpectedly (exit code {exit_code}), possibly out of memory")
+
+class OCRJobQueue:
+    """Queue of OCR jobs served by a fixed pool of OCR worker processes."""
+
+    def __init__(self, app, workers=OCR_JOB_WORKERS, timeout=OCR_JOB_TIMEOUT, memory_limit_mb=OCR_JOB_MEMORY_LIMIT_MB):
+        self.app = app
+        self.timeout = timeout
+        self.jobs = queue.Queue()
+        self.workers = [OCRWorker(memory_limit_mb) for _ in range(max(1, workers))]
+        self.threads = []
+
+        for worker in self.workers:
+            thread = threading.Thread(target=self._serve, args=(worker,), daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+        atexit.register(self.shutdown)
+
+        # Jobs that were running when the app stopped can only be told apart from jobs another
+        # process is running once the timeout has passed, so they are checked again then
+        self.recover()
+        recovery = threading.Timer(self.timeout + OCR_JOB_RECOVERY_GRACE, self.recover)
+        recovery.daemon = True
+        recovery.start()
+
+    def recover(self):
+        """Requeue the jobs an earlier run of the app left queued, and fail the ones it left running."""
+        with self.app.app_context():
+            stale = datetime.utcnow() - timedelta(seconds=self.timeout + OCR_JOB_RECOVERY_GRACE)
+            interrupted = OCRJob.query.filter(OCRJob.status == 'running', OCRJob.started_at < stale).all()
+            for job in interrupted:
+                # Not retried: the job may be what brought the worker down
+                job.status = 'failed'
+                job.error = 'OCR job was interrupted by a restart'
+                job.finished_at = datetime.utcnow()
+            db.session.commit()
+            queued = [job.id for job in OCRJob.query.filter_by(status='queued').all()]
+
+        for job_id in queued:
+            self.submit(job_id)
+
+    def submit(self, job_id, force=False):
+        """Schedule a queued OCRJob for processing; force bypasses the OCR cache."""
+        self.jobs.put((job_id, force))
+
+    def shutdown(self):
+        """Stop all worker threads and processes."""
+        for _ in self.threads:
+            self.jobs.put(None)
+        for thread in self.threads:
+            thread.join(timeout=5)
+        for worker in self.workers:
+            worker.stop()
+
+    def _serve(self, worker):
+        while True:
+            item = self.jobs.get()
+            if item is None:
+                break
+            job_id, force = item
+            with self.app.app_context():
+                try:
+                    self._process(worker, job_id, force)
+                except Exception as e:
+                    db.session.rollback()
+                    self._fail(job_id, str(e))
+
+    def _fail(self, job_id, error):
+        job = OCRJob.query.filter_by(id=job_id).first()
+        if job:
+            job.status = 'failed'
+            job.error = error
+            job.finished_at = datetime.utcnow()
+            db.session.commit()
+
+    def _process(self, worker, job_id, force):
+        # Claimed with a conditional update, so a job that was submitted twice, or by two processes, runs once
+        claimed = OCRJob.query.filter_by(id=job_id, status='queued').update(
+            {'status': 'running', 'started_at': datetime.utcnow()}
+        )
+        db.session.commit()
+        if not claimed:
+            return
+        job = OCRJob.query.filter_by(id=job_id).first()
+
+        file = File.query.filter_by(id=job.file_id, user_id=job.user_id).first()
+        if not file:
+            self._fail(job_id, 'File not found')
+            return
+
+        try:
+            ocr_result = run_cached_ocr(
+                file,
+                force=force,
+                ocr=lambda file_path, mime_type: worker.run(file_path, mime_type, self.timeout)
+            )
+        except Exception as e:
+            self._fail(job_id, str(e))
+            return
+
+        if ocr_result['status'] == 'failed':
+            self._fail(job_id, ocr_result.get('error', 'OCR processing failed'))
+            return
+
+        document = save_ocr_document(job.user_id, file, job.doc_type, ocr_result)
+
+        job.document_id = document.id
+        job.status = 'done'
+        job.finished_at = datetime.utcnow()
+        db.session.commit()
+
+def resume_ocr_jobs(app):
+    """Start the OCR job queue at app startup if an earlier run left jobs unfinished."""
+    with app.app_context():
+        pending = OCRJob.query.filter(OCRJob.status.in_(('queued', 'running'))).count()
+    if pending:
+        get_ocr_job_queue(app)
+
+def get_ocr_job_queue(app):
+    """Get the OCR job queue of this process, starting it on first use."""
+    global _job_queue
+    with _job_queue_lock:
+        if _job_queue is None:
+            _job_queue = OCRJobQueue(app)
+        return _job_queue
@@ -0,0 +1,10 @@
+import json
+
+SSE_HEADERS = {
+    'Cache-Control': 'no-cache',
+    'X-Accel-Buffering': 'no'  # Stop nginx from buffering the stream
+}
+
+def sse_event(event, data):
+    """Format a server-sent event with a JSON payload."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
@@ -0,0 +1,271 @@
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from datetime import datetime
+from sqlalchemy.exc import IntegrityError
+from src.models.models import db, File, Blob
+
+try:
+    import boto3
+    from botocore.exceptions import ClientError
+except ImportError:
+    boto3 = None
+
+logger = logging.getLogger(__name__)
+
+# Root of stored files; UPLOAD_FOLDER moves it off the source tree
+UPLOAD_FOLDER = os.environ.get('UPLOAD_FOLDER') or os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'uploads')
+# Content-addressed blobs, sharded as blobs/ab/cd/<sha256>
+BLOB_FOLDER = os.path.join(UPLOAD_FOLDER, 'blobs')
+# Files still being written, on the same filesystem so they can be renamed into place
+TMP_FOLDER = os.path.join(UPLOAD_FOLDER, 'tmp')
+
+# Where blobs live: 'local' disk or an 's3' compatible object store
+STORAGE_BACKEND = os.environ.get('STORAGE_BACKEND', 'local').lower()
+# Object store settings; the endpoint URL points the client at MinIO or another S3 compatible service
+S3_BUCKET = os.environ.get('S3_BUCKET', '')
+S3_ENDPOINT_URL = os.environ.get('S3_ENDPOINT_URL') or None
+S3_REGION = os.environ.get('S3_REGION') or None
+S3_PREFIX = os.environ.get('S3_PREFIX', 'blobs')
+# Lifetime of presigned download URLs, in seconds
+S3_PRESIGN_EXPIRES = int(os.environ.get('S3_PRESIGN_EXPIRES', 300))
+
+os.makedirs(BLOB_FOLDER, exist_ok=True)
+os.makedirs(TMP_FOLDER, exist_ok=True)
+
+_storage = None
+_storage_lock = threading.Lock()
+
+def blob_name(content_hash):
+    """Get the sharded relative name of the blob with a given SHA-256."""
+    return f"{content_hash[:2]}/{content_hash[2:4]}/{content_hash}"
+
+def blob_path(content_hash):
+    """Get the local storage path of the blob with a given SHA-256."""
+    return os.path.join(BLOB_FOLDER, *blob_name(content_hash).split('/'))
+
+class StorageBackend(ABC):
+    """Blob store interface; blobs are immutable and addressed by their SHA-256."""
+
+    @abstractmethod
+    def exists(self, content_hash):
+        """Tell whether a blob is stored."""
+
+    @abstractmethod
+    def put(self, temp_path, content_hash):
+        """Take ownership of a fully written local file and return the blob's storage URL."""
+
+    @abstractmethod
+    def open(self, content_hash):
+        """Open a blob for streaming reads."""
+
+    @abstractmethod
+    def local_path(self, content_hash):
+        """Context manager yielding a path on local disk with the blob's bytes."""
+
+    @abstractmethod
+    def delete(self, content_hash):
+        """Delete a blob."""
+
+    def presigned_url(self, content_hash, file_name, mime_type, expires=S3_PRESIGN_EXPIRES):
+        """Get a URL clients can download the blob from directly, or None if downloads go through the app."""
+        return None
+
+class LocalStorage(StorageBackend):
+    """Blobs in the sharded blob folder on local disk."""
+
+    def exists(self, content_hash):
+        return os.path.exists(blob_path(content_hash))
+
+    def put(self, temp_path, content_hash):
+        path = blob_path(content_hash)
+        if os.path.exists(path):
+            os.remove(temp_path)
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(temp_path, path)
+        return path
+
+    def open(self, content_hash):
+        return open(blob_path(content_hash), 'rb')
+
+    @contextmanager
+    def local_path(self, content_hash):
+        yield blob_path(content_hash)
+
+    def delete(self, content_hash):
+        path = blob_path(content_hash)
+        if os.path.exists(path):
+            os.remove(path)
+
+class S3Storage(StorageBackend):
+    """Blobs in an S3 compatible bucket under a sharded key prefix."""
+
+    def __init__(self, bucket=S3_BUCKET, endpoint_url=S3_ENDPOINT_URL, region=S3_REGION, prefix=S3_PREFIX):
+        if boto3 is None:
+            raise Exception("S3 storage requires the boto3 package")
+        if not bucket:
+            raise Exception("S3_BUCKET must be set to use S3 storage")
+        self.bucket = bucket
+        self.prefix = prefix.strip('/')
+        self.client = boto3.client('s3', endpoint_url=endpoint_url, region_name=region)
+
+    def key(self, content_hash):
+        return f"{self.prefix}/{blob_name(content_hash)}" if self.prefix else blob_name(content_hash)
+
+    def exists(self, content_hash):
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=self.key(content_hash))
+            return True
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound'):
+                return False
+            raise
+
+    def put(self, temp_path, content_hash):
+        try:
+            if not self.exists(content_hash):
+                # Multipart upload for large files is handled by the transfer manager
+                self.client.upload_file(temp_path, self.bucket, self.key(content_hash))
+        finally:
+            os.remove(temp_path)
+        return f"s3://{self.bucket}/{self.key(content_hash)}"
+
+    def open(self, content_hash):
+        return self.client.get_object(Bucket=self.bucket, Key=self.key(content_hash))['Body']
+
+    @contextmanager
+    def local_path(self, content_hash):
+        # Tesseract and pdfplumber need seekable files, so the object is streamed to a temporary file
+        temp_path = create_temp_file()
+        try:
+            with open(temp_path, 'wb') as f:
+                self.client.download_fileobj(self.bucket, self.key(content_hash), f)
+            yield temp_path
+        finally:
+            os.remove(temp_path)
+
+    def delete(self, content_hash):
+        self.client.delete_object(Bucket=self.bucket, Key=self.key(content_hash))
+
+    def presigned_url(self, content_hash, file_name, mime_type, expires=S3_PRESIGN_EXPIRES):
+        return self.client.generate_presigned_url(
+            'get_object',
+            Params={
+                'Bucket': self.bucket,
+                'Key': self.key(content_hash),
+                'ResponseContentType': mime_type,
+                'ResponseContentDisposition': f'attachment; filename="{file_name}"'
+            },
+            ExpiresIn=expires
+        )
+
+def get_storage():
+    """Get the configured storage backend, creating it on first use."""
+    global _storage
+    with _storage_lock:
+        if _storage is None:
+            if STORAGE_BACKEND == 's3':
+                _storage = S3Storage()
+            elif STORAGE_BACKEND == 'local':
+                _storage = LocalStorage()
+            else:
+                raise Exception(f"Unsupported storage backend: {STORAGE_BACKEND}")
+        return _storage
+
+def create_temp_file():
+    """Create an empty file in the temporary storage folder and return its path."""
+    fd, temp_path = tempfile.mkstemp(dir=TMP_FOLDER)
+    os.close(fd)
+    return temp_path
+
+def commit_blob(temp_path, content_hash):
+    """Move a fully written file into blob storage, dropping it if the blob already exists; returns its storage URL.
+
+    The File rows referencing the blob must be added with reference_blobs() before they are committed."""
+    return get_storage().put(temp_path, content_hash)
+
+def store_blob(stream, max_size=None):
+    """Stream data into blob storage, hashing it on the way; returns (content_hash, storage_url, size)."""
+    temp_path = create_temp_file()
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with open(temp_path, 'wb') as f:
+            for chunk in iter(lambda: stream.read(1024 * 1024), b''):
+                size += len(chunk)
+                if max_size is not None and size > max_size:
+                    raise ValueError(f"File exceeds the maximum size of {max_size // (1024 * 1024)} MB")
+                digest.update(chunk)
+                f.write(chunk)
+    except Exception:
+        os.remove(temp_path)
+        raise
+
+    content_hash = digest.hexdigest()
+    return content_hash, commit_blob(temp_path, content_hash), size
+
+def lock_blob(content_hash):
+    """Lock a blob's row until the current transaction ends, creating the row if it is missing."""
+    while not Blob.query.filter_by(content_hash=content_hash).update({'locked_at': datetime.utcnow()}):
+        try:
+            with db.session.begin_nested():
+                db.session.add(Blob(content_hash=content_hash))
+            return
+        except IntegrityError:
+            # Another transaction created it first; lock that row instead
+            continue
+
+def reference_blobs(content_hashes):
+    """Lock the blobs the File rows of the current transaction reference and check they are still stored.
+
+    The locks are held until commit, so a concurrent release_blob() either finishes before and is
+    detected here, or runs after and sees the committed rows."""
+    storage = get_storage()
+    # Locked in a fixed order so two transactions sharing blobs cannot deadlock
+    for content_hash in sorted(set(content_hashes)):
+        lock_blob(content_hash)
+        if not storage.exists(content_hash):
+            raise Exception("File was deleted while it was being stored, please upload it again")
+
+def release_blob(content_hash):
+    """Delete a blob once no File row references it; call after the referencing rows are deleted or rolled back."""
+    if not content_hash:
+        return False
+    try:
+        # Counting and deleting under the row lock keeps reference_blobs() in other processes out
+        lock_blob(content_hash)
+        if File.query.filter_by(content_hash=content_hash).count() > 0:
+            db.session.commit()
+            return False
+        get_storage().delete(content_hash)
+        Blob.query.filter_by(content_hash=content_hash).delete()
+        db.session.commit()
+        return True
+    except Exception:
+        db.session.rollback()
+        raise
+
+def release_failed_blobs(content_hashes):
+    """Release the blobs stored by a failed request after its transaction is rolled back.
+
+    Failures are logged rather than raised, so they never hide the error that failed the request;
+    a blob left behind only costs space."""
+    for content_hash in set(content_hashes):
+        try:
+            release_blob(content_hash)
+        except Exception:
+            logger.exception("Could not release blob %s", content_hash)
+
+@contextmanager
+def open_local_file(file):
+    """Context manager yielding a local path with a stored file's bytes, fetching it if needed."""
+    if not file.content_hash:
+        yield file.storage_url
+        return
+    with get_storage().local_path(file.content_hash) as file_path:
+        yield file_path
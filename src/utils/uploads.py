@@ -0,0 +1,73 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from src.models.models import db, UploadSession
+
+# Upper bound on the number of in-progress hashes kept in memory
+UPLOAD_HASHERS_MAX = 1000
+# Longest time a request may spend writing one chunk, in seconds
+UPLOAD_CHUNK_TIMEOUT = int(os.environ.get('UPLOAD_CHUNK_TIMEOUT', 600))
+# Seconds past the chunk timeout after which the claim of a request that never released it is taken over
+UPLOAD_CLAIM_GRACE = 60
+
+_hashers = OrderedDict()  # session id -> (offset, sha256 object)
+_hashers_lock = threading.Lock()
+
+def claim_upload(session_id, offset):
+    """Take the exclusive right to write an upload session at an offset, in any app process.
+
+    Returns False if the session is at another offset or another request holds it."""
+    now = datetime.utcnow()
+    stale = now - timedelta(seconds=UPLOAD_CHUNK_TIMEOUT + UPLOAD_CLAIM_GRACE)
+    # Compare and set in one statement, so two requests can never both win
+    claimed = UploadSession.query.filter(
+        UploadSession.id == session_id,
+        UploadSession.offset == offset,
+        db.or_(
+            UploadSession.status == 'active',
+            db.and_(UploadSession.status == 'writing', UploadSession.updated_at < stale)
+        )
+    ).update({'status': 'writing', 'updated_at': now}, synchronize_session=False)
+    db.session.commit()
+    return claimed == 1
+
+def release_upload(session_id, offset):
+    """Release the claim on an upload session, recording the offset it was written up to."""
+    UploadSession.query.filter_by(id=session_id, status='writing').update(
+        {'status': 'active', 'offset': offset, 'updated_at': datetime.utcnow()},
+        synchronize_session=False
+    )
+    db.session.commit()
+
+def get_upload_hasher(session_id, file_path, offset):
+    """Get the running SHA-256 of the first offset bytes of an upload."""
+    with _hashers_lock:
+        state = _hashers.pop(session_id, None)
+    if state is not None and state[0] == offset:
+        return state[1]
+
+    # Another app process took the previous chunk, or this one restarted: rehash what is on disk
+    hasher = hashlib.sha256()
+    remaining = offset
+    with open(file_path, 'rb') as f:
+        while remaining > 0:
+            chunk = f.read(min(1024 * 1024, remaining))
+            if not chunk:
+                break
+            hasher.update(chunk)
+            remaining -= len(chunk)
+    return hasher
+
+def save_upload_hasher(session_id, offset, hasher):
+    """Remember the running hash of an upload after a chunk was written."""
+    with _hashers_lock:
+        _hashers[session_id] = (offset, hasher)
+        while len(_hashers) > UPLOAD_HASHERS_MAX:
+            _hashers.popitem(last=False)
+
+def discard_upload_hasher(session_id):
+    """Forget the running hash of a finished or abandoned upload."""
+    with _hashers_lock:
+        _hashers.pop(session_id, None)
@@ -0,0 +1,58 @@
+import os
+import sys
+import tempfile
+import zipfile
+
+import pytest
+
+# Make the src package importable when run from anywhere
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+# The app reads these at import, so they are set before any test imports it
+_scratch = tempfile.mkdtemp(prefix='resume-platform-tests-')
+os.environ.setdefault('DATABASE_URL', f"sqlite:///{os.path.join(_scratch, 'app.db')}")
+os.environ.setdefault('UPLOAD_FOLDER', os.path.join(_scratch, 'uploads'))
+
+DOCX_NAMESPACES = (
+    'xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main" '
+    'xmlns:mc="http://schemas.openxmlformats.org/markup-compatibility/2006"'
+)
+
+def make_docx(path, body, parts=None):
+    """Write a minimal DOCX whose document body is the given WordprocessingML; parts adds headers and footers."""
+    with zipfile.ZipFile(path, 'w') as archive:
+        archive.writestr('word/document.xml', f'<w:document {DOCX_NAMESPACES}><w:body>{body}</w:body></w:document>')
+        for name, part_body in (parts or {}).items():
+            root = 'w:hdr' if 'header' in name else 'w:ftr'
+            archive.writestr(name, f'<{root} {DOCX_NAMESPACES}>{part_body}</{root}>')
+    return path
+
+def paragraph(text):
+    return f'<w:p><w:r><w:t>{text}</w:t></w:r></w:p>'
+
+@pytest.fixture
+def app():
+    from src.main import app, start_app
+    from src.models.models import db
+    start_app(app)
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+    yield app
+    with app.app_context():
+        db.session.remove()
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+@pytest.fixture
+def auth_headers(client):
+    response = client.post('/api/auth/signup', json={'name': 'Test', 'email': 'test@example.com', 'password': 'secret123'})
+    return {'Authorization': f"Bearer {response.json['token']}"}
+
+@pytest.fixture
+def user_id(app, auth_headers):
+    from src.models.models import User
+    with app.app_context():
+        return User.query.filter_by(email='test@example.com').first().id
@@ -0,0 +1,71 @@
+import hashlib
+import io
+import logging
+import os
+
+DATA = b'%PDF-1.4 Jane Doe, software engineer'
+CONTENT_HASH = hashlib.sha256(DATA).hexdigest()
+
+def upload(client, auth_headers, name='cv.pdf', data=DATA):
+    return client.post('/api/files/upload', headers=auth_headers, data={'file': (io.BytesIO(data), name)}, content_type='multipart/form-data')
+
+def count_blob_rows(app):
+    from src.models.models import Blob
+    with app.app_context():
+        return Blob.query.filter_by(content_hash=CONTENT_HASH).count()
+
+def test_same_content_is_stored_once(app, client, auth_headers):
+    from src.utils.storage import blob_path
+    first = upload(client, auth_headers)
+    second = upload(client, auth_headers, name='copy.pdf')
+    assert first.status_code == second.status_code == 201
+    assert first.json['file']['id'] != second.json['file']['id']
+
+    with open(blob_path(CONTENT_HASH), 'rb') as f:
+        assert f.read() == DATA
+    assert count_blob_rows(app) == 1
+
+    # The blob outlives the first file, as the second still references it
+    assert client.delete(f"/api/files/{first.json['file']['id']}", headers=auth_headers).status_code == 200
+    assert os.path.exists(blob_path(CONTENT_HASH))
+    download = client.get(f"/api/files/{second.json['file']['id']}/download", headers=auth_headers)
+    assert download.data == DATA
+
+    assert client.delete(f"/api/files/{second.json['file']['id']}", headers=auth_headers).status_code == 200
+    assert not os.path.exists(blob_path(CONTENT_HASH))
+    assert count_blob_rows(app) == 0
+
+def test_failed_upload_releases_its_blob(app, client, auth_headers, monkeypatch):
+    from src.routes import files
+    from src.utils.storage import blob_path
+
+    def fail(content_hashes):
+        raise Exception('Database is unavailable')
+
+    monkeypatch.setattr(files, 'reference_blobs', fail)
+    response = upload(client, auth_headers)
+    assert response.status_code == 500
+    assert response.json['error'] == 'Database is unavailable'
+    assert not os.path.exists(blob_path(CONTENT_HASH))
+
+def test_failed_release_keeps_the_original_error(app, client, auth_headers, monkeypatch, caplog):
+    from src.routes import files
+    from src.utils import storage
+
+    def fail(content_hashes):
+        raise Exception('Database is unavailable')
+
+    def fail_release(content_hash):
+        raise Exception('Storage is unavailable')
+
+    monkeypatch.setattr(files, 'reference_blobs', fail)
+    monkeypatch.setattr(storage, 'release_blob', fail_release)
+    with caplog.at_level(logging.ERROR, logger='src.utils.storage'):
+        response = upload(client, auth_headers)
+
+    assert response.status_code == 500
+    assert response.json['error'] == 'Database is unavailable'
+    assert f'Could not release blob {CONTENT_HASH}' in caplog.text
+    # The leftover blob is taken up by the next upload of the same content
+    monkeypatch.undo()
+    assert upload(client, auth_headers).status_code == 201
@@ -0,0 +1,91 @@
+import hashlib
+import os
+
+DATA = os.urandom(1024 * 1024 + 10)
+
+def start_upload(client, auth_headers, data=DATA, **fields):
+    response = client.post('/api/files/uploads', headers=auth_headers, json={'file_name': 'cv.pdf', 'size': len(data), **fields})
+    assert response.status_code == 201
+    return response.json['upload']['id']
+
+def send_chunk(client, auth_headers, upload_id, offset, chunk, **kwargs):
+    headers = {**auth_headers, 'Upload-Offset': str(offset), 'Content-Type': 'application/offset+octet-stream'}
+    return client.patch(f'/api/files/uploads/{upload_id}', headers=headers, data=chunk, **kwargs)
+
+def get_offset(client, auth_headers, upload_id):
+    response = client.get(f'/api/files/uploads/{upload_id}', headers=auth_headers)
+    assert int(response.headers['Upload-Offset']) == response.json['upload']['offset']
+    return response.json['upload']['offset']
+
+def get_storage_path(app, upload_id):
+    from src.models.models import UploadSession
+    with app.app_context():
+        return UploadSession.query.filter_by(id=upload_id).first().storage_path
+
+def finalize(client, auth_headers, upload_id):
+    return client.post(f'/api/files/uploads/{upload_id}/finalize', headers=auth_headers)
+
+def test_upload_in_chunks(client, auth_headers):
+    upload_id = start_upload(client, auth_headers, sha256=hashlib.sha256(DATA).hexdigest())
+    assert send_chunk(client, auth_headers, upload_id, 0, DATA[:1000]).status_code == 200
+    assert send_chunk(client, auth_headers, upload_id, 1000, DATA[1000:]).status_code == 200
+
+    response = finalize(client, auth_headers, upload_id)
+    assert response.status_code == 201
+    assert response.json['sha256'] == hashlib.sha256(DATA).hexdigest()
+    download = client.get(f"/api/files/{response.json['file']['id']}/download", headers=auth_headers)
+    assert download.data == DATA
+
+def test_offset_mismatch(client, auth_headers):
+    upload_id = start_upload(client, auth_headers)
+    assert send_chunk(client, auth_headers, upload_id, 0, DATA[:1000]).status_code == 200
+
+    # A chunk sent again, or one that skips ahead, is refused with the offset to resume from
+    for offset in (0, 2000):
+        response = send_chunk(client, auth_headers, upload_id, offset, DATA[offset:offset + 1000])
+        assert response.status_code == 409
+        assert response.headers['Upload-Offset'] == '1000'
+    assert get_offset(client, auth_headers, upload_id) == 1000
+
+def test_chunk_past_the_announced_size_is_rolled_back(app, client, auth_headers):
+    from src.utils import uploads
+    upload_id = start_upload(client, auth_headers, sha256=hashlib.sha256(DATA).hexdigest())
+    assert send_chunk(client, auth_headers, upload_id, 0, DATA[:10]).status_code == 200
+
+    # The first megabyte is written before the overflow shows up in the next read
+    response = send_chunk(client, auth_headers, upload_id, 10, DATA[10:] + b'extra bytes')
+    assert response.status_code == 413
+    assert response.headers['Upload-Offset'] == '10'
+    assert get_offset(client, auth_headers, upload_id) == 10
+    assert os.path.getsize(get_storage_path(app, upload_id)) == 10
+    assert upload_id not in uploads._hashers
+
+    assert send_chunk(client, auth_headers, upload_id, 10, DATA[10:]).status_code == 200
+    assert finalize(client, auth_headers, upload_id).status_code == 201
+
+def test_resume_after_disconnect(app, client, auth_headers):
+    upload_id = start_upload(client, auth_headers, sha256=hashlib.sha256(DATA).hexdigest())
+
+    # The client announces the whole file but the connection drops after the first part
+    response = send_chunk(client, auth_headers, upload_id, 0, DATA[:5000], environ_overrides={'CONTENT_LENGTH': str(len(DATA))})
+    assert response.status_code == 400
+    assert response.headers['Upload-Offset'] == '5000'
+    assert get_offset(client, auth_headers, upload_id) == 5000
+    assert os.path.getsize(get_storage_path(app, upload_id)) == 5000
+
+    assert send_chunk(client, auth_headers, upload_id, 5000, DATA[5000:]).status_code == 200
+    response = finalize(client, auth_headers, upload_id)
+    assert response.status_code == 201
+    assert response.json['sha256'] == hashlib.sha256(DATA).hexdigest()
+
+def test_checksum_mismatch_on_finalize(client, auth_headers):
+    upload_id = start_upload(client, auth_headers, sha256=hashlib.sha256(b'something else').hexdigest())
+    assert finalize(client, auth_headers, upload_id).status_code == 409
+    assert send_chunk(client, auth_headers, upload_id, 0, DATA).status_code == 200
+
+    response = finalize(client, auth_headers, upload_id)
+    assert response.status_code == 422
+    assert response.json['sha256'] == hashlib.sha256(DATA).hexdigest()
+    # The session is left as it was, not stuck claimed, so the client can see what happened
+    assert get_offset(client, auth_headers, upload_id) == len(DATA)
+    assert finalize(client, auth_headers, upload_id).status_code == 422
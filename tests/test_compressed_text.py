@@ -0,0 +1,58 @@
+import pytest
+from sqlalchemy import text
+
+LONG_TEXT = 'Опытный разработчик, Python and SQL. ' * 100
+
+def add_document(app, user_id, raw_text, edited_text=None):
+    from src.models.models import db, Document
+    with app.app_context():
+        document = Document(user_id=user_id, doc_type='resume', language='eng', raw_text=raw_text, edited_text=edited_text, status='ocred')
+        db.session.add(document)
+        db.session.commit()
+        return document.id
+
+def get_texts(app, document_id):
+    from src.models.models import db, Document
+    with app.app_context():
+        db.session.expire_all()
+        document = Document.query.filter_by(id=document_id).first()
+        return document.raw_text, document.edited_text
+
+def get_stored(app, document_id):
+    from src.models.models import db
+    with app.app_context():
+        return db.session.execute(text('SELECT raw_text FROM documents WHERE id = :id'), {'id': document_id}).scalar()
+
+@pytest.mark.parametrize('value', ['', 'Jane Doe', LONG_TEXT], ids=['empty', 'short', 'long'])
+def test_round_trip(app, user_id, value):
+    document_id = add_document(app, user_id, value)
+    assert get_texts(app, document_id) == (value, None)
+
+def test_long_texts_are_compressed(app, user_id, monkeypatch):
+    from src.models import models
+    short_id = add_document(app, user_id, 'Jane Doe')
+    assert bytes(get_stored(app, short_id)) == b'pJane Doe'
+
+    document_id = add_document(app, user_id, LONG_TEXT)
+    stored = bytes(get_stored(app, document_id))
+    assert stored[:1] == (b's' if models.zstandard is not None else b'z')
+    assert len(stored) < len(LONG_TEXT.encode('utf-8')) / 10
+
+    # Without zstandard, zlib is used and still read back
+    monkeypatch.setattr(models, 'zstandard', None)
+    zlib_id = add_document(app, user_id, LONG_TEXT)
+    assert bytes(get_stored(app, zlib_id))[:1] == b'z'
+    assert get_texts(app, zlib_id)[0] == LONG_TEXT
+
+def test_legacy_rows_are_read(app, user_id):
+    from src.models.models import db
+    with app.app_context():
+        # Rows written while the columns were plain TEXT, before compression
+        db.session.execute(text(
+            "INSERT INTO documents (id, user_id, doc_type, language, raw_text, edited_text, status, version) "
+            "VALUES ('legacy', :user_id, 'resume', 'eng', :raw_text, :edited_text, 'edited', 1)"
+        ), {'user_id': user_id, 'raw_text': 'Старый текст', 'edited_text': 'Edited text'})
+        db.session.commit()
+
+    assert isinstance(get_stored(app, 'legacy'), str)
+    assert get_texts(app, 'legacy') == ('Старый текст', 'Edited text')
@@ -0,0 +1,59 @@
+import pytest
+
+from conftest import make_docx, paragraph
+
+def cell(text):
+    return f'<w:tc>{paragraph(text)}</w:tc>'
+
+def test_headers_body_and_footers_in_order(tmp_path):
+    from src.utils.ocr import extract_text_from_docx
+    docx_path = make_docx(str(tmp_path / 'cv.docx'), paragraph('Jane Doe') + paragraph('Engineer'), parts={
+        'word/header10.xml': paragraph('Header 10'),
+        'word/header2.xml': paragraph('Header 2'),
+        'word/header.xml': paragraph('Header'),
+        'word/footer1.xml': paragraph('Footer 1'),
+        'word/footnotes.xml': paragraph('Not a footer'),
+    })
+
+    assert extract_text_from_docx(docx_path).split('\n') == [
+        'Header', 'Header 2', 'Header 10', 'Jane Doe', 'Engineer', 'Footer 1',
+    ]
+
+def test_tables_tabs_and_breaks(tmp_path):
+    from src.utils.ocr import extract_text_from_docx
+    table = (
+        '<w:tbl>'
+        f'<w:tr>{cell("Company")}{cell("Years")}</w:tr>'
+        f'<w:tr>{cell("Acme")}{cell("2019-2023")}</w:tr>'
+        '</w:tbl>'
+    )
+    body = (
+        paragraph('Experience') + table
+        + '<w:p><w:r><w:t>Skills:</w:t><w:tab/><w:t>Python</w:t><w:br/><w:t>SQL</w:t></w:r></w:p>'
+    )
+    docx_path = make_docx(str(tmp_path / 'cv.docx'), body)
+
+    assert extract_text_from_docx(docx_path).split('\n') == [
+        'Experience', 'Company', 'Years', 'Acme', '2019-2023', 'Skills:\tPython', 'SQL',
+    ]
+
+def test_alternate_content_is_read_once(tmp_path):
+    from src.utils.ocr import extract_text_from_docx
+    text_box = '<w:txbxContent>{}</w:txbxContent>'
+    # Word writes text boxes twice: the preferred choice and a fallback rendering for older readers
+    body = (
+        '<w:p><w:r><mc:AlternateContent>'
+        f'<mc:Choice Requires="wps">{text_box.format(paragraph("Contact: jane@example.com"))}</mc:Choice>'
+        f'<mc:Fallback>{text_box.format(paragraph("Contact: jane@example.com"))}</mc:Fallback>'
+        '</mc:AlternateContent></w:r><w:r><w:t>Summary</w:t></w:r></w:p>'
+    )
+    docx_path = make_docx(str(tmp_path / 'cv.docx'), body)
+
+    assert extract_text_from_docx(docx_path).split('\n') == ['Contact: jane@example.com', 'Summary']
+
+def test_broken_docx_raises(tmp_path):
+    from src.utils.ocr import extract_text_from_docx
+    docx_path = tmp_path / 'cv.docx'
+    docx_path.write_bytes(b'not a zip')
+    with pytest.raises(Exception, match='Error extracting text from DOCX'):
+        extract_text_from_docx(str(docx_path))
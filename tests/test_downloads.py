@@ -0,0 +1,81 @@
+import hashlib
+import io
+
+DATA = b'%PDF-1.4 ' + bytes(range(256)) * 4
+CONTENT_HASH = hashlib.sha256(DATA).hexdigest()
+
+def upload(client, auth_headers):
+    response = client.post('/api/files/upload', headers=auth_headers, data={'file': (io.BytesIO(DATA), 'cv.pdf')}, content_type='multipart/form-data')
+    assert response.status_code == 201
+    return response.json['file']['id']
+
+def download(client, auth_headers, file_id, **headers):
+    return client.get(f'/api/files/{file_id}/download', headers={**auth_headers, **headers})
+
+def test_etag_is_the_content_hash(client, auth_headers):
+    response = download(client, auth_headers, upload(client, auth_headers))
+    assert response.status_code == 200
+    assert response.data == DATA
+    assert response.headers['ETag'] == f'"{CONTENT_HASH}"'
+    assert 'private' in response.headers['Cache-Control']
+    assert 'no-cache' in response.headers['Cache-Control']
+    assert response.headers['Accept-Ranges'] == 'bytes'
+
+def test_revalidation_returns_not_modified(client, auth_headers):
+    file_id = upload(client, auth_headers)
+    response = download(client, auth_headers, file_id, **{'If-None-Match': f'"{CONTENT_HASH}"'})
+    assert response.status_code == 304
+    assert response.data == b''
+
+    response = download(client, auth_headers, file_id, **{'If-None-Match': '"stale"'})
+    assert response.status_code == 200
+    assert response.data == DATA
+
+def test_range_requests(client, auth_headers):
+    file_id = upload(client, auth_headers)
+    response = download(client, auth_headers, file_id, Range='bytes=100-199')
+    assert response.status_code == 206
+    assert response.data == DATA[100:200]
+    assert response.headers['Content-Range'] == f'bytes 100-199/{len(DATA)}'
+
+    # Resuming against a changed file gets the whole new file instead of a mismatched tail
+    response = download(client, auth_headers, file_id, Range='bytes=100-', **{'If-Range': '"stale"'})
+    assert response.status_code == 200
+    assert response.data == DATA
+    response = download(client, auth_headers, file_id, Range='bytes=100-', **{'If-Range': f'"{CONTENT_HASH}"'})
+    assert response.status_code == 206
+    assert response.data == DATA[100:]
+
+    response = download(client, auth_headers, file_id, Range=f'bytes={len(DATA)}-')
+    assert response.status_code == 416
+    assert response.headers['Content-Range'] == f'bytes */{len(DATA)}'
+
+def test_offloaded_download(client, auth_headers, monkeypatch):
+    from src.routes import files
+    from src.utils.storage import blob_name
+    monkeypatch.setattr(files, 'DOWNLOAD_OFFLOAD', 'x-accel-redirect')
+    file_id = upload(client, auth_headers)
+
+    response = download(client, auth_headers, file_id)
+    assert response.status_code == 200
+    assert response.data == b''
+    assert response.headers['X-Accel-Redirect'] == f'/protected-uploads/blobs/{blob_name(CONTENT_HASH)}'
+    assert response.headers['ETag'] == f'"{CONTENT_HASH}"'
+    assert download(client, auth_headers, file_id, **{'If-None-Match': f'"{CONTENT_HASH}"'}).status_code == 304
+
+def test_legacy_file_gets_a_derived_etag(app, client, auth_headers, tmp_path):
+    from src.models.models import db, File, User
+    path = tmp_path / 'old.pdf'
+    path.write_bytes(DATA)
+    with app.app_context():
+        user = User.query.filter_by(email='test@example.com').first()
+        file = File(user_id=user.id, source='local', file_name='old.pdf', mime_type='application/pdf', size=len(DATA), storage_url=str(path))
+        db.session.add(file)
+        db.session.commit()
+        file_id = file.id
+
+    response = download(client, auth_headers, file_id)
+    assert response.status_code == 200
+    etag = response.headers['ETag']
+    assert etag and CONTENT_HASH not in etag
+    assert download(client, auth_headers, file_id, **{'If-None-Match': etag}).status_code == 304
@@ -0,0 +1,139 @@
+import hashlib
+import io
+import os
+import time
+
+import pytest
+
+DATA = os.urandom(10000)
+
+class FakeProvider:
+    """Stands in for a cloud drive: serves one file and can drop the connection part way through."""
+    name = 'fake'
+    checksum_algorithm = 'md5'
+
+    def __init__(self, credentials=None):
+        self.checksum = hashlib.md5(DATA).hexdigest()
+        self.fail_after = None
+        # Transfers cut off at fail_after before it serves whole files again; None cuts off every one
+        self.failures = None
+        self.offsets = []
+
+    def describe(self):
+        return {'id': 'file-1', 'name': 'cv.pdf', 'size': len(DATA), 'checksum': self.checksum}
+
+    def list_files(self, folder_id=None):
+        return [self.describe()]
+
+    def get_file(self, file_id):
+        return self.describe()
+
+    def iter_chunks(self, file_id, offset=0, chunk_size=1000):
+        self.offsets.append(offset)
+        for start in range(offset, len(DATA), chunk_size):
+            if self.fail_after is not None and start >= self.fail_after:
+                if self.failures is not None:
+                    self.failures -= 1
+                    if not self.failures:
+                        self.fail_after = None
+                raise ConnectionResetError('Connection reset by peer')
+            yield DATA[start:start + chunk_size]
+
+@pytest.fixture
+def provider(monkeypatch):
+    from src.utils import importers
+    provider = FakeProvider()
+    monkeypatch.setitem(importers.IMPORT_PROVIDERS, 'fake', lambda credentials=None: provider)
+    monkeypatch.setattr(importers, 'IMPORT_RETRY_DELAY', 0)
+    return provider
+
+def wait_for_job(client, auth_headers, job_id, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = client.get(f'/api/files/import/{job_id}', headers=auth_headers).json['job']
+        if job['status'] not in ('queued', 'running'):
+            return job
+        time.sleep(0.05)
+    raise AssertionError(f"Import stayed {job['status']}")
+
+def start_import(client, auth_headers):
+    response = client.post('/api/files/import', headers=auth_headers, json={'source': 'fake'})
+    assert response.status_code == 202
+    return response.json['job']['id']
+
+def test_retry_resumes_where_the_transfer_stopped(client, auth_headers, provider):
+    provider.fail_after = 3000
+    provider.failures = 1
+
+    job = wait_for_job(client, auth_headers, start_import(client, auth_headers))
+    assert job['status'] == 'done'
+    item = job['items'][0]
+    assert item['attempts'] == 2
+    assert provider.offsets == [0, 3000]
+
+    download = client.get(f"/api/files/{item['file_id']}/download", headers=auth_headers)
+    assert download.data == DATA
+
+def test_failed_import_resumes_on_request(app, client, auth_headers, provider, monkeypatch):
+    from src.utils import importers
+    monkeypatch.setattr(importers, 'IMPORT_MAX_ATTEMPTS', 2)
+    provider.fail_after = 4000
+
+    job_id = start_import(client, auth_headers)
+    job = wait_for_job(client, auth_headers, job_id)
+    assert job['status'] == 'failed'
+    item = job['items'][0]
+    assert item['bytes_done'] == 4000
+    assert 'Connection reset' in item['error']
+    assert provider.offsets == [0, 4000]
+
+    provider.fail_after = None
+    assert client.post(f'/api/files/import/{job_id}/resume', headers=auth_headers, json={}).status_code == 202
+    job = wait_for_job(client, auth_headers, job_id)
+    assert job['status'] == 'done'
+    assert provider.offsets == [0, 4000, 4000]
+
+def test_checksum_mismatch_fails_and_starts_over(app, client, auth_headers, provider):
+    from src.models.models import File, ImportItem
+    from src.utils import importers
+    provider.checksum = hashlib.md5(b'other bytes').hexdigest()
+
+    job = wait_for_job(client, auth_headers, start_import(client, auth_headers))
+    assert job['status'] == 'failed'
+    item = job['items'][0]
+    assert item['error'] == 'Checksum mismatch for cv.pdf'
+    assert item['attempts'] == importers.IMPORT_MAX_ATTEMPTS
+    # A corrupt download is never resumed from
+    assert provider.offsets == [0] * importers.IMPORT_MAX_ATTEMPTS
+    with app.app_context():
+        assert ImportItem.query.filter_by(id=item['id']).first().temp_path is None
+        assert File.query.count() == 0
+
+class FakeResponse(io.BytesIO):
+    def __init__(self, data, status):
+        super().__init__(data)
+        self.status = status
+
+def test_drive_download_resumes_with_a_range_request(monkeypatch):
+    from src.utils import importers
+    requests = []
+    status = 206
+
+    def urlopen(request, timeout=None):
+        requests.append(request)
+        offset = int(request.get_header('Range', 'bytes=0-')[len('bytes='):-1])
+        return FakeResponse(DATA[offset:], status)
+
+    monkeypatch.setattr(importers.urllib.request, 'urlopen', urlopen)
+    provider = importers.GoogleDriveProvider({'access_token': 'token'})
+
+    assert b''.join(provider.iter_chunks('file-1')) == DATA
+    assert requests[-1].get_header('Range') is None
+    assert b''.join(provider.iter_chunks('file-1', offset=3000)) == DATA[3000:]
+    assert requests[-1].get_header('Range') == 'bytes=3000-'
+    assert requests[-1].get_header('Authorization') == 'Bearer token'
+
+    # A server that ignores the range would append the whole file again
+    status = 200
+    with pytest.raises(Exception, match='ignored the range'):
+        list(provider.iter_chunks('file-1', offset=3000))
@@ -0,0 +1,83 @@
+import pytest
+from PIL import Image
+
+RUSSIAN = 'Опытный разработчик программного обеспечения с опытом работы в крупных компаниях и стартапах'
+
+class FakeEngine:
+    """Stands in for Tesseract, reading Russian text and recording what it was asked to OCR."""
+
+    def __init__(self):
+        self.calls = []
+
+    def image_to_string(self, image, lang):
+        self.calls.append((image.size, lang))
+        return RUSSIAN
+
+    def get_languages(self):
+        return {'eng', 'rus'}
+
+def test_image_language_from_band_pass(monkeypatch, tmp_path):
+    from src.utils import ocr
+    engine = FakeEngine()
+    monkeypatch.setattr(ocr, 'get_ocr_engine', lambda name=None: engine)
+    monkeypatch.setattr(ocr, 'OCR_PREPROCESS', False)
+    image_path = str(tmp_path / 'cv.png')
+    Image.new('L', (300, 900), 255).save(image_path)
+
+    assert ocr.extract_text_from_image(image_path) == RUSSIAN
+    # The middle third is read with every language, then the whole image with the detected ones
+    assert engine.calls == [((300, 300), ocr.OCR_LANG), ((300, 900), 'rus+eng')]
+
+    engine.calls = []
+    ocr.extract_text_from_image(image_path, lang='eng')
+    assert engine.calls == [((300, 900), 'eng')]
+
+SAMPLES = {
+    'ces': 'Mám dlouholeté zkušenosti s vývojem webových aplikací a vedením malého týmu v mezinárodní společnosti.',
+    'deu': 'Ich habe langjährige Erfahrung in der Entwicklung von Webanwendungen und in der Leitung eines kleinen Teams.',
+    'eng': 'I have many years of experience developing web applications and leading a small team at an international company.',
+    'fra': "J'ai une longue expérience dans le développement d'applications web et la gestion d'une petite équipe.",
+    'ita': "Ho molti anni di esperienza nello sviluppo di applicazioni web e nella gestione di un piccolo gruppo di lavoro.",
+    'nld': 'Ik heb jarenlange ervaring met het ontwikkelen van webapplicaties en het leiden van een klein team bij een bedrijf.',
+    'pol': 'Mam wieloletnie doświadczenie w tworzeniu aplikacji internetowych i kierowaniu małym zespołem w firmie.',
+    'por': 'Tenho muitos anos de experiência no desenvolvimento de aplicações web e na gestão de uma pequena equipa.',
+    'rus': 'У меня многолетний опыт разработки веб-приложений и руководства небольшой командой в международной компании.',
+    'spa': 'Tengo muchos años de experiencia en el desarrollo de aplicaciones web y en la dirección de un pequeño equipo.',
+    'swe': 'Jag har många års erfarenhet av att utveckla webbapplikationer och att leda ett litet team på ett företag.',
+    'tur': 'Web uygulamaları geliştirme ve uluslararası bir şirkette küçük bir ekibi yönetme konusunda uzun yıllara dayanan deneyimim var.',
+    'ukr': 'Я маю багаторічний досвід розробки вебзастосунків і керівництва невеликою командою в міжнародній компанії.',
+}
+
+def test_every_profile_is_identified():
+    from src.utils.langid import get_profiles, identify_language
+    assert set(get_profiles()) == set(SAMPLES)
+    for lang, text in SAMPLES.items():
+        assert identify_language(text) == lang, lang
+
+def test_only_languages_of_the_sample_script_are_scored():
+    from src.utils.langid import get_profiles, score_languages
+    profiles = get_profiles()
+    cyrillic = {lang for lang, profile in profiles.items() if profile['script'] == 'cyrillic'}
+    assert cyrillic == {'rus', 'ukr'}
+    assert set(score_languages(SAMPLES['rus'])) == cyrillic
+    assert set(score_languages(SAMPLES['eng'])) == set(profiles) - cyrillic
+
+def test_short_samples_fall_back_to_the_default():
+    from src.utils.langid import identify_language
+    assert identify_language('Jane Doe, 2019', default=None) is None
+    assert identify_language('Иван Петров', default='eng') == 'eng'
+    assert identify_language('1234 5678 ---', default='rus') == 'rus'
+    assert identify_language('') == 'eng'
+
+def test_numpy_and_dict_scores_match(monkeypatch):
+    from src.utils import langid
+    if langid.numpy is None:
+        pytest.skip('numpy is not installed')
+    for text in (SAMPLES['deu'], SAMPLES['ukr'], 'xqzj ' * 50):
+        vectorized = langid.score_languages(text)
+        monkeypatch.setattr(langid, 'numpy', None)
+        plain = langid.score_languages(text)
+        monkeypatch.undo()
+        assert vectorized.keys() == plain.keys()
+        for lang in plain:
+            assert vectorized[lang] == pytest.approx(plain[lang])
@@ -0,0 +1,96 @@
+import json
+from datetime import datetime, timedelta
+
+import pytest
+
+from src.models.models import db, LLMCacheEntry
+from src.utils import llm_cache
+from src.utils.llm_cache import evict_llm_cache, get_llm_cache_key, lookup_llm_cache, store_cached_response
+
+MESSAGES = [
+    {'role': 'system', 'content': 'You are a resume analyst.'},
+    {'role': 'user', 'content': 'Analyze this resume:\n\nJane Doe, engineer'}
+]
+
+@pytest.fixture
+def app_context(app):
+    with app.app_context():
+        yield
+
+def store(key, response='{"skills": []}', endpoint='analyze_resume'):
+    store_cached_response(key, endpoint, 'openai', 'gpt-4.1-mini', response)
+
+def test_key_ignores_formatting_only():
+    key = get_llm_cache_key('openai', 'gpt-4.1-mini', 0.3, MESSAGES)
+    reformatted = [dict(message, content='  ' + message['content'].replace(' ', '\n ') + '\n') for message in MESSAGES]
+    assert key == get_llm_cache_key('openai', 'gpt-4.1-mini', 0.3, reformatted)
+
+    assert key != get_llm_cache_key('anthropic', 'gpt-4.1-mini', 0.3, MESSAGES)
+    assert key != get_llm_cache_key('openai', 'gpt-4.1', 0.3, MESSAGES)
+    assert key != get_llm_cache_key('openai', 'gpt-4.1-mini', 0.7, MESSAGES)
+    assert key != get_llm_cache_key('openai', 'gpt-4.1-mini', 0.3, [dict(MESSAGES[0], role='user'), MESSAGES[1]])
+    assert key != get_llm_cache_key('openai', 'gpt-4.1-mini', 0.3, MESSAGES[1:])
+
+def test_hit_miss_and_bypass(app_context):
+    key, response = lookup_llm_cache('analyze_resume', 'openai', 'gpt-4.1-mini', 0.3, MESSAGES)
+    assert key and response is None
+    store(key)
+
+    assert lookup_llm_cache('analyze_resume', 'openai', 'gpt-4.1-mini', 0.3, MESSAGES) == (key, '{"skills": []}')
+    assert LLMCacheEntry.query.one().hits == 1
+    # A forced refresh skips the cached response but still gets the key to store the new one under
+    assert lookup_llm_cache('analyze_resume', 'openai', 'gpt-4.1-mini', 0.3, MESSAGES, force=True) == (key, None)
+    # Endpoints left out of the cache are never looked up
+    assert lookup_llm_cache('generate_letter', 'openai', 'gpt-4.1-mini', 0.3, MESSAGES) == (None, None)
+
+def test_expired_entries_are_dropped(app_context, monkeypatch):
+    monkeypatch.setattr(llm_cache, 'LLM_CACHE_TTL', timedelta(hours=1))
+    key = get_llm_cache_key('openai', 'gpt-4.1-mini', 0.3, MESSAGES)
+    store(key)
+    entry = LLMCacheEntry.query.one()
+    assert entry.expires_at - entry.created_at == timedelta(hours=1)
+
+    entry.expires_at = datetime.utcnow() - timedelta(seconds=1)
+    db.session.commit()
+    assert llm_cache.get_cached_response(key, 'analyze_resume') is None
+    assert LLMCacheEntry.query.count() == 0
+
+    # Eviction sweeps expired entries even when the cache is under its size limit
+    store(key)
+    LLMCacheEntry.query.update({'expires_at': datetime.utcnow() - timedelta(seconds=1)})
+    db.session.commit()
+    evict_llm_cache()
+    assert LLMCacheEntry.query.count() == 0
+
+def test_least_recently_used_entries_are_evicted(app_context):
+    for name in ('a', 'b', 'c'):
+        store(name * 64, response=name * 100)
+    now = datetime.utcnow()
+    for age, name in enumerate(('b', 'c', 'a')):
+        LLMCacheEntry.query.filter_by(key=name * 64).update({'last_used_at': now - timedelta(minutes=10 - age)})
+    db.session.commit()
+
+    evict_llm_cache(max_bytes=250)
+    assert [entry.key[0] for entry in LLMCacheEntry.query.order_by(LLMCacheEntry.key)] == ['a', 'c']
+    evict_llm_cache(max_bytes=100)
+    assert [entry.key[0] for entry in LLMCacheEntry.query.all()] == ['a']
+
+def test_completions_are_served_from_the_cache(app_context, monkeypatch):
+    from src.utils import llm
+    calls = []
+
+    def route_call(endpoint, backends, call, slots=None):
+        calls.append(endpoint)
+        return '{"skills": ["Python"]}' if len(calls) > 1 else 'not json'
+
+    monkeypatch.setattr(llm, 'route_call', route_call)
+    monkeypatch.setattr(llm, 'get_backends', lambda provider, model, api_key: [(provider, model, api_key)])
+
+    # A response the parser rejects is not cached
+    with pytest.raises(ValueError):
+        llm._complete('analyze_resume', MESSAGES, api_key='key', parse=json.loads)
+    assert LLMCacheEntry.query.count() == 0
+
+    assert llm._complete('analyze_resume', MESSAGES, api_key='key', parse=json.loads) == ({'skills': ['Python']}, False)
+    assert llm._complete('analyze_resume', MESSAGES, api_key='key', parse=json.loads) == ({'skills': ['Python']}, True)
+    assert len(calls) == 2
@@ -0,0 +1,167 @@
+import threading
+import time
+
+import pytest
+
+from src.utils.llm_executor import LLMExecutor, LLMQueueFull
+
+class Gate:
+    """Calls that block until opened, recording how many ran at once."""
+
+    def __init__(self):
+        self.opened = threading.Event()
+        self.lock = threading.Lock()
+        self.running = 0
+        self.most = 0
+        self.started = []
+
+    def call(self, name, request=None):
+        def fn():
+            with self.lock:
+                self.running += 1
+                self.most = max(self.most, self.running)
+                self.started.append(name)
+            try:
+                if request:
+                    return request()
+                self.opened.wait(10)
+                return name
+            finally:
+                with self.lock:
+                    self.running -= 1
+        return fn
+
+def wait_until(condition, timeout=10):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError('Timed out')
+        time.sleep(0.01)
+
+@pytest.fixture
+def make_executor(app):
+    executors = []
+    def make(**limits):
+        executor = LLMExecutor(app, **{'workers': 8, 'provider_limit': 8, 'key_limit': 8, 'max_queue': 100, **limits})
+        executors.append(executor)
+        return executor
+    yield make
+    for executor in executors:
+        executor.shutdown()
+
+def test_calls_per_key_are_limited(make_executor):
+    executor = make_executor(key_limit=2)
+    gate = Gate()
+    futures = [executor.submit(gate.call(i), 'openai', 'sk-one') for i in range(5)]
+    other = executor.submit(gate.call('other'), 'openai', 'sk-two')
+
+    # A saturated key does not hold up calls made with another one
+    wait_until(lambda: len(gate.started) == 3)
+    assert 'other' in gate.started
+    stats = executor.get_stats()
+    assert stats['queued'] == 3
+    assert stats['running_by_provider'] == {'openai': 3}
+
+    gate.opened.set()
+    assert [future.result(10) for future in futures] == list(range(5))
+    assert other.result(10) == 'other'
+    assert gate.most == 3
+    # Slots are given back just after the result is set
+    wait_until(lambda: executor.get_stats()['running'] == 0)
+
+def test_calls_per_provider_are_limited(make_executor):
+    executor = make_executor(provider_limit=2)
+    gate = Gate()
+    futures = [executor.submit(gate.call(i), 'openai', f'sk-{i}') for i in range(4)]
+    google = executor.submit(gate.call('google'), 'google', 'AIza-key')
+    wait_until(lambda: len(gate.started) == 3)
+    assert executor.get_stats()['queued'] == 2
+
+    gate.opened.set()
+    for future in futures + [google]:
+        future.result(10)
+    assert gate.most == 3
+
+def test_queue_limit(make_executor):
+    executor = make_executor(key_limit=1, max_queue=1)
+    gate = Gate()
+    executor.submit(gate.call('running'), 'openai', 'sk-one')
+    wait_until(lambda: gate.started)
+    executor.submit(gate.call('queued'), 'openai', 'sk-one')
+    with pytest.raises(LLMQueueFull):
+        executor.submit(gate.call('rejected'), 'openai', 'sk-one')
+    assert executor.get_stats()['rejected'] == 1
+    gate.opened.set()
+
+def test_auto_calls_share_the_slots_of_their_backend(make_executor):
+    executor = make_executor(key_limit=1)
+    # Only OpenAI has a key, so the router sends 'auto' calls there
+    keys = {'openai': 'sk-one', 'google': None}
+    assert executor.get_slot('auto', keys) == executor.get_slot('openai', 'sk-one')
+
+    gate = Gate()
+    direct = executor.submit(gate.call('direct'), 'openai', 'sk-one')
+    wait_until(lambda: gate.started)
+
+    def request():
+        # The request of the call runs in the slot the call was started with
+        with executor.slot('openai', 'sk-one'):
+            gate.opened.wait(10)
+            return 'auto'
+
+    auto = executor.submit(gate.call('auto', request), 'auto', keys)
+    time.sleep(0.2)
+    assert gate.started == ['direct']
+    assert executor.get_stats()['queued'] == 1
+
+    gate.opened.set()
+    assert direct.result(10) == 'direct'
+    assert auto.result(10) == 'auto'
+    assert gate.most == 1
+    wait_until(lambda: executor.get_stats()['running'] == 0)
+
+def test_request_to_another_backend_takes_its_own_slot(make_executor):
+    executor = make_executor(key_limit=1)
+    gate = Gate()
+    in_google = threading.Event()
+    google_counted = []
+
+    def failover():
+        # Like a call that fails over from OpenAI to Google
+        with executor.slot('google', 'AIza-key'):
+            google_counted.append(executor.get_stats()['running_by_provider'])
+            in_google.set()
+            gate.opened.wait(10)
+        return 'failover'
+
+    call = executor.submit(gate.call('failover', failover), 'openai', 'sk-one')
+    in_google.wait(10)
+    # The OpenAI slot was handed back rather than held, so the next OpenAI call is not kept waiting
+    assert google_counted == [{'google': 1}]
+    queued = executor.submit(gate.call('next'), 'openai', 'sk-one')
+    wait_until(lambda: 'next' in gate.started)
+
+    gate.opened.set()
+    assert call.result(10) == 'failover'
+    assert queued.result(10) == 'next'
+    wait_until(lambda: executor.get_stats()['running'] == 0)
+
+def test_requests_without_a_slot_wait_for_one(make_executor):
+    executor = make_executor(key_limit=1)
+    gate = Gate()
+    executor.submit(gate.call('running'), 'openai', 'sk-one')
+    wait_until(lambda: gate.started)
+
+    assert executor.acquire('openai', 'sk-one', blocking=False) is None
+    acquired = []
+    waiter = threading.Thread(target=lambda: acquired.append(executor.acquire('openai', 'sk-one')))
+    waiter.start()
+    wait_until(lambda: executor.get_stats()['waiting_for_slot'] == 1)
+    # Queued calls do not take the slot ahead of a request already waiting for it
+    queued = executor.submit(gate.call('queued'), 'openai', 'sk-one')
+
+    gate.opened.set()
+    waiter.join(10)
+    assert acquired and 'queued' not in gate.started
+    executor.release(acquired[0])
+    assert queued.result(10) == 'queued'
@@ -0,0 +1,140 @@
+import time
+import types
+import uuid
+
+import httpx
+import openai
+import pytest
+
+from src.utils import llm_retry
+from src.utils.llm_retry import LLMUnavailable, RateLimiter, call_with_retries, get_circuit_breaker, parse_reset
+
+REQUEST = httpx.Request('POST', 'https://api.example.com/v1/chat/completions')
+
+def api_error(cls, status, headers=None, body=None):
+    response = httpx.Response(status, headers=headers or {}, request=REQUEST)
+    return cls(f'Error {status}', response=response, body=body)
+
+class FakeRaw:
+    headers = {}
+
+    def parse(self):
+        return 'completion'
+
+class FakeRequest:
+    """Stands in for a raw-response API call, failing with the given errors before it succeeds."""
+
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return FakeRaw()
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    """Record the delays slept by backoffs and the rate limiter, moving a fake clock on instead of waiting."""
+    delays = []
+    clock = [time.monotonic()]
+
+    def sleep(delay):
+        delays.append(delay)
+        clock[0] += delay
+
+    monkeypatch.setattr(llm_retry, 'time', types.SimpleNamespace(sleep=sleep, monotonic=lambda: clock[0]))
+    return delays
+
+@pytest.fixture
+def provider():
+    # A provider of its own, so breaker and limiter state does not leak between tests
+    return f'test-{uuid.uuid4().hex}'
+
+def test_retryable_errors_are_retried(sleeps, provider):
+    request = FakeRequest(
+        api_error(openai.InternalServerError, 503),
+        api_error(openai.RateLimitError, 429, headers={'retry-after-ms': '1500'}),
+        openai.APIConnectionError(request=REQUEST),
+    )
+    assert call_with_retries(request, provider) == 'completion'
+    assert request.calls == 4
+    # Backoffs are never shorter than the provider asked for
+    assert len(sleeps) == 3
+    assert sleeps[1] >= 1.5
+
+def test_other_errors_are_not_retried(sleeps, provider):
+    for error in (
+        api_error(openai.BadRequestError, 400),
+        api_error(openai.AuthenticationError, 401),
+        api_error(openai.RateLimitError, 429, body={'code': 'insufficient_quota'}),
+    ):
+        request = FakeRequest(error)
+        with pytest.raises(type(error)):
+            call_with_retries(request, provider)
+        assert request.calls == 1
+    assert sleeps == []
+    # Rejected requests show the provider is up
+    assert get_circuit_breaker(provider).get_stats()['consecutive_failures'] == 0
+
+def test_gives_up_after_the_last_retry(sleeps, provider, monkeypatch):
+    monkeypatch.setattr(llm_retry, 'LLM_MAX_RETRIES', 2)
+    request = FakeRequest(*[api_error(openai.InternalServerError, 500) for _ in range(5)])
+    with pytest.raises(openai.InternalServerError):
+        call_with_retries(request, provider)
+    assert request.calls == 3
+    assert len(sleeps) == 2
+
+def test_backoff_is_capped_full_jitter(monkeypatch):
+    monkeypatch.setattr(llm_retry, 'LLM_BACKOFF_BASE', 1.0)
+    monkeypatch.setattr(llm_retry, 'LLM_BACKOFF_CAP', 4.0)
+    delays = [llm_retry.get_backoff(attempt) for attempt in range(10) for _ in range(20)]
+    assert all(0 <= delay <= 4.0 for delay in delays)
+    assert llm_retry.get_backoff(0, retry_after=10) == 10
+
+def test_circuit_opens_and_lets_one_trial_through(sleeps, provider, monkeypatch):
+    monkeypatch.setattr(llm_retry, 'LLM_MAX_RETRIES', 0)
+    breaker = get_circuit_breaker(provider)
+    breaker.threshold = 2
+    breaker.cooldown = 60
+
+    for _ in range(2):
+        with pytest.raises(openai.InternalServerError):
+            call_with_retries(FakeRequest(api_error(openai.InternalServerError, 500)), provider)
+    assert breaker.get_stats()['state'] == 'open'
+
+    # Open: calls fail fast without reaching the provider
+    request = FakeRequest()
+    with pytest.raises(LLMUnavailable) as error:
+        call_with_retries(request, provider)
+    assert request.calls == 0
+    assert 0 < error.value.retry_after <= 61
+
+    # After the cooldown a single trial call decides; a failed trial opens the circuit again
+    breaker.opened_at -= 60
+    with pytest.raises(openai.InternalServerError):
+        call_with_retries(FakeRequest(api_error(openai.InternalServerError, 500)), provider)
+    assert breaker.get_stats()['state'] == 'open'
+
+    breaker.opened_at -= 60
+    breaker.before_call()
+    assert breaker.get_stats()['state'] == 'half_open'
+    # Other calls are still turned away while the trial runs
+    with pytest.raises(LLMUnavailable):
+        breaker.before_call()
+    breaker.record_success()
+    assert breaker.get_stats()['state'] == 'closed'
+    assert call_with_retries(FakeRequest(), provider) == 'completion'
+
+def test_rate_limiter_waits_for_the_reset():
+    assert parse_reset('6m0s') == 360
+    assert parse_reset('20ms') == 0.02
+    assert parse_reset('1.5') == 1.5
+
+    limiter = RateLimiter()
+    limiter.update({'x-ratelimit-limit-requests': '600', 'x-ratelimit-remaining-requests': '0', 'x-ratelimit-reset-requests': '200ms'})
+    started = time.monotonic()
+    limiter.acquire()
+    assert time.monotonic() - started >= 0.15
+    assert limiter.get_stats()['limit_per_minute'] == 600
@@ -0,0 +1,115 @@
+import threading
+import time
+import uuid
+
+import pytest
+
+from src.utils import llm_router
+from src.utils.llm_retry import LLMUnavailable
+from src.utils.llm_router import route_call
+
+@pytest.fixture
+def backends(monkeypatch):
+    """Backends of two providers, with models of their own so latency history does not carry over between tests."""
+    monkeypatch.setattr(llm_router, 'LLM_HEDGE_ENDPOINTS', {'generate_cover_letter'})
+    monkeypatch.setattr(llm_router, 'LLM_HEDGE_AFTER_MS', 50)
+    suffix = uuid.uuid4().hex
+    return [('openai', f'gpt-{suffix}', 'sk-one'), ('google', f'gemini-{suffix}', 'AIza-one'), ('openai', f'gpt-mini-{suffix}', 'sk-one')]
+
+class FakeCall:
+    """Stands in for a completion request: each backend answers or fails after a delay."""
+
+    def __init__(self, **behaviour):
+        # provider or model -> (seconds, result or exception)
+        self.behaviour = behaviour
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def __call__(self, backend):
+        with self.lock:
+            self.calls.append(backend[1])
+        seconds, outcome = self.behaviour.get(backend[1]) or self.behaviour[backend[0]]
+        time.sleep(seconds)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+def stat(name):
+    return llm_router.get_router_stats()[name]
+
+def test_unhedged_calls_fail_over_only_while_unavailable(backends):
+    call = FakeCall(openai=(0, LLMUnavailable('openai is unavailable', 5)), google=(0, 'google'))
+    assert route_call('analyze_resume', backends[:2], call) == 'google'
+
+    call = FakeCall(openai=(0, ValueError('Bad request')), google=(0, 'google'))
+    with pytest.raises(ValueError):
+        route_call('analyze_resume', backends[:2], call)
+    assert len(call.calls) == 1
+
+def test_slow_call_is_hedged_on_another_provider(backends):
+    wins = stat('hedge_wins')
+    call = FakeCall(openai=(1, 'openai'), google=(0, 'google'))
+    assert route_call('generate_cover_letter', backends, call) == 'google'
+    assert call.calls == [backends[0][1], backends[1][1]]
+    assert stat('hedge_wins') == wins + 1
+
+def test_failed_request_waits_for_the_other(backends):
+    # The hedge fails with an error that is not LLMUnavailable; the slow first request still answers
+    call = FakeCall(openai=(0.3, 'openai'), google=(0, RuntimeError('Connection reset')))
+    assert route_call('generate_cover_letter', backends, call) == 'openai'
+
+    call = FakeCall(openai=(0.1, RuntimeError('Connection reset')), google=(0.3, 'google'))
+    assert route_call('generate_cover_letter', backends, call) == 'google'
+
+def test_both_failing_falls_over_to_the_rest(backends):
+    call = FakeCall(openai=(0.1, RuntimeError('Connection reset')), google=(0, LLMUnavailable('google is unavailable', 5)))
+    call.behaviour[backends[2][1]] = (0, 'gpt-mini')
+    assert route_call('generate_cover_letter', backends, call) == 'gpt-mini'
+
+def test_both_failing_prefers_unavailable(backends):
+    call = FakeCall(openai=(0.1, RuntimeError('Connection reset')), google=(0, LLMUnavailable('google is unavailable', 5)))
+    with pytest.raises(LLMUnavailable):
+        route_call('generate_cover_letter', backends[:2], call)
+
+    call = FakeCall(openai=(0.1, RuntimeError('Connection reset')), google=(0, ValueError('Bad request')))
+    with pytest.raises(RuntimeError):
+        route_call('generate_cover_letter', backends[:2], call)
+
+def test_error_before_the_hedge_falls_over(backends):
+    # The first request fails before a hedge is due, with an error that is not LLMUnavailable
+    call = FakeCall(openai=(0, RuntimeError('Connection reset')), google=(0, 'google'))
+    assert route_call('generate_cover_letter', backends, call) == 'google'
+
+def test_hedges_hold_slots_of_their_backend(app, backends):
+    from src.utils.llm_executor import LLMExecutor
+    executor = LLMExecutor(app, workers=2, provider_limit=8, key_limit=1)
+    seen = []
+    def google():
+        seen.append(executor.get_stats()['running_by_provider'])
+        return 'google'
+
+    class Call(FakeCall):
+        def __call__(self, backend):
+            if backend[0] == 'google':
+                return google()
+            return super().__call__(backend)
+
+    try:
+        assert route_call('generate_cover_letter', backends, Call(openai=(0.5, 'openai')), slots=executor) == 'google'
+        assert seen == [{'openai': 1, 'google': 1}]
+
+        # No hedge while the other backend's key has no free slot
+        skipped = stat('hedges_skipped')
+        token = executor.acquire('google', 'AIza-one')
+        call = FakeCall(openai=(0.3, 'openai'), google=(0, 'google'))
+        assert route_call('generate_cover_letter', backends, call, slots=executor) == 'openai'
+        assert call.calls == [backends[0][1]]
+        assert stat('hedges_skipped') == skipped + 1
+        executor.release(token)
+
+        deadline = time.monotonic() + 5
+        while executor.get_stats()['running'] and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert executor.get_stats()['running'] == 0
+    finally:
+        executor.shutdown()
@@ -0,0 +1,69 @@
+from src.utils.llm_tokens import chunk_text, count_tokens, split_line, trim_to_budget, truncate_to_tokens
+
+def section(heading, line, lines):
+    return "\n".join([heading] + [f"{line} {i}" for i in range(lines)])
+
+RESUME = "\n".join([
+    "Jane Doe\nSoftware engineer",
+    section("EXPERIENCE", "Built distributed data pipelines in Python and Go at Acme", 40),
+    section("SKILLS", "Python, Go, SQL", 2),
+    section("PUBLICATIONS", "Scaling stream processing, Journal of Systems", 30),
+    section("REFERENCES", "Available on request from former managers", 30),
+])
+
+def test_text_within_budget_is_unchanged():
+    assert trim_to_budget(RESUME, count_tokens(RESUME)) == RESUME
+
+def test_single_huge_line_is_cut_to_the_budget():
+    text = "word " * 100000
+    trimmed = trim_to_budget(text, 24000)
+    assert trimmed.startswith("word word")
+    # The whole budget is used rather than dropping the only line
+    assert 0.95 * 24000 <= count_tokens(trimmed) <= 24000
+
+def test_low_priority_sections_are_dropped_first():
+    budget = count_tokens(RESUME) - count_tokens(section("REFERENCES", "Available on request from former managers", 30))
+    trimmed = trim_to_budget(RESUME, budget)
+    assert count_tokens(trimmed) <= budget
+    assert "REFERENCES" not in trimmed
+    assert "PUBLICATIONS" in trimmed
+    assert section("EXPERIENCE", "Built distributed data pipelines in Python and Go at Acme", 40) in trimmed
+
+def test_long_sections_are_shortened_and_short_ones_kept():
+    budget = count_tokens(RESUME) // 3
+    trimmed = trim_to_budget(RESUME, budget)
+    assert count_tokens(trimmed) <= budget
+    assert "REFERENCES" not in trimmed and "PUBLICATIONS" not in trimmed
+    assert "Jane Doe\nSoftware engineer" in trimmed
+    assert section("SKILLS", "Python, Go, SQL", 2) in trimmed
+    assert "at Acme 0" in trimmed and "at Acme 39" not in trimmed
+
+def test_truncate_fills_the_budget_with_the_next_line():
+    text = "short line\n" + "word " * 1000
+    truncated = truncate_to_tokens(text, 50)
+    assert truncated.startswith("short line\nword word")
+    assert 45 <= count_tokens(truncated) <= 50
+
+def test_chunks_fit_and_keep_every_line_in_order():
+    chunks = chunk_text(RESUME, 200)
+    assert len(chunks) > 1
+    assert all(count_tokens(chunk) <= 200 for chunk in chunks)
+    assert "\n".join(chunks).splitlines() == RESUME.splitlines()
+    # Sections that fit in a chunk are not split
+    assert any(section("SKILLS", "Python, Go, SQL", 2) in chunk for chunk in chunks)
+
+def test_text_that_fits_is_one_chunk():
+    assert chunk_text(RESUME, count_tokens(RESUME)) == [RESUME]
+
+def test_long_lines_are_split_between_words():
+    text = "Summary\n" + " ".join(f"skill{i}" for i in range(2000))
+    chunks = chunk_text(text, 100)
+    assert all(count_tokens(chunk) <= 100 for chunk in chunks)
+    assert " ".join(" ".join(chunks).split()) == " ".join(text.split())
+
+def test_words_longer_than_the_budget_are_split_between_characters():
+    word = "x" * 1000
+    pieces = split_line(word, 10)
+    assert "".join(pieces) == word
+    assert all(0 < count_tokens(piece) <= 10 for piece in pieces)
+    assert split_line("a b", 0) == ["a", "b"]
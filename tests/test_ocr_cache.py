@@ -0,0 +1,82 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from src.models.models import db, File, OCRCacheEntry
+from src.utils.ocr_cache import get_cache_key, run_cached_ocr, evict_ocr_cache, store_cached_ocr
+
+class FakeOCR:
+    """Stands in for process_file_ocr, counting how often a file is really read."""
+
+    def __init__(self, status='success'):
+        self.status = status
+        self.calls = 0
+
+    def __call__(self, file_path, mime_type):
+        self.calls += 1
+        if self.status != 'success':
+            return {'text': '', 'language': 'unknown', 'status': 'failed', 'error': 'Tesseract failed'}
+        with open(file_path, 'rb') as f:
+            return {'text': f.read().decode('utf-8'), 'language': 'eng', 'status': 'success'}
+
+@pytest.fixture
+def make_file(app, user_id, tmp_path):
+    def make(name, data):
+        path = tmp_path / name
+        path.write_bytes(data)
+        file = File(user_id=user_id, source='local', file_name=name, mime_type='image/png', size=len(data), storage_url=str(path))
+        db.session.add(file)
+        db.session.commit()
+        return file
+    with app.app_context():
+        yield make
+
+def test_key_depends_on_content_and_settings():
+    settings = {'engine': 'tesserocr', 'lang': 'eng+rus', 'pipeline': 6}
+    key = get_cache_key('a' * 64, settings)
+    assert key == get_cache_key('a' * 64, dict(reversed(list(settings.items()))))
+    assert key != get_cache_key('b' * 64, settings)
+    assert key != get_cache_key('a' * 64, {**settings, 'lang': 'eng'})
+
+def test_identical_files_are_read_once(make_file):
+    ocr = FakeOCR()
+    first = run_cached_ocr(make_file('a.png', b'Jane Doe'), ocr=ocr)
+    # Another upload of the same bytes under another name
+    second = run_cached_ocr(make_file('b.png', b'Jane Doe'), ocr=ocr)
+
+    assert ocr.calls == 1
+    assert first['text'] == second['text'] == 'Jane Doe'
+    assert second['cached']
+    assert OCRCacheEntry.query.one().hits == 1
+
+def test_force_refreshes_the_entry(make_file):
+    ocr = FakeOCR()
+    file = make_file('a.png', b'Jane Doe')
+    run_cached_ocr(file, ocr=ocr)
+    result = run_cached_ocr(file, force=True, ocr=ocr)
+
+    assert ocr.calls == 2
+    assert not result.get('cached')
+    assert OCRCacheEntry.query.count() == 1
+
+def test_failures_are_not_cached(make_file):
+    ocr = FakeOCR(status='failed')
+    file = make_file('a.png', b'Jane Doe')
+    run_cached_ocr(file, ocr=ocr)
+    run_cached_ocr(file, ocr=ocr)
+
+    assert ocr.calls == 2
+    assert OCRCacheEntry.query.count() == 0
+
+def test_least_recently_used_entries_are_evicted(app):
+    with app.app_context():
+        now = datetime.utcnow()
+        for index, name in enumerate(['old', 'middle', 'new']):
+            store_cached_ocr(name, name, {'text': 'x' * 100, 'language': 'eng'})
+            OCRCacheEntry.query.filter_by(key=name).update({'last_used_at': now + timedelta(minutes=index)})
+        db.session.commit()
+
+        evict_ocr_cache(max_bytes=250)
+        assert sorted(entry.key for entry in OCRCacheEntry.query.all()) == ['middle', 'new']
+        evict_ocr_cache(max_bytes=0)
+        assert OCRCacheEntry.query.count() == 0
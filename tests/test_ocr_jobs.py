@@ -0,0 +1,163 @@
+import os
+import subprocess
+import sys
+import textwrap
+
+from conftest import make_docx, paragraph
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MAIN_PATH = os.path.join(REPO, 'src', 'main.py')
+DOCX_MIME = 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'
+
+def add_job(app, user_id, status='queued', **fields):
+    from src.models.models import db, File, OCRJob
+    with app.app_context():
+        file = File(user_id=user_id, source='local', file_name='cv.docx', mime_type=DOCX_MIME, size=1, storage_url='/missing/cv.docx')
+        db.session.add(file)
+        db.session.flush()
+        job = OCRJob(user_id=user_id, file_id=file.id, doc_type='resume', status=status, **fields)
+        db.session.add(job)
+        db.session.commit()
+        return job.id
+
+def get_job(app, job_id):
+    from src.models.models import OCRJob
+    with app.app_context():
+        return OCRJob.query.filter_by(id=job_id).first().to_dict()
+
+def test_spawned_worker_starts_no_queue(app, user_id, tmp_path):
+    job_id = add_job(app, user_id)
+    docx_path = make_docx(str(tmp_path / 'cv.docx'), paragraph('Jane Doe'))
+    # Run like `python src/main.py`: spawned children then import the main module again as __mp_main__
+    script = textwrap.dedent(f'''
+        import sys
+        sys.path.insert(0, {REPO!r})
+        sys.modules['__main__'].__file__ = {MAIN_PATH!r}
+        from src.utils.ocr_jobs import OCRWorker
+        worker = OCRWorker(memory_limit_mb=0)
+        print(worker.run({docx_path!r}, {DOCX_MIME!r}, 60)['text'])
+        worker.stop()
+    ''')
+    result = subprocess.run([sys.executable, '-c', script], capture_output=True, text=True, timeout=120, env=os.environ.copy())
+
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip() == 'Jane Doe'
+    # A queue started inside the worker would have claimed the job, and failed it since its file is missing
+    assert get_job(app, job_id)['status'] == 'queued'
+
+class FakeWorker:
+    """Stands in for an OCR worker process, counting the files it is asked to read."""
+
+    def __init__(self, text='Jane Doe'):
+        self.text = text
+        self.calls = []
+
+    def run(self, file_path, mime_type, timeout):
+        self.calls.append(file_path)
+        return {'text': self.text, 'language': 'eng', 'status': 'success'}
+
+def add_docx_job(app, user_id, tmp_path, status='queued', **fields):
+    from src.models.models import db, File, OCRJob
+    docx_path = make_docx(str(tmp_path / 'cv.docx'), paragraph('Jane Doe'))
+    with app.app_context():
+        file = File(user_id=user_id, source='local', file_name='cv.docx', mime_type=DOCX_MIME, size=os.path.getsize(docx_path), storage_url=docx_path)
+        db.session.add(file)
+        db.session.flush()
+        job = OCRJob(user_id=user_id, file_id=file.id, doc_type='resume', status=status, **fields)
+        db.session.add(job)
+        db.session.commit()
+        return job.id
+
+def wait_for_status(app, job_id, statuses, timeout=60):
+    import time
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = get_job(app, job_id)
+        if job['status'] in statuses:
+            return job
+        time.sleep(0.1)
+    raise AssertionError(f"Job stayed {job['status']}")
+
+def test_job_is_claimed_once(app, user_id, tmp_path):
+    from src.utils.ocr_jobs import OCRJobQueue
+    # Started first, so its own recovery does not pick the job up
+    job_queue = OCRJobQueue(app, workers=1)
+    job_id = add_docx_job(app, user_id, tmp_path)
+    worker = FakeWorker()
+    try:
+        with app.app_context():
+            job_queue._process(worker, job_id, False)
+            # A second delivery of the same job, as after submitting it twice, finds it claimed
+            job_queue._process(worker, job_id, False)
+    finally:
+        job_queue.shutdown()
+
+    job = get_job(app, job_id)
+    assert job['status'] == 'done'
+    assert job['document_id']
+    assert len(worker.calls) == 1
+
+def test_job_claimed_elsewhere_is_skipped(app, user_id, tmp_path):
+    from datetime import datetime
+    from src.utils.ocr_jobs import OCRJobQueue
+    job_queue = OCRJobQueue(app, workers=1)
+    job_id = add_docx_job(app, user_id, tmp_path, status='running', started_at=datetime.utcnow())
+    worker = FakeWorker()
+    try:
+        with app.app_context():
+            job_queue._process(worker, job_id, False)
+    finally:
+        job_queue.shutdown()
+
+    assert get_job(app, job_id)['status'] == 'running'
+    assert worker.calls == []
+
+def test_worker_is_killed_on_timeout_and_replaced(tmp_path):
+    from src.utils.ocr_jobs import OCRWorker
+    # Reading a FIFO nobody writes to blocks the worker like a page that never finishes
+    fifo_path = str(tmp_path / 'stuck.docx')
+    os.mkfifo(fifo_path)
+    docx_path = make_docx(str(tmp_path / 'cv.docx'), paragraph('Jane Doe'))
+    worker = OCRWorker(memory_limit_mb=0)
+    try:
+        try:
+            worker.run(fifo_path, DOCX_MIME, 2)
+            raise AssertionError('Expected a timeout')
+        except TimeoutError:
+            pass
+        assert worker.process is None
+
+        # The next job gets a fresh process
+        assert worker.run(docx_path, DOCX_MIME, 60)['text'] == 'Jane Doe'
+        first_pid = worker.process.pid
+
+        # A worker that died is replaced too
+        worker.process.kill()
+        worker.process.join()
+        assert worker.run(docx_path, DOCX_MIME, 60)['text'] == 'Jane Doe'
+        assert worker.process.pid != first_pid
+    finally:
+        worker.stop()
+
+def test_recovery_after_restart(app, user_id, tmp_path):
+    from datetime import datetime, timedelta
+    from src.utils.ocr_jobs import OCRJobQueue, OCR_JOB_RECOVERY_GRACE
+    long_ago = datetime.utcnow() - timedelta(seconds=10 + OCR_JOB_RECOVERY_GRACE + 1)
+    (tmp_path / 'interrupted').mkdir()
+    interrupted_id = add_docx_job(app, user_id, tmp_path / 'interrupted', status='running', started_at=long_ago)
+    in_progress_id = add_job(app, user_id, status='running', started_at=datetime.utcnow())
+    queued_id = add_docx_job(app, user_id, tmp_path)
+
+    # Starting the queue is what a restarted app does when unfinished jobs are left
+    job_queue = OCRJobQueue(app, workers=1, timeout=10)
+    try:
+        job = wait_for_status(app, queued_id, ('done', 'failed'))
+    finally:
+        job_queue.shutdown()
+
+    assert job['status'] == 'done'
+    interrupted = get_job(app, interrupted_id)
+    assert interrupted['status'] == 'failed'
+    assert 'restart' in interrupted['error']
+    # Possibly still running in another app process, so it is left alone until it is past the timeout
+    assert get_job(app, in_progress_id)['status'] == 'running'
@@ -0,0 +1,75 @@
+import io
+import os
+import sys
+
+import pytest
+
+# Make the src package importable when run from anywhere
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from botocore.response import StreamingBody
+from botocore.stub import ANY, Stubber
+from src.utils.storage import S3Storage, create_temp_file
+
+CONTENT_HASH = 'ab' * 32
+KEY = f"blobs/ab/ab/{CONTENT_HASH}"
+
+@pytest.fixture
+def s3(monkeypatch):
+    monkeypatch.setenv('AWS_ACCESS_KEY_ID', 'test')
+    monkeypatch.setenv('AWS_SECRET_ACCESS_KEY', 'test')
+    storage = S3Storage(bucket='resumes', region='us-east-1', prefix='blobs')
+    with Stubber(storage.client) as stubber:
+        yield storage, stubber
+        stubber.assert_no_pending_responses()
+
+def write_temp_file(data):
+    temp_path = create_temp_file()
+    with open(temp_path, 'wb') as f:
+        f.write(data)
+    return temp_path
+
+def test_key_is_sharded_under_prefix(s3):
+    storage, _ = s3
+    assert storage.key(CONTENT_HASH) == KEY
+
+def test_exists(s3):
+    storage, stubber = s3
+    stubber.add_response('head_object', {'ContentLength': 3}, {'Bucket': 'resumes', 'Key': KEY})
+    stubber.add_client_error('head_object', service_error_code='404', http_status_code=404)
+    assert storage.exists(CONTENT_HASH)
+    assert not storage.exists(CONTENT_HASH)
+
+def test_exists_raises_other_errors(s3):
+    storage, stubber = s3
+    stubber.add_client_error('head_object', service_error_code='403', http_status_code=403)
+    with pytest.raises(Exception):
+        storage.exists(CONTENT_HASH)
+
+def test_put_uploads_missing_blob(s3):
+    storage, stubber = s3
+    temp_path = write_temp_file(b'resume')
+    stubber.add_client_error('head_object', service_error_code='404', http_status_code=404)
+    stubber.add_response('put_object', {}, {'Bucket': 'resumes', 'Key': KEY, 'Body': ANY, 'ChecksumAlgorithm': ANY})
+    assert storage.put(temp_path, CONTENT_HASH) == f"s3://resumes/{KEY}"
+    assert not os.path.exists(temp_path)
+
+def test_put_skips_stored_blob(s3):
+    storage, stubber = s3
+    temp_path = write_temp_file(b'resume')
+    stubber.add_response('head_object', {'ContentLength': 6}, {'Bucket': 'resumes', 'Key': KEY})
+    assert storage.put(temp_path, CONTENT_HASH) == f"s3://resumes/{KEY}"
+    assert not os.path.exists(temp_path)
+
+def test_open_and_delete(s3):
+    storage, stubber = s3
+    stubber.add_response('get_object', {'Body': StreamingBody(io.BytesIO(b'resume'), 6)}, {'Bucket': 'resumes', 'Key': KEY})
+    stubber.add_response('delete_object', {}, {'Bucket': 'resumes', 'Key': KEY})
+    assert storage.open(CONTENT_HASH).read() == b'resume'
+    storage.delete(CONTENT_HASH)
+
+def test_presigned_url(s3):
+    storage, _ = s3
+    url = storage.presigned_url(CONTENT_HASH, 'cv.pdf', 'application/pdf', expires=60)
+    assert url.startswith('https://resumes.s3.amazonaws.com/' + KEY)
+    assert 'response-content-disposition=attachment' in url